@@ -1,16 +1,33 @@
 """Agent description."""
 import os
 import pygame
+import numpy as np
 from variables import agent, global_var
 from models import Unicycle
 from util import Rectangle, add_noise
 
+_sprites = {}  # Maps the names of the car images to the loaded images.
+
+
+def load_sprite(name):
+    """Returns the image of a car from the media folder. Each image is only
+    loaded once per process, and shared by all the cars which use it, so it
+    should not be modified.
+
+    Args:
+        name: The name of the car image.
+    """
+    if name not in _sprites:
+        _sprites[name] = pygame.image.load(os.path.join(global_var.PATH, "media", name + ".png"))
+
+    return _sprites[name]
+
 
 class Agent(Unicycle):
     """Our agent is a red car unicycle model."""
 
     def __init__(self, x=agent.X, y=agent.Y, theta=agent.THETA,
-                 speed=agent.SPEED, name="red_car"):
+                 speed=agent.SPEED, name="red_car", rng=np.random):
         """Initializes the agent function.
 
         Args:
@@ -19,6 +36,8 @@ class Agent(Unicycle):
             theta: Initial agent angle (radians). Optional.
             speed: Initial agent speed (pixels/second). Optional.
             name: Name of the car image. Optional.
+            rng: The numpy RandomState which the noise is drawn from. Defaults
+                 to numpy's global generator.
         """
         self.init_x = x
         self.init_y = y
@@ -26,16 +45,16 @@ class Agent(Unicycle):
         self.init_speed = speed
 
         if agent.NOISE:
-            x = add_noise(x, agent.STD_X)
-            y = add_noise(y, agent.STD_Y)
-            theta = add_noise(theta, agent.STD_THETA)
-            speed = add_noise(speed, agent.STD_SPEED)
+            x = add_noise(x, agent.STD_X, rng)
+            y = add_noise(y, agent.STD_Y, rng)
+            theta = add_noise(theta, agent.STD_THETA, rng)
+            speed = add_noise(speed, agent.STD_SPEED, rng)
 
         super(Agent, self).__init__(x, y, theta, speed)
 
         self.name = name
 
-        self.img = pygame.image.load(os.path.join(global_var.PATH, "media", name + ".png"))
+        self.img = load_sprite(name)
         self.width = self.img.get_width()
         self.height = self.img.get_height()
 
@@ -45,17 +64,19 @@ class Agent(Unicycle):
         # Shift the bounding box to the correct orientation and position.
         self.bounding_box.move_to(x, y, theta)
 
-    def reset(self, noise=True):
+    def reset(self, noise=True, rng=np.random):
         """Resets the agent to the initial position.
 
         Args:
             noise: Whether to add noise when resetting. Defaults to True.
+            rng: The numpy RandomState which the noise is drawn from. Defaults
+                 to numpy's global generator.
         """
         if agent.NOISE and noise:
-            x = add_noise(self.init_x, agent.STD_X)
-            y = add_noise(self.init_y, agent.STD_Y)
-            theta = add_noise(self.init_theta, agent.STD_THETA)
-            speed = add_noise(self.init_speed, agent.STD_SPEED)
+            x = add_noise(self.init_x, agent.STD_X, rng)
+            y = add_noise(self.init_y, agent.STD_Y, rng)
+            theta = add_noise(self.init_theta, agent.STD_THETA, rng)
+            speed = add_noise(self.init_speed, agent.STD_SPEED, rng)
         else:
             x = self.init_x
             y = self.init_y
@@ -65,19 +86,32 @@ class Agent(Unicycle):
         self.set_state(x, y, theta, speed)
         self.bounding_box.move_to(x, y, theta)
 
-    def move(self, acc, heading):
+    def move(self, acc, heading, dt=1.0):
         """Moves the agent forward one step.
 
         Args:
             acc: Acceleration command.
             heading: Steering command.
+            dt: Length of the step. Defaults to 1.
         """
         # Move the actual object.
-        delta_x, delta_y, delta_theta = super(Agent, self).move(acc, heading)
+        delta_x, delta_y, delta_theta = super(Agent, self).move(acc, heading, dt)
 
         # Move its bounding box as well.
         self.bounding_box.transform(delta_x, delta_y, delta_theta)
 
+    def place(self, x, y, theta, speed):
+        """Places the agent at a given state, moving its bounding box with it.
+
+        Args:
+            x: The x position (pixels).
+            y: The y position (pixels).
+            theta: The heading (radians).
+            speed: The speed (pixels/timestep).
+        """
+        self.set_state(x, y, theta, speed)
+        self.bounding_box.move_to(x, y, theta)
+
     def in_map(self, width, height):
         """Returns True if the agent is inside a map of a given height and width
         and False otherwise."""
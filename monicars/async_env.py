@@ -0,0 +1,227 @@
+"""Non-blocking stepping of environments, for callers driven by an event loop."""
+import threading
+import multiprocessing
+from collections import deque
+from Queue import Queue
+import numpy as np
+
+
+class StepFuture(object):
+    """The result of a call made on a worker thread of an AsyncEnvironment.
+    Callbacks added with add_done_callback are called on that thread when the
+    call is done, so an event loop can schedule the rest of its work from them.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._result = None
+        self._error = None
+
+    def done(self):
+        """Returns whether the call is done."""
+        return self._event.is_set()
+
+    def result(self, timeout=None):
+        """Returns the result of the call, waiting for it if needed. Errors
+        raised by the call are raised again here.
+
+        Args:
+            timeout: The longest time to wait (seconds). Waits forever if None.
+        """
+        if not self._event.wait(timeout):
+            raise RuntimeError("The call wasn't done in time.")
+
+        if self._error is not None:
+            raise self._error
+
+        return self._result
+
+    def add_done_callback(self, fn):
+        """Calls fn with the future when the call is done, or straight away
+        if it is already done."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+
+        fn(self)
+
+    def _set(self, result, error=None):
+        """Sets the result of the call and calls the callbacks."""
+        with self._lock:
+            self._result = result
+            self._error = error
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+
+        for fn in callbacks:
+            fn(self)
+
+
+class AsyncEnvironment(object):
+    """Steps one or many environments without blocking the caller, on a
+    bounded pool of worker threads. Each environment has a queue of calls,
+    which are made in order and never two at a time, and the environments
+    with queued calls take turns on the workers, one call per turn. Calls
+    return a StepFuture straight away.
+
+    A call which waits, for the pacing of tick or slow rendering, holds up
+    its worker but not the caller, so environments which tick need as many
+    workers as there are environments to keep their rate.
+
+    Vectorized callers use step_async and step_wait, which step all the
+    environments at once.
+    """
+
+    def __init__(self, envs, n_workers=None):
+        """Starts the worker threads.
+
+        Args:
+            envs: An Environment, or a list of them.
+            n_workers: The number of worker threads. Defaults to the number of
+                       CPUs, and is never more than the number of environments.
+        """
+        self.envs = list(envs) if isinstance(envs, (list, tuple)) else [envs]
+        if n_workers is None:
+            n_workers = multiprocessing.cpu_count()
+        self.n_workers = max(min(n_workers, len(self.envs)), 1)
+
+        self._calls = [deque() for _ in self.envs]
+        self._scheduled = [False] * len(self.envs)  # Whether each environment is in the ready queue.
+        self._ready = Queue()  # The environments with calls to make, in turn.
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pending = None
+
+        for _ in range(self.n_workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def __len__(self):
+        return len(self.envs)
+
+    def _work(self):
+        """Makes the next call of the environments whose turn it is until
+        closed."""
+        while True:
+            i = self._ready.get()
+            if i is None:
+                return
+
+            with self._lock:
+                fn, args, future = self._calls[i].popleft()
+
+            try:
+                result = fn(self.envs[i], *args)
+            except Exception as e:
+                future._set(None, e)
+            else:
+                future._set(result)
+
+            # The environment waits for another turn if it has more calls.
+            with self._lock:
+                if self._calls[i]:
+                    self._ready.put(i)
+                else:
+                    self._scheduled[i] = False
+
+    def submit(self, i, fn, *args):
+        """Calls fn(env, *args) on a worker, after the calls already queued
+        for environment i.
+
+        Returns:
+            A StepFuture of the result.
+        """
+        future = StepFuture()
+        with self._lock:
+            self._calls[i].append((fn, args, future))
+            if not self._scheduled[i]:
+                self._scheduled[i] = True
+                self._ready.put(i)
+
+        return future
+
+    def step(self, action, i=0, npc_action=None):
+        """Steps environment i.
+
+        Returns:
+            A StepFuture of (obs, reward, done), as returned by Environment.step.
+        """
+        return self.submit(i, lambda env: env.step(action, npc_action))
+
+    def reset(self, i=0):
+        """Resets environment i.
+
+        Returns:
+            A StepFuture of the initial observation.
+        """
+        return self.submit(i, lambda env: env.reset())
+
+    def reset_all(self):
+        """Resets all the environments together and returns the list of their
+        initial observations."""
+        return [future.result() for future in [self.reset(i) for i in range(len(self.envs))]]
+
+    def step_async(self, actions):
+        """Starts stepping all the environments, one action each. Call
+        step_wait for the results.
+
+        Args:
+            actions: One action per environment.
+        """
+        if self._pending is not None:
+            raise ValueError("step_wait must be called before stepping again.")
+        if len(actions) != len(self.envs):
+            raise ValueError("Expected %d actions, got %d." % (len(self.envs), len(actions)))
+
+        self._pending = [self.step(action, i) for i, action in enumerate(actions)]
+
+    def step_wait(self, timeout=None):
+        """Waits for the steps started by step_async.
+
+        Args:
+            timeout: The longest time to wait for each environment (seconds).
+                     Waits forever if None.
+
+        Returns:
+            A tuple (obs, rewards, dones) where obs is the list of
+            observations and rewards and dones are arrays, with one entry per
+            environment.
+        """
+        if self._pending is None:
+            raise ValueError("step_async must be called before step_wait.")
+
+        pending = self._pending
+        self._pending = None
+        results = [future.result(timeout) for future in pending]
+
+        obs = [result[0] for result in results]
+        rewards = np.array([result[1] for result in results], dtype=float)
+        dones = np.array([result[2] for result in results], dtype=bool)
+
+        return obs, rewards, dones
+
+    def close(self, quit=True):
+        """Stops the worker threads once the queued calls are done.
+
+        Args:
+            quit: Whether to quit the environments as well. Defaults to True.
+        """
+        # The calls of each environment are made in order, so the queued
+        # calls are done once a last call to each environment is.
+        for future in [self.submit(i, lambda env: None) for i in range(len(self.envs))]:
+            future.result()
+
+        for _ in self._threads:
+            self._ready.put(None)
+        for thread in self._threads:
+            thread.join()
+
+        if quit:
+            for env in self.envs:
+                env.quit()
@@ -0,0 +1,226 @@
+"""Bird's-eye view occupancy grid observations, rasterized with numpy."""
+import numpy as np
+from util import GREY, WHITE
+from variables import bev
+
+
+def pack_layers(raster):
+    """Returns the map channels of the grid packed in one uint8 array of the
+    shape of the raster, with the road in bit 0 and the lane markings in bit
+    1, so that a single lookup is needed per cell.
+
+    Args:
+        raster: The colour classes of the map. See View.get_raster.
+    """
+    layers = ((raster == GREY) | (raster == WHITE)).astype(np.uint8)
+    layers |= (raster == WHITE).astype(np.uint8) << 1
+
+    return layers
+
+
+class BirdsEyeView(object):
+    """Rasterizes a square grid centred on the agent and aligned with its
+    heading. The first row of the grid is ahead of the agent and the first
+    column is on its left. The channels are:
+
+        0: Road, which is any grey or white pixel of the map.
+        1: Lane markings, which are the white pixels of the map.
+        2: NPC occupancy.
+        3: The agent's own footprint.
+
+    Each cell takes the value of the point at its centre.
+    """
+
+    CHANNELS = ["road", "marking", "npc", "agent"]
+
+    def __init__(self, layers, size=None, extent=None):
+        """Initializes the grid.
+
+        Args:
+            layers: The packed map channels, of shape (height, width). See
+                    pack_layers. They can be memory mapped, since only the
+                    cells of the grid are read.
+            size: The number of cells along each side of the grid. Defaults to
+                  the value from the config.
+            extent: The length of each side of the grid (pixels). Defaults to
+                    the value from the config.
+        """
+        self.size = size if size is not None else bev.SIZE
+        self.extent = extent if extent is not None else bev.EXTENT
+
+        # The map channels, flattened without copying them. The grid stays
+        # inside the map while the agent is further than reach from its
+        # edges, otherwise the cells outside are set off road.
+        self.height, self.width = layers.shape
+        self.layers = layers.reshape(-1)
+        self.reach = int(np.ceil(self.extent / np.sqrt(2))) + 1
+        self.index_type = np.int32 if len(self.layers) < 2 ** 31 else np.intp
+
+        # Offsets of the cell centres ahead of the agent, per row, and to the
+        # right of the agent, per column.
+        self.cell = float(self.extent) / self.size
+        offsets = (np.arange(self.size) + 0.5) * self.cell - self.extent / 2.0
+        self.ahead = -offsets
+        self.right = offsets
+
+    def observe(self, agent_state, agent_size, npc_boxes):
+        """Rasterizes the grid.
+
+        Args:
+            agent_state: The agent state, (x, y, theta, speed).
+            agent_size: The agent footprint, (length, width).
+            npc_boxes: Array of shape (K, 5) where each row is the box of an
+                       NPC, (x, y, theta, length, width).
+
+        Returns:
+            A uint8 array of shape (4, size, size).
+        """
+        x, y, theta = agent_state[0:3]
+        sin = np.sin(theta)
+        cos = np.cos(theta)
+
+        # Positions of the cell centres in the map, as the sum of an offset
+        # per row and one per column. Ahead is the direction of travel (sin,
+        # cos), and right is (-cos, sin) since y points down. The sums are
+        # truncated to integers as they are written, without float arrays for
+        # the whole grid, which floors them where they are positive, and the
+        # indices are int32 unless the map is too large.
+        row_x = self.ahead * sin
+        col_x = x - self.right * cos
+        row_y = self.ahead * cos
+        col_y = y + self.right * sin
+
+        px = np.empty((self.size, self.size), dtype=self.index_type)
+        py = np.empty((self.size, self.size), dtype=self.index_type)
+        np.add.outer(row_x, col_x, out=px, casting="unsafe")
+        np.add.outer(row_y, col_y, out=py, casting="unsafe")
+
+        # Near the edges of the map, the rows which leave it are found from
+        # their ends, since the positions are monotonic along a row. The
+        # cells of those rows which are outside the map are found from their
+        # positions, and set off road after a lookup which clips the flat
+        # indices to the map.
+        border = None
+        if not (self.reach <= x < self.width - self.reach and self.reach <= y < self.height - self.reach):
+            ends_x = row_x[:, np.newaxis] + col_x[[0, -1]]
+            ends_y = row_y[:, np.newaxis] + col_y[[0, -1]]
+            border = np.nonzero((ends_x.min(axis=1) < 0) | (ends_x.max(axis=1) >= self.width) |
+                                (ends_y.min(axis=1) < 0) | (ends_y.max(axis=1) >= self.height))[0]
+
+            border_x = np.add.outer(row_x[border], col_x)
+            border_y = np.add.outer(row_y[border], col_y)
+            outside = (border_x < 0) | (border_x >= self.width) | (border_y < 0) | (border_y >= self.height)
+
+        py *= self.width
+        py += px
+
+        grid = np.empty((len(self.CHANNELS), self.size, self.size), dtype=np.uint8)
+        grid[2:] = 0
+
+        # Map channels.
+        layers = np.take(self.layers, py, mode="clip")
+        if border is not None and len(border) > 0:
+            rows = layers[border]
+            rows[outside] = 0
+            layers[border] = rows
+        np.bitwise_and(layers, 1, out=grid[0])
+        np.right_shift(layers, 1, out=grid[1])
+
+        self._draw_boxes(grid[2], (x, y, sin, cos), npc_boxes)
+
+        # The agent is centred on the grid and aligned with it, so its
+        # footprint is the block of cells within half its size.
+        rows = np.nonzero(np.abs(self.ahead) <= agent_size[0] / 2.0)[0]
+        cols = np.nonzero(np.abs(self.right) <= agent_size[1] / 2.0)[0]
+        if len(rows) > 0 and len(cols) > 0:
+            grid[3, rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1] = 1
+
+        return grid
+
+    def _draw_boxes(self, channel, frame, boxes):
+        """Sets the cells of a channel whose centres are inside any of the
+        boxes. The boxes which can't reach the grid are skipped. For the
+        others, the span of cells inside the box is found for every row it
+        covers, and all the spans are filled at once.
+
+        Args:
+            channel: The channel to draw on, a contiguous array of shape (size, size).
+            frame: The agent pose, as (x, y, sin(theta), cos(theta)).
+            boxes: Array of shape (K, 5) where each row is (x, y, theta, length, width).
+        """
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 5)
+        x, y, sin, cos = frame
+
+        # Skip the boxes which are further from the agent than the corners of
+        # the grid.
+        dx = boxes[:, 0] - x
+        dy = boxes[:, 1] - y
+        reach = self.extent / np.sqrt(2) + np.hypot(boxes[:, 3], boxes[:, 4]) / 2.0
+        near = dx * dx + dy * dy <= reach * reach
+        if not near.any():
+            return
+        boxes, dx, dy = boxes[near], dx[near], dy[near]
+
+        # Position of the box centres ahead of and to the right of the agent,
+        # and the corresponding fractional row.
+        ahead = dx * sin + dy * cos
+        right = dy * sin - dx * cos
+        row = (self.extent / 2.0 - ahead) / self.cell - 0.5
+
+        # Rows which cover the largest box, given the orientation of the
+        # boxes relative to the grid.
+        rel = boxes[:, 2] - np.arctan2(sin, cos)
+        rel_sin = np.sin(rel)
+        rel_cos = np.cos(rel)
+        half_rows = (boxes[:, 3] * np.abs(rel_cos) + boxes[:, 4] * np.abs(rel_sin)).max() / 2.0 / self.cell
+        span = np.arange(-int(np.ceil(half_rows)), int(np.ceil(half_rows)) + 2)
+        rows = np.floor(row)[:, np.newaxis] + span[np.newaxis, :]
+
+        # Along the centre line of a row, the position relative to a box,
+        # along its length and across it, is linear in the offset t to the
+        # right of the agent. Each is within the box over an interval of t.
+        row_ahead = self.extent / 2.0 - (rows + 0.5) * self.cell - ahead[:, np.newaxis]
+        t_min, t_max = self._slab(row_ahead * rel_cos[:, np.newaxis] + right[:, np.newaxis] * rel_sin[:, np.newaxis],
+                                  -rel_sin[:, np.newaxis], boxes[:, 3:4] / 2.0)
+        across_min, across_max = self._slab(right[:, np.newaxis] * rel_cos[:, np.newaxis] -
+                                            row_ahead * rel_sin[:, np.newaxis],
+                                            -rel_cos[:, np.newaxis], boxes[:, 4:5] / 2.0)
+        t_min = np.maximum(t_min, across_min)
+        t_max = np.minimum(t_max, across_max)
+
+        # The columns whose centres are in the interval.
+        first = np.ceil(np.clip((t_min + self.extent / 2.0) / self.cell - 0.5, -1, self.size))
+        last = np.floor(np.clip((t_max + self.extent / 2.0) / self.cell - 0.5, -1, self.size))
+        first = np.maximum(first, 0).astype(int)
+        last = np.minimum(last, self.size - 1).astype(int)
+
+        valid = (rows >= 0) & (rows < self.size) & (last >= first)
+        rows, first, lengths = rows[valid].astype(int), first[valid], (last - first + 1)[valid]
+        if len(rows) == 0:
+            return
+
+        # Fill the spans, with the flat index of each cell counted from the
+        # start of its span.
+        starts = np.cumsum(lengths) - lengths
+        cells = np.arange(lengths.sum()) + np.repeat(rows * self.size + first - starts, lengths)
+        channel.reshape(-1)[cells] = 1
+
+    @staticmethod
+    def _slab(offset, rate, half):
+        """Returns the interval of t where abs(offset + rate * t) <= half, as
+        arrays of its lower and upper ends, with an empty interval where
+        lower > upper."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ends_a = (-half - offset) / rate
+            ends_b = (half - offset) / rate
+
+        lower = np.minimum(ends_a, ends_b)
+        upper = np.maximum(ends_a, ends_b)
+
+        flat = rate == 0
+        if flat.any():
+            inside = np.abs(offset) <= half
+            lower = np.where(flat, np.where(inside, -np.inf, np.inf), lower)
+            upper = np.where(flat, np.where(inside, np.inf, -np.inf), upper)
+
+        return lower, upper
@@ -0,0 +1,70 @@
+"""Car following with the Intelligent Driver Model (IDM), for all the cars at once."""
+import numpy as np
+from variables import traffic
+
+DELTA = 4  # Acceleration exponent of the free road term.
+
+
+def find_leaders(lanes, s):
+    """Returns the car ahead of each car in its lane. The cars are sorted by
+    lane and then by distance along the lane, so the leader of a car is the
+    next car in that order if it is in the same lane.
+
+    Args:
+        lanes: Integer array of shape (N,) of lane ids, -1 outside the lanes.
+        s: Array of shape (N,) of distances along the lanes.
+
+    Returns:
+        Integer array of shape (N,) with the index of the leader of each car,
+        or -1 if it has none. Cars outside the lanes have no leader.
+    """
+    lanes = np.asarray(lanes)
+    leaders = np.full(len(lanes), -1, dtype=int)
+    if len(lanes) < 2:
+        return leaders
+
+    order = np.lexsort((s, lanes))
+    same = (lanes[order[1:]] == lanes[order[:-1]]) & (lanes[order[:-1]] >= 0)
+    leaders[order[:-1][same]] = order[1:][same]
+
+    return leaders
+
+
+def get_accelerations(lane_map, states, lengths, desired_speed=None):
+    """Returns the IDM acceleration of each car, following the car ahead in
+    its lane. Parameters are taken from the traffic configuration.
+
+    Args:
+        lane_map: The LaneMap of the map.
+        states: Array of shape (N, 4) of states (x, y, theta, speed).
+        lengths: Array of shape (N,) of the lengths of the cars.
+        desired_speed: The speed the cars drive at on a free road. Defaults
+                       to the traffic speed.
+
+    Returns:
+        Array of shape (N,) of accelerations, between -MAX_DECEL and IDM_ACC.
+    """
+    v0 = traffic.SPEED if desired_speed is None else desired_speed
+    states = np.asarray(states, dtype=float).reshape(-1, 4)
+    lengths = np.asarray(lengths, dtype=float)
+
+    lanes, coords = lane_map.frenet(states)
+    leaders = find_leaders(lanes, coords[:, 0])
+
+    speed = np.maximum(states[:, 3], 0)
+    acc = traffic.IDM_ACC * (1 - (speed / v0) ** DELTA)
+
+    follower = np.nonzero(leaders >= 0)[0]
+    leader = leaders[follower]
+    if len(follower) > 0:
+        # Bumper to bumper gap, and the speed of the leader along the lane.
+        gap = coords[leader, 0] - coords[follower, 0] - (lengths[leader] + lengths[follower]) / 2.0
+        gap = np.maximum(gap, 1e-3)
+        v = speed[follower]
+        approach = v - speed[leader] * np.cos(coords[leader, 2])
+
+        desired_gap = traffic.MIN_GAP + np.maximum(
+            0, v * traffic.TIME_HEADWAY + v * approach / (2 * np.sqrt(traffic.IDM_ACC * traffic.COMFORT_DECEL)))
+        acc[follower] -= traffic.IDM_ACC * (desired_gap / gap) ** 2
+
+    return np.clip(acc, -traffic.MAX_DECEL, traffic.IDM_ACC)
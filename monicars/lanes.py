@@ -0,0 +1,146 @@
+"""Lane geometry of a map, for lane relative (Frenet) coordinates."""
+import numpy as np
+from util import normalize_angle
+from map_assets import get_asset
+
+# Heading of each start orientation of the map YAMLs.
+DIRS = {"down": 0, "right": np.pi / 2, "up": np.pi, "left": -np.pi / 2}
+
+
+class LaneMap(object):
+    """Lookup grid of the lane under each pixel of a map, with the centreline
+    of each lane, so that the Frenet coordinates of any number of points are
+    found with one lookup each.
+
+    The lanes are the rectangular lane zones of the map. The centreline of a
+    lane runs along its long side, through its middle, in the direction of
+    travel of the lane. The direction of travel is taken from the NPC starts
+    inside the lane, or else from the agent start, or else it is down or right.
+    The Frenet coordinates are:
+
+        s: The distance along the centreline from the start of the lane.
+        d: The signed distance from the centreline, positive to the right of
+           the direction of travel.
+        heading_error: The heading relative to the direction of travel.
+    """
+
+    def __init__(self, description, env_name=None, mmap_mode=None):
+        """Builds the lookup grid.
+
+        Args:
+            description: The map description, as loaded from its YAML.
+            env_name: The name of the map. If set, the grid is cached with
+                      the other arrays derived from the map, see map_assets,
+                      and shared by the environments of the process.
+                      Optional.
+            mmap_mode: With env_name, the grid is memory mapped from the
+                       cache with this mode of numpy.load. Optional.
+        """
+        self.width = description["width"]
+        self.height = description["height"]
+
+        zones = [zone for zone in description["zones"] if zone["label"] == "lane"]
+        starts = [(start["position"], DIRS[start["orientation"]]) for start in description["starts"]]
+        agent_start = description["agent_start"]
+        starts.append(((agent_start["x"], agent_start["y"]), agent_start["theta"]))
+
+        # Bounds of each lane, (min x, min y, max x, max y), and the origin,
+        # heading and length of its centreline.
+        self.bounds = np.zeros((len(zones), 4))
+        self.origins = np.zeros((len(zones), 2))
+        self.headings = np.zeros(len(zones))
+        self.lengths = np.zeros(len(zones))
+
+        for i in range(len(zones)):
+            (x, y), (w, h) = zones[i]["corner"], zones[i]["size"]
+            self.bounds[i] = (x, y, x + w, y + h)
+            self.origins[i], self.headings[i] = self._centreline(x, y, w, h, starts)
+            self.lengths[i] = max(w, h)
+
+        self.tangents = np.stack((np.sin(self.headings), np.cos(self.headings)), axis=-1)
+
+        # Id of the lane under each pixel, or -1.
+        if env_name is not None:
+            self.grid = get_asset(env_name, "lanes", self._build_grid, mmap_mode)
+        else:
+            self.grid = self._build_grid()
+
+    def _build_grid(self):
+        """Returns the id of the lane under each pixel, or -1, as an int16
+        array of shape (height, width). Lanes are painted in reverse so that
+        the first lane wins where lanes overlap, as in get_zone."""
+        grid = np.full((self.height, self.width), -1, dtype=np.int16)
+
+        for i in reversed(range(len(self.bounds))):
+            x, y, x_max, y_max = self.bounds[i].astype(int)
+            grid[max(y, 0):y_max, max(x, 0):x_max] = i
+
+        return grid
+
+    def _centreline(self, x, y, w, h, starts):
+        """Returns the origin and the heading of the centreline of a lane."""
+        vertical = h >= w
+        heading = 0 if vertical else np.pi / 2
+
+        for (sx, sy), theta in starts:
+            if x <= sx < x + w and y <= sy < y + h:
+                # Snap the start heading to the closest direction along the lane.
+                along = np.cos(theta) if vertical else np.sin(theta)
+                heading = heading if along >= 0 else normalize_angle(heading + np.pi)
+                break
+
+        if vertical:
+            origin = (x + w / 2.0, y if np.cos(heading) > 0 else y + h)
+        else:
+            origin = (x if np.sin(heading) > 0 else x + w, y + h / 2.0)
+
+        return origin, heading
+
+    def get_lanes(self, points):
+        """Returns the id of the lane under each point, or -1 if there is none.
+        The lanes are looked up by pixel, so a point on the top or left edge
+        of a lane is in it, unlike with Environment.get_zone.
+
+        Args:
+            points: Array of shape (N, 2) of positions.
+
+        Returns:
+            Integer array of shape (N,).
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        ix = np.floor(points[:, 0]).astype(int)
+        iy = np.floor(points[:, 1]).astype(int)
+        inside = (ix >= 0) & (ix < self.width) & (iy >= 0) & (iy < self.height)
+
+        lanes = np.full(len(points), -1, dtype=int)
+        lanes[inside] = self.grid[iy[inside], ix[inside]]
+
+        return lanes
+
+    def frenet(self, states):
+        """Returns the lane relative coordinates of a set of states.
+
+        Args:
+            states: Array of shape (N, 3) or (N, 4) of states (x, y, theta, ...).
+
+        Returns:
+            A tuple (lanes, coords) where lanes is an integer array of shape
+            (N,) of lane ids, -1 outside of the lanes, and coords is an array
+            of shape (N, 3) of (s, d, heading_error), NaN outside of the lanes.
+        """
+        states = np.asarray(states, dtype=float)
+        states = states.reshape(-1, states.shape[-1]) if states.size > 0 else states.reshape(0, 4)
+        lanes = self.get_lanes(states[:, 0:2])
+        coords = np.full((len(states), 3), np.nan)
+
+        in_lane = lanes >= 0
+        lane = lanes[in_lane]
+        delta = states[in_lane, 0:2] - self.origins[lane]
+        tangent = self.tangents[lane]
+
+        # The right of the direction of travel (sin, cos) is (-cos, sin), since y points down.
+        coords[in_lane, 0] = delta[:, 0] * tangent[:, 0] + delta[:, 1] * tangent[:, 1]
+        coords[in_lane, 1] = delta[:, 1] * tangent[:, 0] - delta[:, 0] * tangent[:, 1]
+        coords[in_lane, 2] = normalize_angle(states[in_lane, 2] - self.headings[lane])
+
+        return lanes, coords
@@ -0,0 +1,132 @@
+"""Launching worker processes which share the maps loaded by their parent.
+
+The parent loads the modules, the map images, descriptions and arrays and the
+car images once, then forks the workers. Forked workers start with the memory
+of the parent, and its pages are only copied when written, so the loaded maps
+are shared by all the workers rather than loaded by each of them.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import traceback
+from monicars import Environment
+from agent import load_sprite
+from map_assets import get_road_distance
+from variables import traffic
+
+
+def preload(env_names, **kwargs):
+    """Loads everything the environments of some maps need into this process,
+    by creating one environment per map.
+
+    Args:
+        env_names: The names of the maps.
+
+    Keyword Args:
+        The keyword arguments of the environments, so that the assets they
+        use are loaded. They aren't rendered unless render is given.
+    """
+    kwargs.setdefault("render", False)
+
+    for name in ["red_car"] + list(traffic.TYPES):
+        load_sprite(name)
+
+    for env_name in env_names:
+        env = Environment(env_name, **kwargs)
+        get_road_distance(env_name, env.view.get_road())
+        env.quit()
+
+
+def get_memory(pid="self"):
+    """Returns the memory used by a process, as a tuple (rss, pss) in kB, or
+    None if it isn't available, which is the case outside of Linux. The
+    proportional set size (PSS) counts the pages shared with other processes
+    divided by the number of processes sharing them, so that the PSS of a set
+    of processes adds up to the memory they use together.
+
+    Args:
+        pid: The id of the process. Defaults to this process.
+    """
+    totals = {"Rss:": 0, "Pss:": 0}
+    for name in ["smaps_rollup", "smaps"]:
+        path = os.path.join("/proc", str(pid), name)
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    fields = line.split()
+                    if fields and fields[0] in totals:
+                        totals[fields[0]] += int(fields[1])
+
+            return totals["Rss:"], totals["Pss:"]
+
+    return None
+
+
+class WorkerLauncher(object):
+    """Forks worker processes from a parent which preloaded the maps.
+
+    Only fork from a process with no other threads running, such as render
+    threads or env servers, since the workers only get the forking thread.
+    """
+
+    def __init__(self, env_names, **kwargs):
+        """Preloads the maps. See preload.
+
+        Args:
+            env_names: The names of the maps the workers use.
+
+        Keyword Args:
+            The keyword arguments of the environments of the workers.
+        """
+        preload(env_names, **kwargs)
+        self.pids = []
+
+    def launch(self, target, n_workers, *args):
+        """Forks workers which call target(index, *args) and exit, with
+        status 0 if it returned and 1 if it raised.
+
+        Args:
+            target: The function the workers run.
+            n_workers: The number of workers.
+
+        Returns:
+            The list of process ids of the new workers.
+        """
+        pids = []
+        for i in range(n_workers):
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+            pid = os.fork()
+            if pid == 0:
+                status = 0
+                try:
+                    target(i, *args)
+                except BaseException:
+                    traceback.print_exc()
+                    status = 1
+                finally:
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    os._exit(status)
+
+            pids.append(pid)
+
+        self.pids += pids
+        return pids
+
+    def join(self):
+        """Waits for all the workers to exit.
+
+        Returns:
+            The list of exit statuses of the workers, in the order they were
+            launched.
+        """
+        statuses = []
+        for pid in self.pids:
+            _, status = os.waitpid(pid, 0)
+            statuses.append(os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1)
+
+        self.pids = []
+        return statuses
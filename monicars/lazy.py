@@ -0,0 +1,52 @@
+"""Observations which are only computed when they are read."""
+import numpy as np
+
+
+class LazyObservation(object):
+    """Stands for an observation of an environment, which is only computed
+    the first time it is read, with get, by indexing or iterating over it or
+    by converting it to an array. It must be read before the environment
+    steps or resets again, since it is computed from the current state.
+    """
+
+    def __init__(self, env, build):
+        """Initializes the handle.
+
+        Args:
+            env: The Environment observed.
+            build: A function which takes no arguments and returns the
+                   observation.
+        """
+        self._env = env
+        self._build = build
+        self._id = env.observation_id
+        self._value = None
+
+    @property
+    def built(self):
+        """Whether the observation was computed."""
+        return self._build is None
+
+    def get(self):
+        """Returns the observation, computing it if needed."""
+        if self._build is not None:
+            if self._env.observation_id != self._id:
+                raise ValueError("The observation was not read before the environment stepped again.")
+
+            self._value = self._build()
+            self._build = None
+            self._env = None
+
+        return self._value
+
+    def __array__(self, dtype=None):
+        return np.asarray(self.get(), dtype=dtype)
+
+    def __getitem__(self, index):
+        return self.get()[index]
+
+    def __len__(self):
+        return len(self.get())
+
+    def __iter__(self):
+        return iter(self.get())
@@ -0,0 +1,176 @@
+"""Range sensor which casts rays against the road edges and the NPCs."""
+import numpy as np
+from variables import lidar
+
+
+class Lidar(object):
+    """Casts rays from the agent and returns the distance along each ray to
+    the first off road pixel or NPC, or the maximum range if there is none.
+
+    All the rays are marched together over the road mask of the map, in steps
+    of a fixed length, so road edges are found to within one step. The NPCs
+    are intersected exactly as oriented boxes, all rays against all boxes at
+    once.
+    """
+
+    ROWS = 256  # Number of states marched together by scan_states, which bounds its memory.
+
+    def __init__(self, road, n_rays=None, fov=None, max_range=None, step=None):
+        """Initializes the sensor.
+
+        Args:
+            road: The road mask of the map, of shape (height, width). See
+                  View.get_road. It can be memory mapped, since only the
+                  samples of the rays are read.
+            n_rays: The number of rays. Defaults to the value from the config.
+            fov: The angle covered by the rays, centred on the heading
+                 (radians). Defaults to the value from the config.
+            max_range: The length of the rays (pixels). Defaults to the value
+                       from the config.
+            step: The distance between two samples along a ray when marching
+                  over the map (pixels). Defaults to the value from the config.
+        """
+        self.n_rays = n_rays if n_rays is not None else lidar.RAYS
+        self.fov = fov if fov is not None else lidar.FOV
+        self.max_range = float(max_range if max_range is not None else lidar.MAX_RANGE)
+        self.step = float(step if step is not None else lidar.STEP)
+
+        # Angle of each ray relative to the heading. A full circle would
+        # otherwise have two rays in the same direction.
+        if np.isclose(self.fov, 2 * np.pi):
+            self.angles = np.linspace(-np.pi, np.pi, self.n_rays, endpoint=False)
+        else:
+            self.angles = np.linspace(-self.fov / 2.0, self.fov / 2.0, self.n_rays)
+
+        # Distance of each sample along a ray.
+        self.samples = np.arange(1, int(np.ceil(self.max_range / self.step)) + 1) * self.step
+        self.samples[-1] = self.max_range
+
+        # The road mask, flattened without copying it. The rays stay inside
+        # the map while the agent is further than reach from its edges,
+        # otherwise the samples outside are clipped and counted off road.
+        self.height, self.width = road.shape
+        self.road = road.reshape(-1)
+        self.reach = int(np.ceil(self.max_range)) + 1
+
+    def scan(self, agent_state, npc_boxes):
+        """Casts the rays.
+
+        Args:
+            agent_state: The agent state, (x, y, theta, speed).
+            npc_boxes: Array of shape (K, 5) where each row is the box of an
+                       NPC, (x, y, theta, length, width).
+
+        Returns:
+            Array of shape (n_rays,) of distances (pixels).
+        """
+        x, y, theta = agent_state[0:3]
+        angles = theta + self.angles
+        sin = np.sin(angles)
+        cos = np.cos(angles)
+
+        ranges = self._march(x, y, sin, cos)
+
+        npc_boxes = np.asarray(npc_boxes, dtype=float).reshape(-1, 5)
+        if len(npc_boxes) > 0:
+            ranges = np.minimum(ranges, self._intersect(x, y, sin, cos, npc_boxes))
+
+        return ranges
+
+    def scan_states(self, agent_states, npc_boxes=None, present=None):
+        """Casts the rays from many states at once, as scan does for each.
+
+        Args:
+            agent_states: Array of shape (N, 4) of agent states.
+            npc_boxes: Array of shape (N, K, 5) of the NPC boxes of each
+                       state, (x, y, theta, length, width). Optional.
+            present: Boolean array of shape (N, K) of the NPCs which are
+                     present. Defaults to all of them.
+
+        Returns:
+            Array of shape (N, n_rays) of distances (pixels).
+        """
+        agent_states = np.asarray(agent_states, dtype=float).reshape(-1, 4)
+        if npc_boxes is None:
+            npc_boxes = np.zeros((len(agent_states), 0, 5))
+        npc_boxes = np.asarray(npc_boxes, dtype=float).reshape(len(agent_states), -1, 5)
+
+        ranges = np.empty((len(agent_states), self.n_rays))
+        for start in range(0, len(agent_states), self.ROWS):
+            rows = slice(start, start + self.ROWS)
+            x, y, theta = agent_states[rows, 0], agent_states[rows, 1], agent_states[rows, 2]
+            angles = theta[:, np.newaxis] + self.angles
+            sin = np.sin(angles)
+            cos = np.cos(angles)
+
+            ranges[rows] = self._march(x, y, sin, cos)
+
+            if npc_boxes.shape[1] > 0:
+                ranges[rows] = np.minimum(ranges[rows], self._intersect(
+                    x, y, sin, cos, npc_boxes[rows], None if present is None else present[rows]))
+
+        return ranges
+
+    def _march(self, x, y, sin, cos):
+        """Returns the distance to the first off road sample along each ray.
+        The rays are of shape (..., n_rays), from origins of shape (...)."""
+        x = np.asarray(x, dtype=float)[..., np.newaxis, np.newaxis]
+        y = np.asarray(y, dtype=float)[..., np.newaxis, np.newaxis]
+        px = x + sin[..., np.newaxis] * self.samples
+        py = y + cos[..., np.newaxis] * self.samples
+
+        outside = None
+        if not ((self.reach <= x) & (x < self.width - self.reach) &
+                (self.reach <= y) & (y < self.height - self.reach)).all():
+            outside = (px < 0) | (px >= self.width) | (py < 0) | (py >= self.height)
+            np.clip(px, 0, self.width - 1, out=px)
+            np.clip(py, 0, self.height - 1, out=py)
+
+        off_road = ~np.take(self.road, py.astype(np.intp) * self.width + px.astype(np.intp))
+        if outside is not None:
+            off_road |= outside
+        first = off_road.argmax(axis=-1)
+
+        return np.where(off_road.any(axis=-1), self.samples[first], self.max_range)
+
+    def _intersect(self, x, y, sin, cos, boxes, present=None):
+        """Returns the distance to the closest box along each ray, using the
+        slab method in the frame of each box. The rays are of shape (...,
+        n_rays), from origins of shape (...), and the boxes of shape (..., K,
+        5). The boxes which aren't present, if given, are skipped."""
+        box_sin = np.sin(boxes[..., np.newaxis, :, 2])
+        box_cos = np.cos(boxes[..., np.newaxis, :, 2])
+
+        # Origin of the rays and their directions along and across each box,
+        # of shape (..., 1, K) and (..., n_rays, K).
+        dx = np.asarray(x, dtype=float)[..., np.newaxis, np.newaxis] - boxes[..., np.newaxis, :, 0]
+        dy = np.asarray(y, dtype=float)[..., np.newaxis, np.newaxis] - boxes[..., np.newaxis, :, 1]
+        origin = (dx * box_sin + dy * box_cos, dx * box_cos - dy * box_sin)
+        sin = sin[..., np.newaxis]
+        cos = cos[..., np.newaxis]
+        direction = (sin * box_sin + cos * box_cos, sin * box_cos - cos * box_sin)
+        half = (boxes[..., np.newaxis, :, 3] / 2.0, boxes[..., np.newaxis, :, 4] / 2.0)
+
+        enter = np.full(direction[0].shape, -np.inf)
+        leave = np.full(direction[0].shape, np.inf)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for o, d, h in zip(origin, direction, half):
+                t1 = (-h - o) / d
+                t2 = (h - o) / d
+
+                # Rays parallel to a slab are either always or never inside it.
+                parallel = d == 0
+                inside = np.abs(o) <= h
+                t1 = np.where(parallel, np.where(inside, -np.inf, np.inf), t1)
+                t2 = np.where(parallel, np.where(inside, np.inf, -np.inf), t2)
+
+                enter = np.maximum(enter, np.minimum(t1, t2))
+                leave = np.minimum(leave, np.maximum(t1, t2))
+
+        hit = (enter <= leave) & (leave >= 0)
+        if present is not None:
+            hit &= present[..., np.newaxis, :]
+        dist = np.where(hit, np.maximum(enter, 0), np.inf)
+
+        return np.minimum(dist.min(axis=-1), self.max_range)
@@ -0,0 +1,125 @@
+"""Arrays derived from the maps, computed once per map and cached.
+
+Each asset is kept in memory for the life of the process and saved to the
+cache folder of the maps, so that it is only computed again when the image
+or the YAML of its map changes, or when the version of the asset, which is
+part of the name of its file, is changed along with the code building it.
+The map descriptions are kept in memory too.
+"""
+import os
+import tempfile
+import yaml
+import numpy as np
+from scipy.ndimage import distance_transform_edt
+from variables import global_var
+
+_assets = {}  # Maps (env_name, key) to the loaded assets.
+_descriptions = {}  # Maps env_name to the parsed map YAML.
+
+
+def get_description(env_name):
+    """Returns the description of a map, as loaded from its YAML. It is
+    parsed once per process and shared, so it should not be modified.
+
+    Args:
+        env_name: The name of the map.
+    """
+    if env_name not in _descriptions:
+        with open(os.path.join(global_var.PATH, "maps", env_name + ".yaml")) as f:
+            _descriptions[env_name] = yaml.load(f)
+
+    return _descriptions[env_name]
+
+
+def get_asset(env_name, key, build, mmap_mode=None, version=1):
+    """Returns an asset of a map, from memory, from the disk cache or else
+    built and saved to the cache.
+
+    The cache file is written to a temporary file next to it, which is then
+    renamed over it, so that other processes never read a partly written
+    file, and those which memory map the previous file keep reading it.
+
+    Args:
+        env_name: The name of the map.
+        key: The name of the asset.
+        build: A function which takes no arguments and returns the asset, as
+               a numpy array.
+        mmap_mode: If set, the asset is memory mapped from the disk cache with
+                   this mode of numpy.load, so that only the parts which are
+                   read are loaded. Optional.
+        version: The version of the asset, to be increased whenever the way
+                 it is built changes, so that the cached files are rebuilt.
+                 Defaults to 1.
+
+    Returns:
+        The asset. It is shared, so it should not be modified.
+    """
+    if (env_name, key) in _assets:
+        return _assets[(env_name, key)]
+
+    maps = os.path.join(global_var.PATH, "maps")
+    path = os.path.join(maps, "cache", "%s.%s.v%d.npy" % (env_name, key, version))
+    sources = [os.path.join(maps, env_name + ext) for ext in [".png", ".yaml"]]
+
+    asset = None
+    if os.path.exists(path):
+        mtime = max(os.path.getmtime(source) for source in sources if os.path.exists(source))
+        if os.path.getmtime(path) >= mtime:
+            asset = np.load(path, mmap_mode=mmap_mode)
+
+    if asset is None:
+        asset = build()
+        try:
+            _save(path, asset)
+            if mmap_mode is not None:
+                asset = np.load(path, mmap_mode=mmap_mode)
+        except (IOError, OSError):
+            pass  # The package may be installed read only, so the disk cache is optional.
+
+    _assets[(env_name, key)] = asset
+
+    return asset
+
+
+def _save(path, asset):
+    """Saves an array to a temporary file in the folder of path and renames
+    it to path, which replaces any previous file atomically."""
+    folder = os.path.dirname(path)
+    if not os.path.isdir(folder):
+        try:
+            os.makedirs(folder)
+        except OSError:
+            if not os.path.isdir(folder):  # Another process may have created it.
+                raise
+
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, asset)
+        os.rename(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def get_road_distance(env_name, road, mmap_mode=None):
+    """Returns the signed distance field of the road of a map: the distance
+    from each pixel to the edge of the road, positive on the road and negative
+    off it, as a float32 array of shape (height, width) indexed by [y, x].
+    The distances are measured from the centre of each pixel to the boundary
+    between road and off road pixels.
+
+    Args:
+        env_name: The name of the map.
+        road: The road mask of the map. See View.get_road.
+        mmap_mode: If set, the field is memory mapped from the cache with this
+                   mode of numpy.load. Optional.
+    """
+    def build():
+        # Distances to the nearest pixel centre across the edge, which is
+        # half a pixel further than the edge itself.
+        inside = distance_transform_edt(road)
+        outside = distance_transform_edt(~road)
+        return (inside - outside + np.where(road, -0.5, 0.5)).astype(np.float32)
+
+    return get_asset(env_name, "road_distance", build, mmap_mode)
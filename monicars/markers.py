@@ -0,0 +1,141 @@
+"""Lane markers of a map, stored as segments with a spatial index."""
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class Markers(object):
+    """The lane markers of a map, split into short segments. The midpoints of
+    the segments are indexed with a KD-tree, so that the nearest marker to
+    many points is found without testing every segment.
+
+    The shapes of marker supported in the map YAML are:
+
+        straight: A line between two points, [[x1, y1], [x2, y2]].
+        polyline: A line through a list of points, [[x1, y1], [x2, y2], ...].
+        arc: A circular arc around a centre, [x, y], with a radius and a pair
+             of angles, [start, end]. The angles are in radians, from the x
+             axis towards the y axis, which is clockwise on the screen.
+
+    Markers have no direction, so the angle of a marker is in [-pi/2, pi/2),
+    with 0 along the y axis as for headings.
+    """
+
+    SEGMENT = 10.0  # Maximum length of a segment (pixels).
+
+    def __init__(self, markers):
+        """Splits the markers into segments and builds the index.
+
+        Args:
+            markers: The list of lane markers from the map description.
+        """
+        starts = []
+        ends = []
+        ids = []
+
+        for i, marker in enumerate(markers):
+            points = self._get_points(marker)
+            starts.append(points[:-1])
+            ends.append(points[1:])
+            ids.append(np.full(len(points) - 1, i, dtype=int))
+
+        self.n_markers = len(markers)
+        self.starts = np.concatenate(starts) if starts else np.zeros((0, 2))
+        self.ends = np.concatenate(ends) if ends else np.zeros((0, 2))
+        self.ids = np.concatenate(ids) if ids else np.zeros(0, dtype=int)
+
+        # Undirected angle of each segment.
+        delta = self.ends - self.starts
+        self.angles = (np.arctan2(delta[:, 0], delta[:, 1]) + np.pi / 2) % np.pi - np.pi / 2
+
+        self.tree = cKDTree((self.starts + self.ends) / 2.0) if len(self.ids) > 0 else None
+
+    def __len__(self):
+        return self.n_markers
+
+    def _get_points(self, marker):
+        """Returns the points of a marker, as an array of shape (P, 2), such
+        that no segment between two points is longer than SEGMENT."""
+        if marker["shape"] in ["straight", "polyline"]:
+            corners = np.asarray(marker["points"], dtype=float)
+            if marker["shape"] == "straight" and len(corners) != 2:
+                raise ValueError("A straight lane marker needs exactly two points.")
+
+            points = [corners[0:1]]
+            for start, end in zip(corners[:-1], corners[1:]):
+                n = max(int(np.ceil(np.hypot(*(end - start)) / self.SEGMENT)), 1)
+                t = np.arange(1, n + 1)[:, np.newaxis] / float(n)
+                points.append(start + t * (end - start))
+
+            return np.concatenate(points)
+
+        if marker["shape"] == "arc":
+            start, end = marker["angles"]
+            radius = float(marker["radius"])
+            n = max(int(np.ceil(abs(end - start) * radius / self.SEGMENT)), 1)
+            angles = np.linspace(start, end, n + 1)
+
+            return np.stack((marker["centre"][0] + radius * np.cos(angles),
+                             marker["centre"][1] + radius * np.sin(angles)), axis=-1)
+
+        raise ValueError("Unsupported lane marker shape: %s." % marker["shape"])
+
+    def nearest(self, points):
+        """Finds the nearest marker to each point.
+
+        Args:
+            points: Array of shape (N, 2) of positions.
+
+        Returns:
+            A tuple (distances, angles, ids) of arrays of shape (N,), with the
+            distance to the nearest marker, the angle of the marker at its
+            closest point and the index of the marker.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        n = len(points)
+
+        if self.tree is None:
+            return np.full(n, np.inf), np.full(n, np.nan), np.full(n, -1, dtype=int)
+
+        distances = np.zeros(n)
+        segments = np.zeros(n, dtype=int)
+
+        # The closest point of the nearest segment is nearer than the nearest
+        # midpoint, and a segment's midpoint is at most SEGMENT / 2 away from
+        # any of its points, so only the segments with a midpoint within that
+        # much of the nearest midpoint are candidates. More neighbours are
+        # requested for the points where they don't cover all the candidates.
+        remaining = np.arange(n)
+        k = 8
+        while len(remaining) > 0:
+            k = min(k, len(self.ids))
+            mid_dist, candidates = self.tree.query(points[remaining], k)
+            mid_dist = mid_dist.reshape(len(remaining), k)
+            candidates = candidates.reshape(len(remaining), k)
+
+            dist = self._distances(points[remaining], candidates)
+            best = dist.argmin(axis=1)
+            rows = np.arange(len(remaining))
+            distances[remaining] = dist[rows, best]
+            segments[remaining] = candidates[rows, best]
+
+            covered = mid_dist[:, -1] > mid_dist[:, 0] + self.SEGMENT / 2.0
+            if k == len(self.ids):
+                break
+
+            remaining = remaining[~covered]
+            k *= 4
+
+        return distances, self.angles[segments], self.ids[segments]
+
+    def _distances(self, points, segments):
+        """Returns the distance from each point, of shape (N, 2), to each of
+        its candidate segments, of shape (N, k)."""
+        start = self.starts[segments]
+        delta = self.ends[segments] - start
+        offset = points[:, np.newaxis] - start
+
+        length = (delta ** 2).sum(axis=-1)
+        t = np.clip((offset * delta).sum(axis=-1) / np.maximum(length, 1e-12), 0, 1)
+        closest = offset - t[..., np.newaxis] * delta
+
+        return np.hypot(closest[..., 0], closest[..., 1])
@@ -0,0 +1,210 @@
+"""Per-episode metrics, accumulated while stepping and saved as columns."""
+import os
+import math
+import yaml
+import numpy as np
+
+
+class EpisodeMetrics(object):
+    """Summarises an episode of the agent while it runs. Every update is a
+    constant amount of work on values the environment already has, so no
+    trajectory is kept.
+
+    The metrics of an episode are:
+        - episode: The index of the episode, counted from the number of
+          records already written. Episodes without steps aren't counted.
+        - steps: The number of steps.
+        - collisions: The number of steps which ended in a collision.
+        - off_road_steps: The number of steps which ended off the road.
+        - lane_time, intersection_time, on_road_time, off_road_time: The time
+          spent in each type of zone, as the sum of the lengths of the steps
+          there, in the time units of dt. See Environment.get_zone.
+        - distance: The distance travelled.
+        - min_obstacle_gap: The smallest distance between the centres of the
+          agent and the Obstacle less their half lengths, which is the gap
+          between the bumpers of cars in a line. NaN without an Obstacle.
+        - mean_speed: The mean of the absolute speed over the steps.
+    """
+
+    COLUMNS = [("episode", "<u4"), ("steps", "<u4"), ("collisions", "<u4"), ("off_road_steps", "<u4"),
+               ("lane_time", "<f8"), ("intersection_time", "<f8"), ("on_road_time", "<f8"),
+               ("off_road_time", "<f8"), ("distance", "<f8"), ("min_obstacle_gap", "<f8"),
+               ("mean_speed", "<f8")]
+
+    ZONE_TYPES = ["lane", "intersection", "on_road", "off_road"]
+
+    def __init__(self, dt, writer=None):
+        """Initializes the accumulator.
+
+        Args:
+            dt: The length of a step, in the time units of the simulation,
+                as the dt of the environment.
+            writer: A ColumnWriter which the record of every finished episode
+                    is appended to. Optional.
+        """
+        self.dt = dt
+        self.writer = writer
+        self.episode = writer.count() if writer is not None else 0
+        self.steps = 0
+        self.start((0, 0))
+
+    def start(self, pos):
+        """Starts a new episode.
+
+        Args:
+            pos: The initial position of the agent, (x, y).
+        """
+        if self.steps > 0:
+            self.episode += 1
+
+        self.steps = 0
+        self.collisions = 0
+        self.off_road_steps = 0
+        self.zone_steps = dict((zone_type, 0) for zone_type in self.ZONE_TYPES)
+        self.distance = 0.0
+        self.min_obstacle_gap = float("inf")
+        self.speed_sum = 0.0
+        self.last_pos = (pos[0], pos[1])
+
+    def update(self, zone, pos, speed, collision, obstacle_gap=None):
+        """Adds a step to the episode.
+
+        Args:
+            zone: The zone of the agent after the step, as Environment.get_zone.
+            pos: The position of the agent after the step, (x, y).
+            speed: The speed of the agent after the step.
+            collision: Whether the agent collided.
+            obstacle_gap: The gap to the Obstacle, or None if there is none.
+        """
+        self.steps += 1
+        self.collisions += int(collision)
+        self.off_road_steps += int(zone[0] == "off_road")
+        self.zone_steps[zone[0]] += 1
+        self.distance += math.hypot(pos[0] - self.last_pos[0], pos[1] - self.last_pos[1])
+        self.speed_sum += abs(speed)
+        self.last_pos = (pos[0], pos[1])
+
+        if obstacle_gap is not None and obstacle_gap < self.min_obstacle_gap:
+            self.min_obstacle_gap = obstacle_gap
+
+    def get(self):
+        """Returns the metrics of the current episode, as a dictionary keyed
+        by the names of COLUMNS."""
+        record = {"episode": self.episode,
+                  "steps": self.steps,
+                  "collisions": self.collisions,
+                  "off_road_steps": self.off_road_steps,
+                  "distance": self.distance,
+                  "min_obstacle_gap": (self.min_obstacle_gap if self.min_obstacle_gap != float("inf")
+                                       else float("nan")),
+                  "mean_speed": self.speed_sum / self.steps if self.steps > 0 else 0.0}
+
+        for zone_type in self.ZONE_TYPES:
+            record[zone_type + "_time"] = self.zone_steps[zone_type] * self.dt
+
+        return record
+
+    def finish(self):
+        """Ends the current episode, appending its record to the writer unless
+        it has no steps, and returns the record."""
+        record = self.get()
+        if self.writer is not None and self.steps > 0:
+            self.writer.append(record)
+
+        return record
+
+
+class ColumnWriter(object):
+    """Appends records to a directory holding one raw binary file per column,
+    named after the column, next to a columns.yaml schema with the names and
+    the types of the columns. Each column can be read on its own, with
+    numpy.fromfile or read_columns, and records are appended without reading
+    the files back.
+
+    Records are written one column after the other, so a record cut short,
+    by a crash for example, leaves some columns longer than the others, which
+    read_columns ignores. The writer truncates every column to the complete
+    records when it opens a directory, so the records it appends line up. A
+    directory should only be written by one writer at a time.
+    """
+
+    SCHEMA = "columns.yaml"
+
+    def __init__(self, path, columns=EpisodeMetrics.COLUMNS):
+        """Creates the directory, or checks that its columns match and drops
+        the values of a record cut short.
+
+        Args:
+            path: The directory to write to.
+            columns: A list of (name, numpy dtype string) pairs.
+        """
+        self.path = path
+        self.columns = [(name, np.dtype(dtype)) for name, dtype in columns]
+
+        schema = [[name, dtype.str] for name, dtype in self.columns]
+        schema_path = os.path.join(path, self.SCHEMA)
+
+        if os.path.exists(schema_path):
+            if _load_schema(path) != schema:
+                raise ValueError("The columns in " + path + " don't match the records.")
+        else:
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            with open(schema_path, "w") as f:
+                yaml.safe_dump(schema, f)
+
+        n = self.count()
+        for name, dtype in self.columns:
+            file_path = os.path.join(path, name + ".bin")
+            if os.path.exists(file_path) and os.path.getsize(file_path) > n * dtype.itemsize:
+                with open(file_path, "rb+") as f:
+                    f.truncate(n * dtype.itemsize)
+
+    def count(self):
+        """Returns the number of complete records."""
+        sizes = []
+        for name, dtype in self.columns:
+            file_path = os.path.join(self.path, name + ".bin")
+            sizes.append(os.path.getsize(file_path) // dtype.itemsize if os.path.exists(file_path) else 0)
+
+        return min(sizes) if sizes else 0
+
+    def append(self, record):
+        """Appends a record, a dictionary with a value for every column."""
+        for name, dtype in self.columns:
+            with open(os.path.join(self.path, name + ".bin"), "ab") as f:
+                f.write(np.array(record[name], dtype=dtype).tobytes())
+
+
+def _load_schema(path):
+    """Returns the [name, dtype] pairs of the columns in a directory."""
+    with open(os.path.join(path, ColumnWriter.SCHEMA)) as f:
+        return yaml.safe_load(f)
+
+
+def read_columns(path, names=None):
+    """Reads the records of a directory written by a ColumnWriter.
+
+    Args:
+        path: The directory.
+        names: The columns to read. Defaults to all of them.
+
+    Returns:
+        A dictionary mapping the names of the columns to arrays, all of the
+        length of the shortest column.
+    """
+    schema = _load_schema(path)
+    if names is not None:
+        unknown = set(names) - set(name for name, _ in schema)
+        if unknown:
+            raise ValueError("Unknown columns: " + ", ".join(sorted(unknown)))
+        schema = [(name, dtype) for name, dtype in schema if name in names]
+
+    columns = {}
+    for name, dtype in schema:
+        file_path = os.path.join(path, name + ".bin")
+        columns[name] = np.fromfile(file_path, dtype=dtype) if os.path.exists(file_path) else np.zeros(0, dtype)
+
+    n = min(len(column) for column in columns.values()) if columns else 0
+
+    return dict((name, column[:n]) for name, column in columns.items())
@@ -1,5 +1,6 @@
 """Models for motion."""
 import math
+import numpy as np
 from util import normalize_angle
 
 
@@ -19,24 +20,24 @@ class Unicycle(object):
         self._heading = theta  # radians
         self._speed = speed  # pixels/timestep
 
-    def move(self, acc, heading):
+    def move(self, acc, heading, dt=1.0):
         """Steps the object forward by one timestep using the unicycle model.
 
         Args:
             acc: Acceleration command.
             heading: Steering command.
+            dt: Length of the timestep. Defaults to 1, in which case the speed
+                is equal to the displacement.
         """
-        # Since this is one timestep, we do not need to multiply by time.
-        self._speed += acc
+        self._speed += acc * dt
 
-        steerAngle = self._speed * math.tan(heading) / 50.0
+        steerAngle = self._speed * math.tan(heading) / 50.0 * dt
         self._heading += steerAngle
 
         self._heading = normalize_angle(self._heading)
 
-        # Since this is one timestep, the speed is equal to the displacement.
-        delta_x = self._speed * math.sin(self._heading)
-        delta_y = self._speed * math.cos(self._heading)
+        delta_x = self._speed * math.sin(self._heading) * dt
+        delta_y = self._speed * math.cos(self._heading) * dt
 
 
         self._x += delta_x
@@ -80,3 +81,26 @@ class Unicycle(object):
 
     def set_speed(self, speed):
         self.set_state(self._x, self._y, self._heading, speed)
+
+
+def unicycle_step(state, acc, heading, dt=1.0):
+    """Steps states forward by one timestep using the unicycle model. This is
+    the vectorized equivalent of Unicycle.move.
+
+    Args:
+        state: Array of shape (..., 4) of states (x, y, theta, speed).
+        acc: Array of acceleration commands, broadcastable to state[..., 0].
+        heading: Array of steering commands, broadcastable to state[..., 0].
+        dt: Length of the timestep. Defaults to 1.
+
+    Returns:
+        Array of shape (..., 4) of the new states.
+    """
+    state = np.asarray(state, dtype=float)
+
+    speed = state[..., 3] + acc * dt
+    theta = normalize_angle(state[..., 2] + speed * np.tan(heading) / 50.0 * dt)
+    x = state[..., 0] + speed * np.sin(theta) * dt
+    y = state[..., 1] + speed * np.cos(theta) * dt
+
+    return np.stack((x, y, theta, speed), axis=-1)
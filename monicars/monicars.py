@@ -1,15 +1,28 @@
 #!/usr/bin/env python
 from __future__ import print_function
 
-import os
-import yaml
-import time
 import pygame
+import numpy as np
 from agent import Agent
 from util import limit, input_to_action, is_close
-from util import Rectangle, Line
+from util import Rectangle
 from npc import NPCManager
 from view import View
+from pacing import Pacer
+from render_thread import RenderThread
+from bev import BirdsEyeView, pack_layers
+from lidar import Lidar
+from rollout import rollout
+from reset_pool import ResetPool
+from query import StateQuery
+from lazy import LazyObservation
+from metrics import EpisodeMetrics, ColumnWriter
+from replay import hash_cars
+from lanes import LaneMap
+from markers import Markers
+from map_assets import get_road_distance, get_description, get_asset
+from zones import ZoneTracker
+from routing import LaneGraph
 from variables import screen, global_var, agent, set_env
 
 
@@ -66,13 +79,47 @@ class Environment(object):
         Keyword Args:
             render: Whether the environment should be rendered. Defaults to True.
             vision: Whether to return raw pixel values as observations. Defaults to False.
+            bev: Whether to return a bird's-eye view occupancy grid as observations. Defaults to False.
+            lidar: Whether to add lidar ranges to the state observation. Defaults to False.
+            road_distance: Whether to add the signed distance from the agent to the edge of the road to the
+                           state observation. Defaults to False.
             obstacle: Whether to use the special Obstacle NPC. Defaults to False.
+            goal: The zone to route the agent to, ("lane", ID) or ("intersection", ID). Optional.
+            track_npcs: Whether to track the zones of the NPCs as well as the agent's, for zone events.
+                        Defaults to False.
             decimals: Number of decimals in the observations. Defaults to None (no rounding).
             reward_function: The reward funtion to use. Defaults to internal reward.
             feature_function: A function to transform observations to a feature vector.
             tick: Whether to tick the clock at the desired frequency when stepping the env. Defaults to False.
+            dt: Length of a step. Defaults to the value from the config.
+            substeps: Number of integration steps per step. Defaults to the value from the config.
+            substep_checks: Whether to check for collisions and leaving the map after every substep
+                            instead of only after the step. Defaults to False.
+            max_lag: With tick, how far behind schedule (seconds) the env may fall before the pacer
+                     gives up catching up. Defaults to 0.1.
             flip: Whether to flip the display so that the user can control the car more easily. Defaults to False.
             scroll: Whether to follow the view of the agent or generate the whole environment. Defaults to True.
+            render_rate: If set, the display is drawn by a separate thread at this rate (frames/second)
+                         instead of on every step. Optional.
+            recorder: A FrameRecorder to save the rendered frames with. Only frames which are rendered,
+                      with render or vision, are recorded. With render_rate and without vision, the frames
+                      drawn by the render thread are recorded. Optional.
+            reset_pool: If set, the initial states are sampled ahead of time in batches of this size, and
+                        starts which are off the road or where the agent overlaps the obstacle are rejected.
+                        Optional.
+            tiled_map: Whether to read the map image in tiles, memory mapped from the cache of the maps,
+                       rather than load the whole image. Defaults to False.
+            lazy_obs: Whether step returns a LazyObservation, which is only computed when it is read,
+                      instead of the observation. Defaults to False.
+            metrics: Whether to accumulate the metrics of each episode, see get_metrics. If it is a path,
+                     the record of every episode is also appended to the columnar directory there when the
+                     environment resets or quits. Optional.
+            hash_states: Whether to keep a rolling hash of the state of the world after the reset and every step,
+                         in state_hashes, to check replays against. See Replay. Defaults to False.
+            seed: If set, the environment samples the noise and the traffic from its own random number
+                  generator, seeded with it, so that it doesn't change the episodes of other environments.
+                  Otherwise they are sampled from the global generator of numpy, which np.random.seed
+                  controls. Optional.
         """
         self.max_angle = global_var.MAX_ANGLE
         self.max_acc = global_var.MAX_ACC
@@ -83,21 +130,37 @@ class Environment(object):
         # KEYWORD ARGS
         self.render = kwargs["render"] if "render" in kwargs else True
         self.vision = kwargs["vision"] if "vision" in kwargs else False
+        self.bev = kwargs["bev"] if "bev" in kwargs else False
+        self.lidar = kwargs["lidar"] if "lidar" in kwargs else False
+        self.road_distance = kwargs["road_distance"] if "road_distance" in kwargs else False
         self.obstacle = kwargs["obstacle"] if "obstacle" in kwargs else False
+        self.track_npcs = kwargs["track_npcs"] if "track_npcs" in kwargs else False
         self.decimals = kwargs["decimals"] if "decimals" in kwargs else None
         self.reward = kwargs["reward_function"] if "reward_function" in kwargs else self._default_reward
         self.feature_fn = kwargs["feature_function"] if "feature_function" in kwargs else self._default_feature_fn
         self.tick = kwargs["tick"] if "tick" in kwargs else False
         self.flip = kwargs["flip"] if "flip" in kwargs else False
         self.scroll = kwargs["scroll"] if "scroll" in kwargs else True
+        self.dt = kwargs["dt"] if "dt" in kwargs else global_var.DT
+        self.substeps = kwargs["substeps"] if "substeps" in kwargs else global_var.SUBSTEPS
+        self.substep_checks = kwargs["substep_checks"] if "substep_checks" in kwargs else False
+        max_lag = kwargs["max_lag"] if "max_lag" in kwargs else 0.1
+        self.render_rate = kwargs["render_rate"] if "render_rate" in kwargs else None
+        self.tiled_map = kwargs["tiled_map"] if "tiled_map" in kwargs else False
+        self.mmap_mode = "r" if self.tiled_map else None  # How the arrays of the map are loaded.
+        self.lazy_obs = kwargs["lazy_obs"] if "lazy_obs" in kwargs else False
+        metrics = kwargs["metrics"] if "metrics" in kwargs else None
+        self.hash_states = kwargs["hash_states"] if "hash_states" in kwargs else False
+        self.rng = np.random.RandomState(kwargs["seed"]) if "seed" in kwargs else np.random
 
         # ZONES
         self.lanes = []
         self.intersections = []
-        self.lane_markers = []
+        self.lane_markers = None
 
-        with open(os.path.join(global_var.PATH, "maps", env_name + ".yaml")) as f:
-            description = yaml.load(f)
+        description = get_description(env_name)
+
+        self.description = description
 
         # Width and height of the actual environment.
         self.width = description["width"]
@@ -105,33 +168,89 @@ class Environment(object):
 
         self._create_zones(description)
 
+        # Lookup grid of the lanes, for the lane relative coordinates.
+        self.lane_map = LaneMap(description, env_name, self.mmap_mode)
+
         # Choose whether to use the pos from the config or the default pos from the map.
         if agent.USE_POS:
-            self.agent = Agent()
+            self.agent = Agent(rng=self.rng)
         else:
             pos = description["agent_start"]
-            self.agent = Agent(pos["x"], pos["y"], pos["theta"])
+            self.agent = Agent(pos["x"], pos["y"], pos["theta"], rng=self.rng)
 
         self._keep_agent_in_map()
 
-        self.npc_manager = NPCManager(description["starts"], (self.width, self.height), self.obstacle)
-
-        # Number of elements in the action and the observation vectors.
-        self.observation_n = len(self._get_observation())
-        self.action_n = 2
+        self.npc_manager = NPCManager(description["starts"], (self.width, self.height), self.obstacle,
+                                      self.lane_map, self.rng)
 
+        self.env_name = env_name
         self.clock = None
         self.display_surface = None
+        self.render_thread = None
+        self.substep_done = False  # Whether the episode ended during a substep.
+        self.collision = False  # Whether the agent collided at the end of the last step.
+        self.observation_id = 0  # Counts the steps and resets, after which lazy observations are stale.
+        self.state_hash = 0  # The rolling hash of the states of the episode, with hash_states.
+        self.state_hashes = []
+
+        # Keeps stepping in real time when ticking.
+        self.pacer = Pacer(global_var.FPS, max_lag)
 
         # The PNG image of the map.
-        if self.scroll:
-            self.view = View(env_name, description["width"], description["height"],
-                             screen.WIDTH, screen.HEIGHT, self.flip)
-        else:
-            self.view = View(env_name, description["width"], description["height"])
+        self.view = self._create_view()
+
+        if "recorder" in kwargs:
+            self.view.attach_recorder(kwargs["recorder"])
+
+        # The bird's-eye view grid, rasterized from the map.
+        self.bev_grid = None
+        if self.bev:
+            layers = get_asset(env_name, "bev_layers", lambda: pack_layers(self.view.get_raster()), self.mmap_mode)
+            self.bev_grid = BirdsEyeView(layers)
+
+        # The range sensor. It is created on demand if lidar is off.
+        self.lidar_sensor = Lidar(self.view.get_road()) if self.lidar else None
+
+        # Routes between the zones, and the zone to route the agent to.
+        self.lane_graph = LaneGraph(env_name, self.lane_map, self.intersections)
+        self.goal = kwargs["goal"] if "goal" in kwargs else None
+
+        # Follows the zones of the cars from step to step.
+        self.zone_tracker = ZoneTracker(self.lanes, self.intersections, self.view.get_road())
+
+        # Signed distance to the edge of the road of every pixel. It is loaded
+        # on demand if road_distance is off.
+        self.road_distance_field = None
+        if self.road_distance:
+            self.road_distance_field = get_road_distance(env_name, self.view.get_road(), self.mmap_mode)
+
+        # Initial states for the resets, generated ahead of time.
+        self.reset_pool = None
+        if "reset_pool" in kwargs and kwargs["reset_pool"]:
+            obstacle_car = self.npc_manager.obstacle_car
+            self.reset_pool = ResetPool(
+                (self.agent.init_x, self.agent.init_y, self.agent.init_theta, self.agent.init_speed),
+                (self.agent.height, self.agent.width),
+                (obstacle_car.height, obstacle_car.width) if obstacle_car is not None else None,
+                self.view.get_road(), kwargs["reset_pool"], self.rng)
+
+        # Labels arrays of logged states with the map. It is created on demand.
+        self.state_query = None
+
+        # Summarises each episode while stepping.
+        self.metrics = None
+        if metrics:
+            writer = ColumnWriter(metrics) if isinstance(metrics, basestring) else None
+            self.metrics = EpisodeMetrics(self.dt, writer)
+            self.metrics.start(self.agent.get_pos())
 
         self.setup()
 
+        # Number of elements in the action and the observation vectors. The
+        # display needs to be set up first in vision mode.
+        self.observation_n = len(self._get_observation())
+        self.action_n = 2
+
     def setup(self):
         """Sets up the simulation environment and initializes the pygame environment."""
         if self.render or self.vision:
@@ -143,7 +262,33 @@ class Environment(object):
             pygame.display.set_caption('Traffic World')
             pygame.display.update()
 
+        # The render thread draws with its own view so that it never shares
+        # surfaces with the simulation.
+        if self.render and self.render_rate is not None and self.render_thread is None:
+            view = self._create_view()
+
+            # Without vision, the view of the simulation is never drawn, so
+            # the recorder moves to the view of the render thread.
+            if not self.vision and self.view.recorder is not None:
+                view.attach_recorder(self.view.detach_recorder())
+
+            self.render_thread = RenderThread(view, self.display_surface, self.render_rate)
+            self.render_thread.start()
+
     def quit(self):
+        if self.render_thread is not None:
+            self.render_thread.stop()
+            if self.render_thread.view.recorder is not None:
+                self.view.attach_recorder(self.render_thread.view.detach_recorder())
+            self.render_thread = None
+
+        if self.view.recorder is not None:
+            self.view.detach_recorder().close()
+
+        if self.metrics is not None:
+            self.metrics.finish()
+            self.metrics.start(self.agent.get_pos())
+
         if self.render:
             pygame.quit()
 
@@ -154,6 +299,43 @@ class Environment(object):
             action: The action the agent should take, in format (linear acceleration, angular acceleration).
             npc_action: A list of actions to control the NPCs. Optional.
         """
+        zone = self._advance(action, npc_action)
+
+        # A lazy observation is computed from the state after the step, so it
+        # is built straight away if the agent left the map, since the agent is
+        # then moved back inside.
+        if self.lazy_obs and self.agent.in_map(self.width, self.height):
+            obs = self._get_lazy_observation()
+        else:
+            # Update the view if we're in rendering or vision mode.
+            self._update_view()
+
+            obs = self._get_observation()
+
+        if self.tick:
+            self.pacer.wait()
+
+        done = self._end_step(zone)
+
+        return obs, self.reward(obs), done
+
+    def fast_step(self, action, npc_action=None):
+        """Advances the environment by one time step as step does, but without
+        drawing the view, building the observation or ticking, for
+        fast-forwarding. The state of the world is the same as after step.
+
+        Args:
+            action: The action the agent should take, in format (linear acceleration, angular acceleration).
+            npc_action: A list of actions to control the NPCs. Optional.
+
+        Returns:
+            Whether the episode is done.
+        """
+        return self._end_step(self._advance(action, npc_action))
+
+    def _advance(self, action, npc_action):
+        """Moves the cars over a step, adds and removes traffic and updates the
+        zones. Returns the zone of the agent."""
         # Bound the action values.
         limit(action[0], -1, 1)
         limit(action[1], -1, 1)
@@ -161,67 +343,149 @@ class Environment(object):
         # Convert the actions, which represent percentages, to the correct units.
         acc, theta = input_to_action(action)
 
-        # Move the agent.
-        self.agent.move(acc, theta)
+        # Integrate the motion of all the cars over the step.
+        sub_dt = float(self.dt) / self.substeps
+        self.substep_done = False
 
-        # Impose a limit on the agent's speed.
-        self.agent.set_speed(limit(self.agent.get_speed(), -self.max_speed, self.max_speed))
+        for _ in range(self.substeps):
+            # Move the agent.
+            self.agent.move(acc, theta, sub_dt)
 
-        # Move the traffic.
-        self.npc_manager.step(self.agent.bounding_box, npc_action)
+            # Impose a limit on the agent's speed.
+            self.agent.set_speed(limit(self.agent.get_speed(), -self.max_speed, self.max_speed))
 
-        # Update the view if we're in rendering or vision mode.
-        if self.render or self.vision:
-            # Collect a list of all the cars and their images and states.
-            cars = self._get_cars()
+            # Move the traffic.
+            self.npc_manager.move(npc_action, sub_dt, [self.agent])
 
-            # Get the view.
-            surf = self.view.update(self.agent.get_x(), self.agent.get_y(), cars)
+            if self.substep_checks and not self.substep_done:
+                self.substep_done = self._get_done()
 
-        # Render, if necessary.
-        if self.render:
-            self.display_surface.blit(surf, (0, 0))
-            pygame.display.update()
+        # Add and remove traffic.
+        self.npc_manager.update(self.agent.bounding_box, self.dt)
 
-        obs = self._get_observation()
+        zone = self._update_zones()
+        self.observation_id += 1
 
-        if self.tick:
-            time.sleep(1.0 / global_var.FPS)
+        return zone
 
+    def _end_step(self, zone):
+        """Checks whether the episode is done, keeps the agent in the map and
+        updates the metrics and the state hash. Returns whether it's done."""
         done = self._get_done()
 
         self._keep_agent_in_map()
-    
 
-        return obs , self.reward(obs), done
+        if self.metrics is not None:
+            self._update_metrics(zone)
+
+        if self.hash_states:
+            self._update_state_hash()
 
-    def reset(self, state=None):
+        return done
+
+    def reset(self, state=None, seed=None):
         """Resets the simulation.
 
         Args:
             state: The state to reset the environment to. Optional.
+            seed: If set, the random number generator of the environment,
+                  which the noise and the traffic are sampled with, is seeded
+                  with it first, so the episode can be replayed. Without a
+                  seed option, that is the global generator of numpy.
+                  Optional.
 
         Returns:
             Initial state.
         """
-        self.agent.reset()
-        self._keep_agent_in_map()
-        self.npc_manager.reset()
+        if self.metrics is not None:
+            self.metrics.finish()
 
-        if self.render or self.vision:
-            cars = self._get_cars()
-            surf = self.view.update(self.agent.get_x(), self.agent.get_y(), cars)
+        if seed is not None:
+            self.rng.seed(seed)
 
-        # Render, if necessary.
-        if self.render:
-            self.display_surface.blit(surf, (0, 0))
-            pygame.display.update()
+        if self.reset_pool is not None:
+            agent_state, obstacle_state, crash = self.reset_pool.next()
+            self.agent.place(*agent_state)
+            self._keep_agent_in_map()
+            self.npc_manager.reset(obstacle_state, crash)
+        else:
+            self.agent.reset(rng=self.rng)
+            self._keep_agent_in_map()
+            self.npc_manager.reset()
+        self.pacer.reset()
+        self.zone_tracker.reset()
+
+        self._update_view()
 
         if state is not None:
             self.set_state(state)
 
+        self._update_zones()
+        self.observation_id += 1
+
+        if self.metrics is not None:
+            self.metrics.start(self.agent.get_pos())
+
+        if self.hash_states:
+            self.state_hash = 0
+            self.state_hashes = []
+            self._update_state_hash()
+
         return self._get_observation()
 
+    def _create_view(self):
+        """Creates a View of the map, following the agent if scrolling."""
+        if self.scroll:
+            return View(self.env_name, self.width, self.height, screen.WIDTH, screen.HEIGHT, self.flip,
+                        self.tiled_map)
+
+        return View(self.env_name, self.width, self.height, tiled=self.tiled_map)
+
+    def _update_view(self):
+        """Draws the current state of the world onto the view if we're in
+        rendering or vision mode, and shows it on the display if rendering. With
+        a render thread, the display is left to it and the state of the world
+        is only published."""
+        if not self.render and not self.vision:
+            return
+
+        # Collect a list of all the cars and their images and states.
+        cars = self._get_cars()
+
+        if self.render_thread is not None:
+            self.render_thread.publish(self.agent.get_x(), self.agent.get_y(), cars)
+
+            if not self.vision:
+                return
+
+        # Get the view.
+        self.view.update(self.agent.get_x(), self.agent.get_y(), cars)
+
+        # Render, if necessary.
+        if self.render and self.render_thread is None:
+            self.view.show(self.display_surface)
+
+    def _get_lazy_observation(self):
+        """Returns a LazyObservation of the current state. The view is drawn
+        when it is read, unless rendering, where it is drawn now for the
+        display."""
+        if self.render:
+            self._update_view()
+
+        def build():
+            if not self.render:
+                self._update_view()
+
+            return self._get_observation()
+
+        return LazyObservation(self, build)
+
+    def get_timing(self):
+        """Returns the pacing statistics for the current episode when ticking,
+        as a dictionary with the number of frames, the number of missed
+        deadlines and the achieved frames per second."""
+        return self.pacer.get_stats()
+
     def _create_zones(self, desc):
         """Populates all the necessary variables which create the environment.
 
@@ -241,22 +505,20 @@ class Environment(object):
                 self.intersections.append(Intersection(zone["corner"], zone["size"], int_i))
                 int_i += 1
             else:
-                raise("Incorrect zone type provided.")
+                raise ValueError("Incorrect zone type provided.")
 
-        for lane in desc["lane_markers"]:
-            if lane["shape"] == "straight":
-                self.lane_markers.append(Line(lane["points"]))
-            else:
-                raise("Unsupported lane marker shape.")
+        self.lane_markers = Markers(desc["lane_markers"])
 
     def _get_lane(self):
         """Returns the lane ID of the the lane the agent is currently in. If
-        the agent is not in a lane, returns None."""
-        for lane in self.lanes:
-            if lane.is_inside(self.agent.get_pos()):
-                return lane.id
+        the agent is not in a lane, returns None. The lane is found by the
+        zone tracker, from the last zone of the agent, so it always agrees
+        with get_zone, where a point on the edge of a lane is outside it."""
+        i = self.zone_tracker.find(self.agent, self.agent.get_pos())
+        if i is None or self.zone_tracker.zones[i][0] != "lane":
+            return None
 
-        return None
+        return self.zone_tracker.zones[i][1]
 
     def _get_intersection(self):
         """Returns the intersection ID of the the intersection the agent is
@@ -277,20 +539,76 @@ class Environment(object):
             - intersection
             - on_road (for on an arbitrary type of road)
             - off_road
+
+        The zone is looked up starting from the last zone of the agent. See
+        ZoneTracker.
+        """
+        return self.zone_tracker.get_zone(self.agent, self.agent.get_pos())
+
+    def get_zone_events(self):
+        """Returns the zone transitions since the last call, oldest first, as
+        tuples (car, old zone, new zone, kind), where car is the agent or an
+        NPC and kind is one of the kinds of the zones module, such as
+        "lane_change" or "intersection_entry". NPCs are only tracked with
+        track_npcs."""
+        return self.zone_tracker.pop_events()
+
+    def get_route(self, goal=None):
+        """Returns the list of zones along the shortest route from the zone of
+        the agent to a goal zone, or None if there is none. See LaneGraph.
+
+        Args:
+            goal: The goal zone. Defaults to the goal of the environment.
         """
-        lane = self._get_lane()
-        if lane is not None:
-            return ("lane", lane)
+        zone = self.get_zone()
+        goal = goal if goal is not None else self.goal
+        if goal is None:
+            raise ValueError("No goal zone was given.")
+        if zone not in self.lane_graph.index:
+            return None
+
+        return self.lane_graph.get_route(zone, goal)
+
+    def get_route_progress(self, goal=None):
+        """Returns the progress of the agent along the shortest route to a
+        goal zone, as a tuple (next zone, waypoint, remaining distance), where
+        the waypoint is the entry point of the next zone. The next zone and
+        the waypoint are None in the goal or outside of the lanes and
+        intersections, where the distance is 0 and inf respectively. See
+        LaneGraph.get_progress.
 
-        intersection = self._get_intersection()
-        if intersection is not None:
-            return ("intersection", intersection)
+        Args:
+            goal: The goal zone. Defaults to the goal of the environment.
+        """
+        zone = self.get_zone()
+        goal = goal if goal is not None else self.goal
+        if goal is None:
+            raise ValueError("No goal zone was given.")
+        if zone not in self.lane_graph.index:
+            return None, None, np.inf
 
-        colour = self._check_pixels()
-        if colour in ["grey", "white"]:
-            return ("on_road", 0)
+        return self.lane_graph.get_progress(zone, self.agent.get_pos(), goal)
 
-        return ("off_road", 0)
+    def _update_zones(self):
+        """Updates the zone of the agent and, with track_npcs, of the NPCs,
+        which records their zone transitions. Returns the zone of the agent."""
+        zone = self.get_zone()
+
+        if self.track_npcs:
+            self._update_npc_zones([self.agent])
+
+        return zone
+
+    def _update_npc_zones(self, controlled):
+        """Updates the zones of the NPCs and forgets the cars which left,
+        other than the controlled cars."""
+        npcs = set(self.npc_manager.npcs)
+        for car in list(self.zone_tracker.last):
+            if car not in npcs and not any(car is c for c in controlled):
+                self.zone_tracker.forget(car)
+
+        for npc in self.npc_manager.npcs:
+            self.zone_tracker.get_zone(npc, npc.get_pos())
 
     def on_road(self):
         """Returns True if the agent is on a road, False otherwise."""
@@ -336,32 +654,51 @@ class Environment(object):
         return self.npc_manager.check_collision(self.agent.bounding_box)
 
     def _get_closest_marker(self):
-        """Returns the closest marker."""
+        """Returns the distance to the closest marker and the angle of the
+        marker relative to the agent's heading."""
         if len(self.lane_markers) == 0:
             return
 
-        pos = self.agent.get_pos()
-
-        min_idx = 0
-        min_dist = self.lane_markers[min_idx].dist_to_point(pos)
-        for i in range(1, len(self.lane_markers)):
-            dist = self.lane_markers[i].dist_to_point(pos)
-            if dist < min_dist:
-                min_dist = dist
-                min_idx = i
+        dist, angle, _ = self.lane_markers.nearest(self.agent.get_pos())
 
-        return (min_dist, self.lane_markers[i].angle - self.agent.get_heading())
+        return (dist[0], angle[0] - self.agent.get_heading())
 
     def _get_done(self):
         """Returns whether the episode is done. Episode terminates if the agent
-        collides with a car or leaves the map."""
+        collides with a car or leaves the map, including during a substep if
+        substep_checks is True."""
         # Check if the agent is outside the map.
         outside = not self.agent.in_map(self.width, self.height)
 
         # Check if the agent has collided with another car.
         collision = self.collided()
+        self.collision = collision
+
+        return outside or collision or self.substep_done
+
+    def get_metrics(self):
+        """Returns the metrics of the current episode so far, as a dictionary,
+        or None without metrics. See EpisodeMetrics."""
+        if self.metrics is None:
+            return None
 
-        return outside or collision
+        return self.metrics.get()
+
+    def _update_metrics(self, zone):
+        """Adds the step which just ended to the metrics of the episode."""
+        gap = None
+        obstacle_car = self.npc_manager.obstacle_car
+        if obstacle_car is not None and obstacle_car in self.npc_manager.npcs:
+            gap = (np.hypot(obstacle_car.get_x() - self.agent.get_x(), obstacle_car.get_y() - self.agent.get_y()) -
+                   (obstacle_car.height + self.agent.height) / 2.0)
+
+        self.metrics.update(zone, self.agent.get_pos(), self.agent.get_speed(), self.collision, gap)
+
+    def _update_state_hash(self):
+        """Continues the hash of the states of the episode with the current
+        state of the agent and the NPCs."""
+        self.state_hash = hash_cars([self.agent] + self.npc_manager.npcs, self.state_hash)
+        self.state_hashes.append(self.state_hash)
 
     def _get_cars(self):
         """Gets a list of tuples where each tuple is of the form:
@@ -376,9 +713,96 @@ class Environment(object):
 
         return cars
 
+    def get_frenet(self):
+        """Returns the lane relative coordinates of the agent and of the NPCs,
+        computed together with the lookup grid of the lanes. See LaneMap.
+
+        Returns:
+            A tuple (lanes, coords) where lanes is an integer array of shape
+            (1 + K,) of lane ids, -1 outside of the lanes, and coords is an
+            array of shape (1 + K, 3) of (s, d, heading_error), NaN outside of
+            the lanes. The first row is the agent.
+        """
+        states = [self.agent.get_state()] + [npc.get_state() for npc in self.npc_manager.npcs]
+
+        return self.lane_map.frenet(states)
+
+    def rollout(self, actions):
+        """Simulates many action sequences from the current state, without
+        changing the environment. NPCs are extrapolated at constant speed and
+        heading. See rollout.rollout.
+
+        Args:
+            actions: Array of shape (M, H, 2) of actions.
+
+        Returns:
+            A tuple (trajectories, collisions, off_road) of arrays of shape
+            (M, H, 4), (M, H) and (M, H).
+        """
+        boxes = self.npc_manager.get_boxes()
+        npc_states = [npc.get_state() for npc in self.npc_manager.npcs]
+
+        return rollout(self.agent.get_state(), actions, npc_states, (self.agent.height, self.agent.width),
+                       boxes[:, 3:5], self.view.get_road(), (self.width, self.height), self.dt, self.substeps)
+
+    def query_states(self, agent_states, npc_states=None, npc_sizes=None):
+        """Computes the zones, road and collision flags and observations of
+        many states at once, without changing the environment. NPCs whose
+        state is all zeros are absent. See query.StateQuery.
+
+        Args:
+            agent_states: Array of shape (N, 4) of agent states.
+            npc_states: Array of shape (N, K, 4), or (N, 4K), of NPC states. Optional.
+            npc_sizes: The NPC footprints, (length, width), broadcastable to
+                       shape (N, K, 2). Defaults to the agent footprint.
+
+        Returns:
+            A tuple (zones, on_road, collisions, observations) of arrays of
+            shape (N,), (N,), (N,) and (N, observation_n). The zones index
+            zone_tracker.zones, and are -1 outside of them.
+        """
+        if self.state_query is None:
+            self.state_query = StateQuery(self)
+
+        return self.state_query.query(agent_states, npc_states, npc_sizes)
+
+    def get_lidar(self):
+        """Returns the distance to the first off road pixel or NPC along each
+        ray of the lidar, as an array of shape (rays,). See Lidar."""
+        if self.lidar_sensor is None:
+            self.lidar_sensor = Lidar(self.view.get_road())
+
+        return self.lidar_sensor.scan(self.agent.get_state(), self.npc_manager.get_boxes())
+
+    def distance_to_road_edge(self, points=None):
+        """Returns the signed distance from points to the edge of the road,
+        positive on the road and negative off it, looked up in a field which is
+        computed once per map. Points outside of the map take the value of the
+        closest pixel of the map.
+
+        Args:
+            points: Array of shape (N, 2) of positions. Defaults to the agent position.
+
+        Returns:
+            Array of shape (N,) of distances (pixels).
+        """
+        if self.road_distance_field is None:
+            self.road_distance_field = get_road_distance(self.env_name, self.view.get_road(), self.mmap_mode)
+
+        if points is None:
+            points = [self.agent.get_pos()]
+
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        field = self.road_distance_field
+        ix = np.clip(np.floor(points[:, 0]).astype(int), 0, field.shape[1] - 1)
+        iy = np.clip(np.floor(points[:, 1]).astype(int), 0, field.shape[0] - 1)
+
+        return field[iy, ix]
+
     def _get_observation(self):
         """The observation is either the raw pixels of the map, if the vision
-        flag is True, or otherwise an array containing state information. All
+        flag is True, the bird's-eye view grid, if the bev flag is True (see
+        BirdsEyeView), or otherwise an array containing state information. All
         distances are in pixels, all angles are in radians and all speeds are
         in pixels/timestep. The array is a one dimentional array of length N,
         organized as follows:
@@ -393,9 +817,17 @@ class Environment(object):
         than max cars are on the road:
 
                 [x_i, y_i, theta_i, speed_i] x MAX CARS
+
+        It is followed by a collision flag, by the lidar ranges if the lidar
+        flag is True and by the signed distance to the edge of the road if the
+        road_distance flag is True.
         """
         if self.vision:
-            return pygame.surfarray.array3d(self.display_surface)
+            return pygame.surfarray.array3d(self.view.surface)
+
+        if self.bev:
+            return self.bev_grid.observe(self.agent.get_state(), (self.agent.height, self.agent.width),
+                                         self.npc_manager.get_boxes())
 
         # AGENT STATE
         agent_state = list(self.agent.get_state())
@@ -411,6 +843,12 @@ class Environment(object):
 
         observation = agent_state + npc_state + [self.collided()*1]
 
+        if self.lidar:
+            observation += list(self.get_lidar())
+
+        if self.road_distance:
+            observation.append(self.distance_to_road_edge()[0])
+
 
         if self.decimals is not None:
             observation = [round(float(x), self.decimals) for x in observation]
@@ -0,0 +1,302 @@
+"""Environment with several controlled cars stepped together."""
+import numpy as np
+from agent import Agent
+from monicars import Environment
+from models import unicycle_step
+from npc import NPCManager
+from util import input_to_action, boxes_overlap
+
+
+class MultiAgentEnvironment(Environment):
+    """The simulation environment with M controlled cars in the same scene.
+
+    The cars are stepped together from an array of shape (M, 2) of actions, in
+    one vectorized call, and each car gets its own observation, reward and
+    done flag. The first car is also the agent of the Environment, which the
+    view follows. A car which is done stops where it is and stays in the scene
+    as an obstacle for the others until the next reset.
+
+    Collisions are tested between the oriented boxes of the cars, all pairs at
+    once, as in the rollouts.
+    """
+
+    def __init__(self, env_name, **kwargs):
+        """Initializes the environment. Vision and lazy observations, metrics, state
+        hashes and reset pools are not supported.
+
+        Args:
+            env_name: The name of the environment to display.
+
+        Keyword Args:
+            n_agents: The number of controlled cars. Defaults to 2.
+            agent_starts: A list of (x, y, theta) tuples, the start of each
+                          controlled car. Defaults to the start of the agent
+                          followed by the NPC starts of the map.
+
+            Any keyword argument of Environment.
+        """
+        if "vision" in kwargs and kwargs["vision"]:
+            raise ValueError("Vision observations are not supported with multiple agents.")
+        if "lazy_obs" in kwargs and kwargs["lazy_obs"]:
+            raise ValueError("Lazy observations are not supported with multiple agents.")
+        if "metrics" in kwargs and kwargs["metrics"]:
+            raise ValueError("Episode metrics are not supported with multiple agents.")
+        if "hash_states" in kwargs and kwargs["hash_states"]:
+            raise ValueError("State hashes are not supported with multiple agents.")
+        if "reset_pool" in kwargs and kwargs["reset_pool"]:
+            raise ValueError("Reset pools are not supported with multiple agents.")
+
+        # The agents are created once the map is loaded.
+        self.agents = []
+
+        super(MultiAgentEnvironment, self).__init__(env_name, **kwargs)
+
+        if "agent_starts" in kwargs:
+            starts = kwargs["agent_starts"]
+        else:
+            n_agents = kwargs["n_agents"] if "n_agents" in kwargs else 2
+            starts = self._default_starts(n_agents)
+
+        if "agent_starts" in kwargs:
+            self.agent = Agent(starts[0][0], starts[0][1], starts[0][2], rng=self.rng)
+
+        self.agents = [self.agent]
+        for start in starts[1:]:
+            self.agents.append(Agent(start[0], start[1], start[2], rng=self.rng))
+
+        self.n_agents = len(self.agents)
+        self.dones = np.zeros(self.n_agents, dtype=bool)
+
+        self.observation_n = len(self._get_observation()[0])
+
+    def _default_starts(self, n_agents):
+        """Returns the start of the agent followed by the NPC starts of the
+        map, as a list of n_agents (x, y, theta) tuples."""
+        starts = [self.agent.get_state()[0:3]]
+        for start in self.description["starts"]:
+            starts.append((start["position"][0], start["position"][1],
+                           NPCManager.DIRS[start["orientation"]]))
+
+        if len(starts) < n_agents:
+            raise ValueError("The map only has %d starts, pass agent_starts for %d agents." %
+                             (len(starts), n_agents))
+
+        return starts[0:n_agents]
+
+    def step(self, actions, npc_action=None):
+        """Advances the environment forward by one time step.
+
+        Args:
+            actions: Array of shape (M, 2) of the actions of the controlled
+                     cars, in format (linear acceleration, angular acceleration).
+            npc_action: A list of actions to control the NPCs. Optional.
+
+        Returns:
+            A tuple (observations, rewards, dones) where observations has one
+            row per car, and rewards and dones are arrays of shape (M,).
+        """
+        actions = np.asarray(actions, dtype=float).reshape(-1, 2)
+        if len(actions) != self.n_agents:
+            raise ValueError("Expected %d actions, got %d." % (self.n_agents, len(actions)))
+
+        # Convert the actions, which represent percentages, to the correct units.
+        acc, theta = input_to_action(actions.T)
+
+        # Integrate the motion of all the cars over the step. Cars which are
+        # done don't move.
+        sub_dt = float(self.dt) / self.substeps
+        moving = ~self.dones[:, np.newaxis]
+        states = self.get_states()
+        dones = self.dones.copy()
+
+        for _ in range(self.substeps):
+            new = unicycle_step(states, acc, theta, sub_dt)
+            new[:, 3] = np.clip(new[:, 3], -self.max_speed, self.max_speed)
+            states = np.where(moving, new, states)
+
+            self.npc_manager.move(npc_action, sub_dt, self.agents)
+
+            if self.substep_checks:
+                dones |= self._get_dones(states)
+
+        for car, state in zip(self.agents, states):
+            car.place(*state)
+
+        # Add and remove traffic.
+        self.npc_manager.update([car.bounding_box for car in self.agents], self.dt)
+
+        self._update_zones()
+
+        self._update_view()
+
+        collisions = self._get_collisions()
+        obs = self._get_observation(collisions)
+
+        if self.tick:
+            self.pacer.wait()
+
+        self.dones = dones | self._get_dones(states, collisions)
+
+        self._keep_agent_in_map()
+
+        return obs, np.array([self.reward(o) for o in obs]), self.dones.copy()
+
+    def reset(self, state=None, seed=None):
+        """Resets the simulation.
+
+        Args:
+            state: Array of shape (M, 4) of the states to reset the controlled
+                   cars to. Optional.
+            seed: If set, the random number generator of the environment is
+                  seeded with it first. Optional.
+
+        Returns:
+            The initial observations, one row per car.
+        """
+        if seed is not None:
+            self.rng.seed(seed)
+
+        for car in self.agents:
+            car.reset(rng=self.rng)
+        self._keep_agent_in_map()
+        self.npc_manager.reset()
+        self.pacer.reset()
+        self.zone_tracker.reset()
+        self.dones[:] = False
+
+        if state is not None:
+            for car, s in zip(self.agents, state):
+                car.place(*s)
+
+        self._update_zones()
+        self._update_view()
+
+        return self._get_observation()
+
+    def _update_zones(self):
+        """Updates the zones of the controlled cars and, with track_npcs, of
+        the NPCs, which records their zone transitions. Returns the zone of
+        the first car."""
+        zones = [self.zone_tracker.get_zone(car, car.get_pos()) for car in self.agents]
+
+        if self.track_npcs:
+            self._update_npc_zones(self.agents)
+
+        return zones[0]
+
+    def get_states(self):
+        """Returns the states of the controlled cars as an array of shape (M, 4)."""
+        return np.array([car.get_state() for car in self.agents], dtype=float).reshape(-1, 4)
+
+    def get_boxes(self):
+        """Returns the oriented boxes of the controlled cars as an array of
+        shape (M, 5), where each row is (x, y, theta, length, width)."""
+        states = self.get_states()
+        sizes = [(car.height, car.width) for car in self.agents]
+
+        return np.concatenate((states[:, 0:3], np.reshape(sizes, (-1, 2))), 1)
+
+    def _get_collisions(self, states=None):
+        """Returns whether each controlled car overlaps another controlled car
+        or an NPC, as an array of shape (M,). All the pairs are tested at once.
+
+        Args:
+            states: Array of shape (M, 4) of the states of the cars. Defaults
+                    to their current states.
+        """
+        boxes = self.get_boxes()
+        if states is not None:
+            boxes[:, 0:3] = states[:, 0:3]
+
+        between = boxes_overlap(boxes[:, np.newaxis], boxes[np.newaxis])
+        np.fill_diagonal(between, False)
+        collisions = between.any(axis=1)
+
+        npc_boxes = self.npc_manager.get_boxes()
+        if len(npc_boxes) > 0:
+            collisions |= boxes_overlap(boxes[:, np.newaxis], npc_boxes[np.newaxis]).any(axis=1)
+
+        return collisions
+
+    def _get_dones(self, states, collisions=None):
+        """Returns whether each controlled car collided or left the map, as
+        an array of shape (M,)."""
+        if collisions is None:
+            collisions = self._get_collisions(states)
+
+        outside = ((states[:, 0] < 0) | (states[:, 0] > self.width) |
+                   (states[:, 1] < 0) | (states[:, 1] > self.height))
+
+        return outside | collisions
+
+    def _get_cars(self):
+        """Gets a list of tuples of form (img, x, y, theta) for each car
+        currently in the environment, starting with the controlled cars."""
+        cars = [(car.img, car.get_x(), car.get_y(), car.get_heading()) for car in self.agents]
+        for npc in self.npc_manager.npcs:
+            cars.append((npc.img, npc.get_x(), npc.get_y(), npc.get_heading()))
+
+        return cars
+
+    def _get_observation(self, collisions=None):
+        """Returns the observation of each controlled car, one row per car.
+        See _get_agent_observation."""
+        if len(self.agents) == 0:
+            return []
+
+        states = self.get_states()
+        boxes = self.get_boxes()
+        npc_boxes = self.npc_manager.get_boxes()
+        if collisions is None:
+            collisions = self._get_collisions()
+
+        return np.array([self._get_agent_observation(i, states, boxes, npc_boxes, collisions)
+                         for i in range(len(self.agents))])
+
+    def _get_agent_observation(self, i, states, boxes, npc_boxes, collisions):
+        """The observation of a single controlled car. It is organized like
+        the observation of the Environment, with the states of the other
+        controlled cars after the state of the car:
+
+            [CAR STATE, OTHER CAR STATES, NPC STATES]
+
+        followed by the collision flag of the car and, if the lidar flag is
+        True, by its lidar ranges. The other controlled cars are treated like
+        NPCs by the bird's-eye view and the lidar.
+
+        Args:
+            i: The index of the car.
+            states: Array of shape (M, 4) of the states of the cars.
+            boxes: Array of shape (M, 5) of the boxes of the cars.
+            npc_boxes: Array of shape (K, 5) of the boxes of the NPCs.
+            collisions: Array of shape (M,) of the collision flags of the cars.
+        """
+        others = np.delete(np.arange(len(self.agents)), i)
+        other_boxes = np.concatenate((boxes[others], npc_boxes))
+
+        if self.bev:
+            car = self.agents[i]
+            return self.bev_grid.observe(states[i], (car.height, car.width), other_boxes)
+
+        npc_state = []
+        for npc in self.npc_manager.npcs:
+            npc_state += list(npc.get_state())
+
+        # Pad with zeros.
+        npc_state += [0, 0, 0, 0] * (self.npc_manager.MAX - len(self.npc_manager.npcs))
+
+        observation = list(states[i]) + list(states[others].ravel()) + npc_state + [collisions[i] * 1]
+
+        if self.lidar:
+            observation += list(self.lidar_sensor.scan(states[i], other_boxes))
+
+        if self.decimals is not None:
+            observation = [round(float(x), self.decimals) for x in observation]
+
+        return self.feature_fn(observation)
+
+    def _keep_agent_in_map(self):
+        """Keeps the controlled cars inside the map by limiting their position."""
+        for car in self.agents or [self.agent]:
+            car.place(np.clip(car.get_x(), 0, self.width), np.clip(car.get_y(), 0, self.height),
+                      car.get_heading(), car.get_speed())
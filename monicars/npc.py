@@ -4,6 +4,9 @@ Special features: There is some randomness in their initial positions and speeds
 import numpy as np
 from agent import Agent
 from variables import traffic, obstacle
+from models import unicycle_step
+from lanes import DIRS
+from idm import get_accelerations
 from util import add_noise, input_to_action
 from scipy.spatial.distance import euclidean
 
@@ -15,13 +18,20 @@ class Obstacle(Agent):
     an obstacle in front of the agent. It has its own speed and initial location,
     and can also crash with certain probability."""
 
-    def __init__(self):
-        name = traffic.TYPES[np.random.randint(0, len(traffic.TYPES))]
+    def __init__(self, rng=np.random):
+        """Initializes the obstacle.
+
+        Args:
+            rng: The numpy RandomState which the sprite, the noise and the
+                 crashes are drawn from. Defaults to numpy's global generator.
+        """
+        self.rng = rng
+        name = traffic.TYPES[rng.randint(0, len(traffic.TYPES))]
 
         if obstacle.NOISE:
-            x = add_noise(obstacle.X, obstacle.STD_X)
-            y = add_noise(obstacle.Y, obstacle.STD_Y)
-            speed = add_noise(obstacle.SPEED, obstacle.STD_SPEED)
+            x = add_noise(obstacle.X, obstacle.STD_X, rng)
+            y = add_noise(obstacle.Y, obstacle.STD_Y, rng)
+            speed = add_noise(obstacle.SPEED, obstacle.STD_SPEED, rng)
         else:
             x = obstacle.X
             y = obstacle.Y
@@ -34,17 +44,17 @@ class Obstacle(Agent):
         self.stuck_time = 0
         self.total_stuck_time = obstacle.TOTAL_STUCK_TIME
 
-        super(Obstacle, self).__init__(self.init_x, self.init_y, self.init_theta, self.init_speed, name)
+        super(Obstacle, self).__init__(self.init_x, self.init_y, self.init_theta, self.init_speed, name, rng)
 
-        self.crash = obstacle.CRASH and np.random.random() < obstacle.PROB_CRASH
+        self.crash = obstacle.CRASH and rng.random_sample() < obstacle.PROB_CRASH
         self.crash_y = obstacle.CRASH_Y
         self.crashing = False
 
-    def move(self, acc, heading):
+    def move(self, acc, heading, dt=1.0):
         # added stuck time for crash period
         # Check if there is a crash.
         if self.crash and self.get_y() >= self.crash_y and self.stuck_time < self.total_stuck_time:
-            self.stuck_time += 1
+            self.stuck_time += dt
             self.crashing = True
             acc = 0
 
@@ -56,23 +66,35 @@ class Obstacle(Agent):
         if self.crashing:
             if self.get_speed() > 0:
                 # this assumes that the obstacle doesn't change speed
-                return super(Obstacle, self).move(-self._speed, 0)
+                return super(Obstacle, self).move(-self._speed / dt, 0, dt)
 
         # Step the obstacle forward.
-        return super(Obstacle, self).move(acc, heading)
+        return super(Obstacle, self).move(acc, heading, dt)
 
-    def reset(self, noise=True):
+    def reset(self, noise=True, state=None, crash=None):
+        """Resets the obstacle to its initial state.
+
+        Args:
+            noise: Whether to add noise when resetting. Defaults to True.
+            state: The state to reset to, (x, y, theta, speed). Sampled if None.
+            crash: Whether the obstacle will crash. Sampled if None.
+        """
         theta = obstacle.THETA
-        if obstacle.NOISE and noise:
-            x = add_noise(obstacle.X, obstacle.STD_X)
-            y = add_noise(obstacle.Y, obstacle.STD_Y)
-            speed = add_noise(obstacle.SPEED, obstacle.STD_SPEED)
+        if state is not None:
+            x, y, theta, speed = state
+        elif obstacle.NOISE and noise:
+            x = add_noise(obstacle.X, obstacle.STD_X, self.rng)
+            y = add_noise(obstacle.Y, obstacle.STD_Y, self.rng)
+            speed = add_noise(obstacle.SPEED, obstacle.STD_SPEED, self.rng)
         else:
             x = self.init_x
             y = self.init_y
             speed = self.init_speed
 
-        self.crash = obstacle.CRASH and np.random.random() < obstacle.PROB_CRASH
+        if crash is None:
+            crash = obstacle.CRASH and self.rng.random_sample() < obstacle.PROB_CRASH
+
+        self.crash = crash
         self.crashing = False
         self.stuck_time = 0
         self.set_state(x, y, theta, speed)
@@ -84,67 +106,142 @@ class NPCManager(object):
 
     NEW = traffic.FREQ
     MAX = traffic.MAX_CARS
-    DIRS = {"down": 0, "right": np.pi / 2, "up": np.pi, "left": -np.pi / 2}
+    IDM = traffic.IDM
+    DIRS = DIRS
 
-    def __init__(self, starts, env_size, use_obstacle=False):
+    def __init__(self, starts, env_size, use_obstacle=False, lane_map=None, rng=np.random):
         """Initializes the NPC Manager.
 
         Args:
             starts: List of starting positions for NPCs.
             env_size: The size of the environment in the form (width, height).
             use_obstacle: Whether to use the special Obstacle NPC. Defaults to False.
+            lane_map: The LaneMap of the map, which the NPCs need to follow
+                      the car ahead with the IDM. Optional.
+            rng: The numpy RandomState which the traffic is sampled from.
+                 Defaults to numpy's global generator.
         """
         self.starts = starts
+        self.rng = rng
+        self.lane_map = lane_map
         self.npcs = []
         self.env_size = env_size
         self.obstacle = use_obstacle
         self.obstacle_gone = False  # Flag to keep track of whether the obstacle is there.
+        self.obstacle_car = None
 
         if self.obstacle:
-            obstacle = Obstacle()
-            self.npcs.append(obstacle)
+            self.obstacle_car = Obstacle(rng)
+            self.npcs.append(self.obstacle_car)
             self.MAX += 1
 
-    def step(self, agent_bb, actions=None):
+    def step(self, agent_bb, actions=None, dt=1.0):
         """Steps forward the NPCs.
 
         Args:
-            agent_bb: The bounding box of the agent, for collision checking.
-            actions: A list of actions to control the agent. Optional.
+            agent_bb: The bounding box of the agent, or a list of the bounding
+                      boxes of all the agents, for collision checking.
+            actions: A list of actions to control the NPCs. Optional.
+            dt: Length of the step. Defaults to 1.
         """
-        if actions is None:
-            actions = [[0, 0] * len(self.npcs)]
+        self.move(actions, dt)
+        self.update(agent_bb, dt)
+
+    def move(self, actions=None, dt=1.0, others=None):
+        """Moves the NPCs, without adding or removing any. All the NPCs are
+        stepped in one vectorized call, except the Obstacle which has its own
+        behaviour.
+
+        If IDM is set and no actions are given, the NPCs follow the car ahead
+        in their lane with the Intelligent Driver Model instead, and keep
+        their heading. The Obstacle keeps its own behaviour, but the NPCs
+        behind it still follow it.
+
+        Args:
+            actions: A list of actions to control the NPCs. NPCs without an
+                     action keep their speed and heading. Optional.
+            dt: Length of the step. Defaults to 1.
+            others: A list of the other cars, such as the agents, which the
+                    NPCs follow but which aren't moved. Optional.
+        """
+        n = len(self.npcs)
+        if n == 0:
+            return
+
+        if self.IDM and actions is None:
+            self._follow(dt, others if others is not None else [])
+            return
+
+        # Crop actions so they aren't too long, and pad them with zeros so
+        # they aren't too short.
+        padded = np.zeros((n, 2))
+        if actions is not None and len(actions) > 0:
+            actions = np.asarray(actions, dtype=float).reshape(-1, 2)[0:n]
+            padded[0:len(actions)] = actions
+
+        acc, heading = input_to_action(padded.T)
+        states = unicycle_step([npc.get_state() for npc in self.npcs], acc, heading, dt)
 
-        # Crop actions so they aren't too long.
-        actions = actions[0:len(self.npcs)]
-        # Pad actions with zero so they aren't too short.
-        actions += [[0, 0] * (len(self.npcs) - len(actions))]
+        for i, npc in enumerate(self.npcs):
+            if type(npc) == Obstacle:
+                npc.move(acc[i], heading[i], dt)
+            else:
+                npc.place(*states[i])
+
+    def _follow(self, dt, others):
+        """Moves the NPCs with the accelerations of the IDM."""
+        if self.lane_map is None:
+            raise ValueError("The NPCs need a lane map to follow the car ahead.")
+
+        cars = self.npcs + list(others)
+        states = np.array([car.get_state() for car in cars], dtype=float)
+        lengths = np.array([car.height for car in cars], dtype=float)
 
-        # Apply actions to each NPC.
-        for npc, action in zip(self.npcs, actions):
-            acc, theta = input_to_action(action)
-            npc.move(acc, theta)
+        n = len(self.npcs)
+        acc = get_accelerations(self.lane_map, states, lengths)[0:n]
+        heading = np.zeros(n)
+
+        # Don't brake past a standstill.
+        acc = np.maximum(acc, -states[0:n, 3] / dt)
+        new = unicycle_step(states[0:n], acc, heading, dt)
+
+        for i, npc in enumerate(self.npcs):
+            if type(npc) == Obstacle:
+                npc.move(0, 0, dt)
+            else:
+                npc.place(*new[i])
+
+    def update(self, agent_bb, dt=1.0):
+        """Adds new NPCs and removes those which left the map.
+
+        Args:
+            agent_bb: The bounding box of the agent, or a list of the bounding
+                      boxes of all the agents, for collision checking.
+            dt: Length of the step since the last update. Defaults to 1.
+        """
+        agent_bbs = agent_bb if isinstance(agent_bb, list) else [agent_bb]
 
         # Check whether to add a new NPC. New NPC is added with probability NEW
         # per frame, as long as there are less than MAX non-agent cars on the
         # road and there exists at least one start position defined.
-        prob_new = np.random.random() < self.NEW
+        prob_new = self.rng.random_sample() < self.NEW * dt
         not_full = len(self.npcs) < self.MAX
         start_exists = len(self.starts) > 0
 
         new_npc = prob_new and not_full and start_exists
 
         if new_npc:
-            pos = np.random.randint(0, len(self.starts))
+            pos = self.rng.randint(0, len(self.starts))
             start = self.starts[pos]["position"]
             theta = self.DIRS[self.starts[pos]["orientation"]]
             speed = traffic.SPEED
-            colour = traffic.TYPES[np.random.randint(0, len(traffic.TYPES))]
+            colour = traffic.TYPES[self.rng.randint(0, len(traffic.TYPES))]
 
-            new = Agent(start[0], start[1], theta, speed, colour)
+            new = Agent(start[0], start[1], theta, speed, colour, self.rng)
 
             # Only add if it doesn't collide with other NPCs.
-            if not self.check_collision(new.bounding_box) and not new.bounding_box.overlaps(agent_bb):
+            if not self.check_collision(new.bounding_box) and \
+                    not any(new.bounding_box.overlaps(bb) for bb in agent_bbs):
                 self.npcs.append(new)
 
         for i, npc in enumerate(self.npcs):
@@ -165,14 +262,19 @@ class NPCManager(object):
 
         return False
 
-    def reset(self):
-        """Resets the NPCs."""
-        self.npcs = []
+    def reset(self, obstacle_state=None, crash=None):
+        """Resets the NPCs. The Obstacle is reused rather than created again.
+
+        Args:
+            obstacle_state: The state to reset the Obstacle to. Sampled if None.
+            crash: Whether the Obstacle will crash. Sampled if None.
+        """
+        del self.npcs[:]
 
         if self.obstacle:
             self.obstacle_gone = False
-            obstacle = Obstacle()
-            self.npcs.append(obstacle)
+            self.obstacle_car.reset(state=obstacle_state, crash=crash)
+            self.npcs.append(self.obstacle_car)
 
     def get_obstacle(self):
         """Returns the obstacle object."""
@@ -201,6 +303,15 @@ class NPCManager(object):
 
         return self.npcs[min_idx], min_dist
 
+    def get_boxes(self):
+        """Returns the oriented boxes of the NPCs as an array of shape (K, 5),
+        where each row is (x, y, theta, length, width)."""
+        boxes = np.zeros((len(self.npcs), 5))
+        for i, npc in enumerate(self.npcs):
+            boxes[i] = (npc.get_x(), npc.get_y(), npc.get_heading(), npc.height, npc.width)
+
+        return boxes
+
     def empty(self):
         """Returns True if the NPC list is empty, False otherwise."""
         if len(self.npcs) == 0:
@@ -0,0 +1,84 @@
+"""Wall-clock pacing of the simulation loop."""
+import time
+from timeit import default_timer
+
+
+class Pacer(object):
+    """Paces a loop so that it runs at a target frequency.
+
+    Each frame has an absolute deadline which is a whole number of periods
+    after the first frame. Sleeping until that deadline absorbs the time spent
+    doing work during the frame, and since the deadlines do not depend on when
+    the previous sleep actually returned, oversleeping on one frame is made up
+    for on the next one instead of accumulating.
+    """
+
+    def __init__(self, fps, max_lag=0.1):
+        """Initializes the pacer.
+
+        Args:
+            fps: The target frequency of the loop (frames/second).
+            max_lag: If the loop falls behind its deadline by more than this
+                     many seconds, the schedule is restarted from the current
+                     time instead of running frames back to back to catch up.
+        """
+        self.period = 1.0 / fps
+        self.max_lag = max_lag
+
+        self.start = None
+        self.deadline = None
+        self.frames = 0
+        self.missed = 0
+
+    def reset(self):
+        """Clears the schedule and the statistics."""
+        self.start = None
+        self.deadline = None
+        self.frames = 0
+        self.missed = 0
+
+    def wait(self):
+        """Blocks until the end of the current frame. The first call only
+        starts the schedule."""
+        now = default_timer()
+
+        if self.deadline is None:
+            self.start = now
+            self.deadline = now + self.period
+            return
+
+        remaining = self.deadline - now
+        if remaining > 0:
+            _sleep_until(self.deadline)
+        else:
+            self.missed += 1
+
+            # We are too far behind, drop the accumulated lag.
+            if -remaining > self.max_lag:
+                self.deadline = now
+
+        self.deadline += self.period
+        self.frames += 1
+
+    def get_fps(self):
+        """Returns the frequency achieved since the schedule started."""
+        if self.start is None or self.frames == 0:
+            return 0.0
+
+        return self.frames / (default_timer() - self.start)
+
+    def get_stats(self):
+        """Returns a dictionary with the number of frames, the number of missed
+        deadlines and the achieved frequency."""
+        return {"frames": self.frames, "missed": self.missed, "fps": self.get_fps()}
+
+
+def _sleep_until(deadline):
+    """Sleeps until the deadline. The bulk of the wait uses time.sleep, and the
+    last millisecond is spun since sleep can overshoot by that much."""
+    remaining = deadline - default_timer()
+    if remaining > 0.002:
+        time.sleep(remaining - 0.001)
+
+    while default_timer() < deadline:
+        pass
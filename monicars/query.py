@@ -0,0 +1,191 @@
+"""Stateless queries of many logged states at once, for relabeling."""
+import numpy as np
+from util import boxes_overlap, corners_in_boxes
+
+
+class StateQuery(object):
+    """Computes the zones, road and collision flags and observations of arrays
+    of states, with the map of an environment. Only the map data of the
+    environment is used, never its cars, so the environment is left as it is.
+
+    The NPC states of each row are padded with zeros, as in the observation:
+    an NPC whose state is all zeros is absent.
+
+    Collisions are tested as Environment.collided does, by whether a corner
+    of the agent is inside an NPC, so that they match the collision flag of
+    the observation. That test misses cars at an angle which only cross
+    along their edges, which get_overlaps finds by testing the oriented
+    boxes of the cars, as in rollout.
+    """
+
+    def __init__(self, env):
+        """Takes the map data of an environment.
+
+        Args:
+            env: The Environment, whose options choose the observation.
+        """
+        self.zones = env.zone_tracker.zones
+        self.bounds = env.zone_tracker.bounds
+        self.road = env.view.get_road()
+        self.agent_size = (env.agent.height, env.agent.width)
+        self.max_npcs = env.npc_manager.MAX
+        self.decimals = env.decimals
+
+        self.lidar = None
+        if env.lidar:
+            env.get_lidar()  # Creates the sensor.
+            self.lidar = env.lidar_sensor
+
+        self.road_distance = None
+        if env.road_distance:
+            env.distance_to_road_edge()  # Loads the field.
+            self.road_distance = env.road_distance_field
+
+    def get_zones(self, points):
+        """Returns the index in zones of the zone each point is in, or -1 if
+        it is in none, where the first zone wins, as in Environment.get_zone.
+
+        Args:
+            points: Array of shape (N, 2) of positions.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        x = points[:, 0:1]
+        y = points[:, 1:2]
+        inside = ((self.bounds[:, 0] < x) & (x < self.bounds[:, 2]) &
+                  (self.bounds[:, 1] < y) & (y < self.bounds[:, 3]))
+
+        return np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+
+    def on_road(self, points, zones=None):
+        """Returns whether each point is on the road, as Environment.on_road:
+        points in a zone are on the road, and the others are looked up in the
+        road mask of the map.
+
+        Args:
+            points: Array of shape (N, 2) of positions.
+            zones: The zones of the points, from get_zones. Optional.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        zones = self.get_zones(points) if zones is None else zones
+
+        ix = np.floor(points[:, 0]).astype(int)
+        iy = np.floor(points[:, 1]).astype(int)
+        inside = (ix >= 0) & (ix < self.road.shape[1]) & (iy >= 0) & (iy < self.road.shape[0])
+
+        on_road = zones >= 0
+        check = inside & ~on_road
+        on_road[check] = self.road[iy[check], ix[check]]
+
+        return on_road
+
+    def _npc_boxes(self, npc_states, npc_sizes):
+        """Returns the NPC states as an array of shape (N, K, 4), their boxes
+        as an array of shape (N, K, 5) and which are present, of shape (N, K)."""
+        npc_states = np.asarray(npc_states, dtype=float)
+        npc_states = npc_states.reshape(npc_states.shape[0], -1, 4)
+        present = (npc_states != 0).any(axis=-1)
+
+        sizes = np.broadcast_to(self.agent_size if npc_sizes is None else npc_sizes,
+                                npc_states.shape[:-1] + (2,))
+        boxes = np.concatenate((npc_states[..., 0:3], sizes), axis=-1)
+
+        return npc_states, boxes, present
+
+    def get_collisions(self, agent_states, npc_states, npc_sizes=None):
+        """Returns whether the agent has collided with an NPC in each row, as
+        Environment.collided: whether a corner of the agent is inside an NPC.
+
+        Args:
+            agent_states: Array of shape (N, 4) of agent states.
+            npc_states: Array of shape (N, K, 4), or (N, 4K), of NPC states.
+            npc_sizes: The NPC footprints, (length, width), broadcastable to
+                       shape (N, K, 2). Defaults to the agent footprint.
+
+        Returns:
+            Boolean array of shape (N,).
+        """
+        agent_boxes = self._agent_boxes(agent_states)
+        _, boxes, present = self._npc_boxes(npc_states, npc_sizes)
+
+        # The bounding boxes of the environment are turned by -theta from the
+        # axis of travel, which only matters for cars which aren't aligned
+        # with the axes of the map, so the same boxes are tested here.
+        agent_boxes[:, 2] *= -1
+        boxes[..., 2] *= -1
+
+        return (corners_in_boxes(agent_boxes[:, np.newaxis], boxes) & present).any(axis=1)
+
+    def get_overlaps(self, agent_states, npc_states, npc_sizes=None):
+        """Returns whether the agent overlaps an NPC in each row, testing the
+        oriented boxes of the cars, as rollout does. Unlike get_collisions, it
+        also finds cars at an angle which only cross along their edges.
+
+        Args:
+            agent_states: Array of shape (N, 4) of agent states.
+            npc_states: Array of shape (N, K, 4), or (N, 4K), of NPC states.
+            npc_sizes: The NPC footprints, (length, width), broadcastable to
+                       shape (N, K, 2). Defaults to the agent footprint.
+
+        Returns:
+            Boolean array of shape (N,).
+        """
+        agent_boxes = self._agent_boxes(agent_states)
+        _, boxes, present = self._npc_boxes(npc_states, npc_sizes)
+
+        return (boxes_overlap(agent_boxes[:, np.newaxis], boxes) & present).any(axis=1)
+
+    def _agent_boxes(self, agent_states):
+        """Returns the boxes of the agent states, as an array of shape (N, 5)."""
+        agent_states = np.asarray(agent_states, dtype=float).reshape(-1, 4)
+
+        return np.concatenate((agent_states[:, 0:3], np.tile(self.agent_size, (len(agent_states), 1))), axis=-1)
+
+    def query(self, agent_states, npc_states=None, npc_sizes=None):
+        """Labels every row of states.
+
+        Args:
+            agent_states: Array of shape (N, 4) of agent states.
+            npc_states: Array of shape (N, K, 4), or (N, 4K), of NPC states,
+                        with K at most the maximum number of NPCs. Optional.
+            npc_sizes: The NPC footprints, (length, width), broadcastable to
+                       shape (N, K, 2). Defaults to the agent footprint.
+
+        Returns:
+            A tuple (zones, on_road, collisions, observations) where zones is
+            an integer array of shape (N,) of indices in zones, -1 outside of
+            them, on_road and collisions are boolean arrays of shape (N,) and
+            observations is an array of shape (N, observation_n) of the state
+            observations of the environment, before its feature function.
+        """
+        agent_states = np.asarray(agent_states, dtype=float).reshape(-1, 4)
+        n = len(agent_states)
+        if npc_states is None:
+            npc_states = np.zeros((n, 0, 4))
+
+        npc_states, boxes, present = self._npc_boxes(npc_states, npc_sizes)
+        if npc_states.shape[1] > self.max_npcs:
+            raise ValueError("Expected at most %d NPCs, got %d." % (self.max_npcs, npc_states.shape[1]))
+
+        zones = self.get_zones(agent_states[:, 0:2])
+        on_road = self.on_road(agent_states[:, 0:2], zones)
+        collisions = self.get_collisions(agent_states, npc_states, npc_sizes)
+
+        # The absent NPCs are zero, as the padding up to the maximum.
+        padding = np.zeros((n, 4 * (self.max_npcs - npc_states.shape[1])))
+        columns = [agent_states, (npc_states * present[..., np.newaxis]).reshape(n, -1), padding,
+                   collisions[:, np.newaxis]]
+
+        if self.lidar is not None:
+            columns.append(self.lidar.scan_states(agent_states, boxes, present))
+
+        if self.road_distance is not None:
+            field = self.road_distance
+            ix = np.clip(np.floor(agent_states[:, 0]).astype(int), 0, field.shape[1] - 1)
+            iy = np.clip(np.floor(agent_states[:, 1]).astype(int), 0, field.shape[0] - 1)
+            columns.append(field[iy, ix][:, np.newaxis])
+
+        observations = np.concatenate(columns, axis=1).astype(float)
+        if self.decimals is not None:
+            observations = np.round(observations, self.decimals)
+
+        return zones, on_road, collisions, observations
@@ -0,0 +1,135 @@
+"""Recording of rendered frames to disk without stalling the simulation."""
+import os
+import threading
+import pygame
+import numpy as np
+from Queue import Queue, Full
+
+
+class FrameRecorder(object):
+    """Records frames rendered by a View. Frames are copied into a bounded
+    queue and written to disk by a background thread, so the simulation only
+    pays for the copy.
+
+    Two output formats are supported:
+        - png: A directory containing one image per frame, named after the
+               index of the frame in the episode.
+        - memmap: A single .npy file holding a uint8 array of shape
+                  (max_frames, height, width, 3), which can be opened with
+                  numpy.load(path, mmap_mode="r").
+    """
+
+    FORMATS = ["png", "memmap"]
+
+    def __init__(self, path, fmt="png", stride=1, queue_size=64, block=False, max_frames=10000):
+        """Initializes the recorder and starts the writer thread.
+
+        Args:
+            path: The directory (png) or file (memmap) to write to.
+            fmt: The output format, one of FORMATS. Defaults to png.
+            stride: Only every stride-th frame is recorded. Defaults to 1.
+            queue_size: The maximum number of frames waiting to be written.
+            block: If True, recording waits for space when the queue is full.
+                   Otherwise, the frame is dropped. Defaults to False.
+            max_frames: The number of frames allocated in memmap mode. Later
+                        frames are dropped.
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError("Unsupported recording format: " + str(fmt))
+
+        self.path = path
+        self.fmt = fmt
+        self.stride = max(int(stride), 1)
+        self.block = block
+        self.max_frames = max_frames
+
+        self.frame_count = 0  # Frames seen, including those skipped by the stride.
+        self.queued = 0       # Frames accepted in the queue.
+        self.written = 0      # Frames written to disk.
+
+        # Frames lost because the queue was full, counted by the thread which
+        # records, and because the file was full, counted by the writer, so
+        # that each count is only changed by one thread.
+        self._dropped_queue = 0
+        self._dropped_file = 0
+
+        self._video = None
+        self._queue = Queue(maxsize=queue_size)
+
+        if self.fmt == "png" and not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        self._thread = threading.Thread(target=self._write_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def dropped(self):
+        """Frames lost because the queue or the file was full."""
+        return self._dropped_queue + self._dropped_file
+
+    def record(self, surface):
+        """Copies the surface into the queue, if the frame falls on the stride.
+
+        Args:
+            surface: The pygame surface to record.
+        """
+        idx = self.frame_count
+        self.frame_count += 1
+
+        if idx % self.stride != 0:
+            return
+
+        frame = pygame.surfarray.array3d(surface)
+
+        try:
+            self._queue.put((idx, frame), self.block)
+            self.queued += 1
+        except Full:
+            self._dropped_queue += 1
+
+    def close(self):
+        """Waits for all queued frames to be written and stops the thread."""
+        if self._thread is None:
+            return
+
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+        if self._video is not None:
+            self._video.flush()
+            self._video = None
+
+    def _write_loop(self):
+        """Writes frames from the queue until the stop sentinel is received."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            idx, frame = item
+            if self.fmt == "png":
+                self._write_png(idx, frame)
+            else:
+                self._write_memmap(frame)
+
+    def _write_png(self, idx, frame):
+        """Saves a frame, in surfarray (width, height, 3) layout, as a PNG."""
+        img = pygame.surfarray.make_surface(frame)
+        pygame.image.save(img, os.path.join(self.path, "frame_%06d.png" % idx))
+        self.written += 1
+
+    def _write_memmap(self, frame):
+        """Writes a frame, in surfarray (width, height, 3) layout, to the next
+        slot of the video array."""
+        if self.written >= self.max_frames:
+            self._dropped_file += 1
+            return
+
+        if self._video is None:
+            shape = (self.max_frames, frame.shape[1], frame.shape[0], 3)
+            self._video = np.lib.format.open_memmap(self.path, mode="w+", dtype=np.uint8, shape=shape)
+
+        self._video[self.written] = frame.transpose(1, 0, 2)
+        self.written += 1
@@ -0,0 +1,83 @@
+"""Rendering of the environment in a separate thread, at its own rate."""
+import threading
+from pacing import Pacer
+
+
+class RenderThread(object):
+    """Draws the latest published state of the world to the display at a fixed
+    rate, independently of how fast the simulation steps.
+
+    The simulation publishes a snapshot of the car poses after every step.
+    Publishing only swaps a reference under a lock, so the simulation never
+    waits for drawing, and the render loop always draws a complete snapshot.
+    Snapshots published between two frames are skipped.
+    """
+
+    def __init__(self, view, display_surface, rate):
+        """Initializes the render thread. Call start to begin drawing.
+
+        Args:
+            view: The View used to draw. It should not be shared with the
+                  simulation thread.
+            display_surface: The display surface to draw on.
+            rate: The rate at which to draw the display (frames/second).
+        """
+        self.view = view
+        self.display_surface = display_surface
+        self.pacer = Pacer(rate)
+
+        self.frames = 0  # Number of frames drawn.
+
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._new = False
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Starts the render loop."""
+        if self._thread is not None:
+            return
+
+        self._running = True
+        self._thread = threading.Thread(target=self._loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops the render loop and waits for the current frame to finish."""
+        if self._thread is None:
+            return
+
+        self._running = False
+        self._thread.join()
+        self._thread = None
+
+    def publish(self, x, y, characters):
+        """Publishes a new state of the world to draw.
+
+        Args:
+            x: The x coordinate around which to center the view.
+            y: The y coordinate around which to center the view.
+            characters: A list of tuples of form (img, x, y, theta) for each char.
+        """
+        snapshot = (x, y, tuple(characters))
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._new = True
+
+    def _loop(self):
+        """Draws the latest snapshot once per period until stopped."""
+        while self._running:
+            with self._lock:
+                snapshot = self._snapshot if self._new else None
+                self._new = False
+
+            if snapshot is not None:
+                x, y, characters = snapshot
+                self.view.update(x, y, characters)
+                self.view.show(self.display_surface)
+                self.frames += 1
+
+            self.pacer.wait()
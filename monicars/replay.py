@@ -0,0 +1,128 @@
+"""Replays of recorded episodes, checked against the hashes of their states."""
+import zlib
+import struct
+
+
+def hash_cars(cars, previous=0):
+    """Returns the rolling CRC-32 of the states and the sizes of cars, as an
+    unsigned integer, which continues the hash of the previous states.
+
+    Args:
+        cars: The cars, the agent first, as Agent objects.
+        previous: The hash of the previous states. Defaults to 0.
+    """
+    values = []
+    for car in cars:
+        values.extend(car.get_state())
+        values.append(car.height)
+        values.append(car.width)
+
+    return zlib.crc32(struct.pack("<%dd" % len(values), *values), previous) & 0xffffffff
+
+
+class Replay(object):
+    """Replays an episode of an environment from the seed of its reset and the
+    log of its actions. The steps up to a target are fast-forwarded, without
+    drawing the view or building the observations, after which the episode
+    continues with full steps, rendered as the environment is set up to.
+
+    The original episode should have been run with the same options as the
+    environment, from reset(seed=seed), and stepped with the actions. With
+    the state hashes of the original episode, env.state_hashes, every state
+    of the replay is checked against them, and the first step where they
+    differ is kept in divergence. Since the hashes are rolling, the replay
+    differs from the original from that step on.
+
+    The NPC actions aren't logged, so the NPCs must have followed their own
+    policy in the original episode.
+
+    The replay turns on hash_states for the environment, which it needs to
+    check the states, and leaves it on.
+    """
+
+    def __init__(self, env, seed, actions, hashes=None):
+        """Initializes the replay and turns on env.hash_states. The
+        environment is reset by seek or step.
+
+        Args:
+            env: The Environment to replay in.
+            seed: The seed which the original episode was reset with.
+            actions: The actions of the original episode, in order.
+            hashes: The state hashes of the original episode, the first after
+                    the reset and one after every step. Optional.
+        """
+        if env.reset_pool is not None:
+            raise ValueError("Episodes can't be replayed with a reset pool, which samples ahead of the seed.")
+
+        self.env = env
+        self.seed = seed
+        self.actions = actions
+        self.hashes = hashes
+        self.t = None  # The number of steps replayed, None before the reset.
+        self.divergence = None  # The first step whose state differs from the original.
+
+        env.hash_states = True
+
+    def reset(self):
+        """Resets the environment to the start of the episode and returns the
+        initial observation."""
+        obs = self.env.reset(seed=self.seed)
+        self.t = 0
+        self.divergence = None
+        self._check()
+
+        return obs
+
+    def _check(self):
+        """Compares the hash of the current state with the original."""
+        if self.hashes is None or self.divergence is not None or self.t >= len(self.hashes):
+            return
+
+        if self.env.state_hash != self.hashes[self.t]:
+            self.divergence = self.t
+
+    def seek(self, target):
+        """Fast-forwards to the state after a step, resetting first if the
+        step was already passed, then draws the view.
+
+        Args:
+            target: The number of steps to replay.
+
+        Returns:
+            The observation after the target step.
+        """
+        if target > len(self.actions):
+            raise ValueError("The episode only has %d steps." % len(self.actions))
+
+        if self.t is None or target < self.t:
+            self.reset()
+
+        while self.t < target:
+            self.env.fast_step(self.actions[self.t])
+            self.t += 1
+            self._check()
+
+        self.env._update_view()
+
+        return self.env._get_observation()
+
+    def step(self):
+        """Replays the next action with a full step of the environment and
+        returns its result."""
+        if self.t is None:
+            self.reset()
+        if self.t >= len(self.actions):
+            raise ValueError("The episode only has %d steps." % len(self.actions))
+
+        result = self.env.step(self.actions[self.t])
+        self.t += 1
+        self._check()
+
+        return result
+
+    def find_divergence(self):
+        """Fast-forwards through the whole episode and returns the first step
+        whose state differs from the original, or None if there is none."""
+        self.seek(len(self.actions))
+
+        return self.divergence
@@ -0,0 +1,116 @@
+"""Pool of initial conditions generated ahead of time, for fast resets."""
+import numpy as np
+from util import boxes_overlap
+from variables import agent, obstacle
+
+
+class ResetPool(object):
+    """Initial states of the agent and of the Obstacle, sampled in batches
+    with the same noise as Agent.reset and Obstacle.reset. Starts where a car
+    is off the road, or where the agent overlaps the Obstacle, are rejected.
+    Each reset takes the next row of the arrays, and a new batch is sampled
+    when they run out.
+    """
+
+    def __init__(self, agent_start, agent_size, obstacle_size=None, road=None, size=1000, rng=np.random):
+        """Initializes the pool and samples the first batch.
+
+        Args:
+            agent_start: The start of the agent before noise, (x, y, theta, speed).
+            agent_size: The agent footprint, (length, width).
+            obstacle_size: The Obstacle footprint, (length, width), or None if
+                           there is no Obstacle.
+            road: Boolean array of shape (height, width) which is True on the
+                  road, indexed by [y, x]. If None, no start is rejected for
+                  being off the road.
+            size: The number of initial conditions sampled per batch.
+            rng: The numpy RandomState which the states are sampled from.
+                 Defaults to numpy's global generator.
+        """
+        self.agent_start = agent_start
+        self.agent_size = agent_size
+        self.obstacle_size = obstacle_size
+        self.road = road
+        self.size = size
+        self.rng = rng
+
+        self.agent_states = None
+        self.obstacle_states = None
+        self.crashes = None
+        self.index = 0
+
+        self.fill()
+
+    def fill(self):
+        """Samples a new batch of initial conditions, replacing the current
+        one, and keeps the valid ones."""
+        agent_std = (agent.STD_X, agent.STD_Y, agent.STD_THETA, agent.STD_SPEED)
+        agent_states = self._sample(self.agent_start, agent_std if agent.NOISE else None)
+        valid = self._on_road(agent_states)
+
+        if self.obstacle_size is not None:
+            start = (obstacle.X, obstacle.Y, obstacle.THETA, obstacle.SPEED)
+            std = (obstacle.STD_X, obstacle.STD_Y, 0, obstacle.STD_SPEED)
+            obstacle_states = self._sample(start, std if obstacle.NOISE else None)
+            crashes = obstacle.CRASH & (self.rng.random_sample(self.size) < obstacle.PROB_CRASH)
+
+            agent_boxes = np.concatenate((agent_states[:, 0:3], np.tile(self.agent_size, (self.size, 1))), 1)
+            obstacle_boxes = np.concatenate((obstacle_states[:, 0:3], np.tile(self.obstacle_size, (self.size, 1))), 1)
+
+            valid &= self._on_road(obstacle_states) & ~boxes_overlap(agent_boxes, obstacle_boxes)
+        else:
+            obstacle_states = np.zeros((self.size, 4))
+            crashes = np.zeros(self.size, dtype=bool)
+
+        if not valid.any():
+            raise ValueError("None of the sampled initial states are valid.")
+
+        self.agent_states = agent_states[valid]
+        self.obstacle_states = obstacle_states[valid]
+        self.crashes = crashes[valid]
+        self.index = 0
+
+    def next(self):
+        """Returns the next initial conditions as a tuple (agent_state,
+        obstacle_state, crash), where obstacle_state is None if there is no
+        Obstacle and crash is whether the Obstacle will crash. The states are
+        tuples of floats, which are faster than numpy scalars for the geometry
+        of the bounding boxes."""
+        if self.index >= len(self.agent_states):
+            self.fill()
+
+        i = self.index
+        self.index += 1
+
+        if self.obstacle_size is None:
+            return tuple(self.agent_states[i].tolist()), None, False
+
+        return tuple(self.agent_states[i].tolist()), tuple(self.obstacle_states[i].tolist()), bool(self.crashes[i])
+
+    def _sample(self, start, std):
+        """Returns an array of shape (size, 4) of states around a start. Like
+        with add_noise, integer components of the start stay integers."""
+        states = np.tile(np.asarray(start, dtype=float), (self.size, 1))
+
+        if std is not None:
+            states += self.rng.normal(0, 1, states.shape) * std
+
+            for i, value in enumerate(start):
+                if type(value) == int:
+                    states[:, i] = np.round(states[:, i])
+
+        return states
+
+    def _on_road(self, states):
+        """Returns whether the centre of each state is on the road."""
+        if self.road is None:
+            return np.ones(len(states), dtype=bool)
+
+        ix = np.floor(states[:, 0]).astype(int)
+        iy = np.floor(states[:, 1]).astype(int)
+        inside = (ix >= 0) & (ix < self.road.shape[1]) & (iy >= 0) & (iy < self.road.shape[0])
+
+        on_road = np.zeros(len(states), dtype=bool)
+        on_road[inside] = self.road[iy[inside], ix[inside]]
+
+        return on_road
@@ -0,0 +1,101 @@
+"""Model-predictive rollouts of many action sequences at once."""
+import numpy as np
+from models import unicycle_step
+from util import boxes_overlap
+from variables import global_var
+
+
+def rollout(state, actions, npc_states=None, agent_size=(0, 0), npc_sizes=None,
+            road=None, map_size=None, dt=1.0, substeps=1):
+    """Simulates M action sequences of H steps from a single start state,
+    without touching an environment. The agent follows the same dynamics as in
+    Environment.step: actions are clipped like in input_to_action, the speed is
+    limited after moving and the agent is kept inside the map. NPCs are
+    extrapolated forward at constant speed and heading, which is how they move
+    without actions.
+
+    Args:
+        state: The start state of the agent, (x, y, theta, speed).
+        actions: Array of shape (M, H, 2) of actions.
+        npc_states: Array of shape (K, 4) of the current NPC states. Optional.
+        agent_size: The agent footprint, (length, width).
+        npc_sizes: Array of shape (K, 2) of the NPC footprints, (length, width).
+                   Defaults to the agent footprint.
+        road: Boolean array of shape (height, width) which is True on the road,
+              indexed by [y, x]. If None, no off road flags are computed.
+        map_size: The size of the map, (width, height), inside which the agent
+                  is kept. Optional.
+        dt: Length of a step. Defaults to 1.
+        substeps: Number of integration steps per step. The flags are only
+                  computed after each step. Defaults to 1.
+
+    Returns:
+        A tuple (trajectories, collisions, off_road) where trajectories is an
+        array of shape (M, H, 4) of the states after each step, and
+        collisions and off_road are boolean arrays of shape (M, H).
+    """
+    actions = np.asarray(actions, dtype=float)
+    n_seq, horizon = actions.shape[0:2]
+
+    acc = np.clip(actions[..., 0], -global_var.MAX_ACC, global_var.MAX_ACC)
+    steer = np.clip(actions[..., 1], -global_var.MAX_ANGLE, global_var.MAX_ANGLE)
+
+    trajectories = np.zeros((n_seq, horizon, 4))
+    current = np.tile(np.asarray(state, dtype=float), (n_seq, 1))
+
+    sub_dt = float(dt) / substeps
+    for t in range(horizon):
+        for _ in range(substeps):
+            current = unicycle_step(current, acc[:, t], steer[:, t], sub_dt)
+            current[:, 3] = np.clip(current[:, 3], -global_var.MAX_SPEED, global_var.MAX_SPEED)
+
+        if map_size is not None:
+            current[:, 0] = np.clip(current[:, 0], 0, map_size[0])
+            current[:, 1] = np.clip(current[:, 1], 0, map_size[1])
+
+        trajectories[:, t] = current
+
+    collisions = np.zeros((n_seq, horizon), dtype=bool)
+    if npc_states is not None and len(npc_states) > 0:
+        npcs = extrapolate(npc_states, horizon, dt)
+
+        if npc_sizes is None:
+            npc_sizes = np.tile(agent_size, (len(npc_states), 1))
+
+        # Boxes of shape (M, H, 1, 5) for the agent and (H, K, 5) for the NPCs.
+        agent_boxes = np.concatenate((trajectories[..., 0:3], np.broadcast_to(agent_size, (n_seq, horizon, 2))), -1)
+        npc_sizes = np.broadcast_to(npc_sizes, npcs.shape[0:2] + (2,))
+        npc_boxes = np.concatenate((npcs[..., 0:3], npc_sizes), -1)
+
+        collisions = boxes_overlap(agent_boxes[:, :, np.newaxis], npc_boxes).any(axis=-1)
+
+    off_road = np.zeros((n_seq, horizon), dtype=bool)
+    if road is not None:
+        ix = np.floor(trajectories[..., 0]).astype(int)
+        iy = np.floor(trajectories[..., 1]).astype(int)
+        inside = (ix >= 0) & (ix < road.shape[1]) & (iy >= 0) & (iy < road.shape[0])
+        off_road = ~inside
+        off_road[inside] = ~road[iy[inside], ix[inside]]
+
+    return trajectories, collisions, off_road
+
+
+def extrapolate(npc_states, horizon, dt=1.0):
+    """Extrapolates NPC states forward at constant speed and heading.
+
+    Args:
+        npc_states: Array of shape (K, 4) of NPC states.
+        horizon: The number of steps.
+        dt: Length of a step. Defaults to 1.
+
+    Returns:
+        Array of shape (H, K, 4) of the states after each step.
+    """
+    npc_states = np.asarray(npc_states, dtype=float).reshape(-1, 4)
+    steps = np.arange(1, horizon + 1)[:, np.newaxis] * dt
+
+    states = np.repeat(npc_states[np.newaxis], horizon, axis=0)
+    states[..., 0] += steps * npc_states[:, 3] * np.sin(npc_states[:, 2])
+    states[..., 1] += steps * npc_states[:, 3] * np.cos(npc_states[:, 2])
+
+    return states
@@ -0,0 +1,192 @@
+"""Lane connectivity graph of a map and shortest path routing between zones."""
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+from map_assets import get_asset
+
+
+class LaneGraph(object):
+    """Directed graph of the lanes and intersections of a map, with the
+    shortest routes between every pair of zones computed ahead of time.
+
+    The nodes are the zones, in the order of ZoneTracker: the lanes, then the
+    intersections. A lane leads to the zone at its end, in its direction of
+    travel (see LaneMap), and to the lanes next to it in the same direction.
+    An intersection leads to the lanes which start at it. Each zone is reached
+    at its entry point, the start of the centreline of a lane or the centre of
+    an intersection, and the edges are as long as the distance between the
+    entry points.
+
+    The table of distances and of the next zone along each shortest route is
+    cached with the assets of the map, so each query is a lookup.
+    """
+
+    def __init__(self, env_name, lane_map, intersections, tolerance=2.0, contact=10.0):
+        """Builds the graph and loads or computes the routes.
+
+        Args:
+            env_name: The name of the map, for the cache.
+            lane_map: The LaneMap of the map.
+            intersections: The intersection zones, as Rectangles with an id.
+            tolerance: Zones closer than this touch (pixels).
+            contact: Zones only connect if they touch along more than this,
+                     rather than at a corner (pixels).
+        """
+        self.tolerance = tolerance
+        self.contact = contact
+        n_lanes = len(lane_map.bounds)
+
+        self.zones = [("lane", i) for i in range(n_lanes)] + \
+                     [("intersection", intersection.id) for intersection in intersections]
+        self.index = dict((zone, i) for i, zone in enumerate(self.zones))
+
+        bounds = [tuple(b) for b in lane_map.bounds.tolist()]
+        for intersection in intersections:
+            xs = [pt[0] for pt in intersection.points]
+            ys = [pt[1] for pt in intersection.points]
+            bounds.append((min(xs), min(ys), max(xs), max(ys)))
+        self.bounds = np.array(bounds, dtype=float).reshape(-1, 4)
+
+        # Entry point of each zone.
+        self.entries = np.concatenate((lane_map.origins, (self.bounds[n_lanes:, 0:2] + self.bounds[n_lanes:, 2:4]) / 2.0))
+
+        self.edges = self._get_edges(lane_map)
+
+        routes = get_asset(env_name, "routes_%g_%g" % (tolerance, contact), self._get_routes)
+        self.distances = routes[0]
+        self.next_zones = routes[1].astype(int)
+
+    def _get_edges(self, lane_map):
+        """Returns the list of directed edges (i, j) between zones."""
+        n_lanes = len(lane_map.bounds)
+        edges = []
+
+        # Thin boxes across the start and the end of each lane.
+        ends = lane_map.origins + lane_map.tangents * lane_map.lengths[:, np.newaxis]
+        start_boxes = [self._edge_box(lane_map.bounds[i], lane_map.origins[i]) for i in range(n_lanes)]
+        end_boxes = [self._edge_box(lane_map.bounds[i], ends[i]) for i in range(n_lanes)]
+
+        for i in range(len(self.zones)):
+            for j in range(len(self.zones)):
+                if i == j:
+                    continue
+
+                if i < n_lanes and j < n_lanes:
+                    # Continuing into the next lane, or changing to the lane alongside.
+                    if self._overlaps(end_boxes[i], start_boxes[j]) or \
+                            (np.isclose(lane_map.headings[i], lane_map.headings[j]) and
+                             self._alongside(lane_map.bounds[i], lane_map.bounds[j], lane_map.tangents[i])):
+                        edges.append((i, j))
+                elif i < n_lanes:
+                    if self._overlaps(end_boxes[i], self.bounds[j]):
+                        edges.append((i, j))
+                elif j < n_lanes:
+                    if self._overlaps(self.bounds[i], start_boxes[j]):
+                        edges.append((i, j))
+
+        return edges
+
+    def _edge_box(self, bounds, point):
+        """Returns a thin box around the side of a lane which passes through
+        point, one of the ends of its centreline."""
+        t = self.tolerance
+        if bounds[3] - bounds[1] >= bounds[2] - bounds[0]:
+            return (bounds[0], point[1] - t, bounds[2], point[1] + t)
+
+        return (point[0] - t, bounds[1], point[0] + t, bounds[3])
+
+    def _overlaps(self, a, b):
+        """Returns whether two boxes (min x, min y, max x, max y) overlap along
+        more than the contact length."""
+        dx = min(a[2], b[2]) - max(a[0], b[0])
+        dy = min(a[3], b[3]) - max(a[1], b[1])
+        return dx > 0 and dy > 0 and max(dx, dy) > self.contact
+
+    def _alongside(self, a, b, tangent):
+        """Returns whether two lanes touch side by side, overlapping along the
+        direction of travel by more than the contact length."""
+        t = self.tolerance
+        touch = self._overlaps((a[0] - t, a[1] - t, a[2] + t, a[3] + t), b)
+        if abs(tangent[1]) > abs(tangent[0]):
+            along = min(a[3], b[3]) - max(a[1], b[1])
+        else:
+            along = min(a[2], b[2]) - max(a[0], b[0])
+
+        return touch and along > self.contact
+
+    def _get_routes(self):
+        """Returns an array of shape (2, N, N) with the length of the shortest
+        route from each zone to each other zone, inf if there is none, and the
+        next zone along the route, -1 if there is none."""
+        n = len(self.zones)
+        if len(self.edges) == 0:
+            distances = np.where(np.eye(n, dtype=bool), 0, np.inf)
+            return np.stack((distances, np.full((n, n), -1.0)))
+
+        i, j = np.array(self.edges).T
+        lengths = np.hypot(*(self.entries[j] - self.entries[i]).T)
+        graph = csr_matrix((lengths, (i, j)), shape=(n, n))
+
+        distances = shortest_path(graph, directed=True)
+
+        # On the reversed graph, the predecessor of a zone on the route from
+        # the goal is the next zone on the route to the goal.
+        _, predecessors = shortest_path(graph.T, directed=True, return_predecessors=True)
+        next_zones = np.where(predecessors < 0, -1, predecessors).T
+
+        return np.stack((distances, next_zones.astype(float)))
+
+    def get_route(self, start, goal):
+        """Returns the list of zones along the shortest route from a zone to
+        another, including both, or None if the goal can't be reached.
+
+        Args:
+            start: The start zone, ("type", ID).
+            goal: The goal zone, ("type", ID).
+        """
+        i = self.index[start]
+        g = self.index[goal]
+        if np.isinf(self.distances[i, g]):
+            return None
+
+        route = [start]
+        while i != g:
+            i = self.next_zones[i, g]
+            route.append(self.zones[i])
+
+        return route
+
+    def get_next_zone(self, zone, goal):
+        """Returns the next zone on the shortest route to the goal, or None if
+        the zone is the goal or the goal can't be reached."""
+        i = self.next_zones[self.index[zone], self.index[goal]]
+
+        return self.zones[i] if i >= 0 else None
+
+    def get_progress(self, zone, pos, goal):
+        """Returns the next zone on the shortest route to the goal, its entry
+        point and the remaining length of the route, from a position in a zone.
+
+        Args:
+            zone: The zone the position is in, ("type", ID).
+            pos: The position, (x, y).
+            goal: The goal zone, ("type", ID).
+
+        Returns:
+            A tuple (next zone, waypoint, distance). The next zone and the
+            waypoint are None in the goal, where the distance is 0. The
+            distance is inf if the goal can't be reached.
+        """
+        i = self.index[zone]
+        g = self.index[goal]
+        if i == g:
+            return None, None, 0.0
+
+        j = self.next_zones[i, g]
+        if j < 0:
+            return None, None, np.inf
+
+        waypoint = self.entries[j]
+        distance = np.hypot(waypoint[0] - pos[0], waypoint[1] - pos[1]) + self.distances[j, g]
+
+        return self.zones[j], tuple(waypoint), distance
@@ -0,0 +1,379 @@
+#!/usr/bin/env python
+"""Benchmarks for the simulator.
+
+Usage:
+    python benchmark.py [NAME ...]
+
+Runs the named benchmarks, or all of them if no name is given.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+import numpy as np
+import pygame
+from monicars import Environment
+from monicars.agent import Agent
+from monicars.bev import BirdsEyeView, pack_layers
+from monicars.npc import NPCManager
+from monicars.server import EnvServer, EnvClient
+from monicars.launcher import WorkerLauncher, get_memory
+from monicars.metrics import ColumnWriter, EpisodeMetrics, read_columns
+from monicars.replay import Replay
+from monicars.view import View
+from monicars.variables import global_var
+
+
+def _time_render(view, display_surface, frames, agent_speed):
+    """Returns the number of frames per second when drawing ten cars with the
+    view, of which the first is followed by the view."""
+    img = pygame.image.load(os.path.join(global_var.PATH, "media", "red_car.png"))
+    cars = [[img, 450 + 10 * (i % 2), 100 + 100 * i, 0] for i in range(10)]
+    cars[0][1:3] = [550, 250]
+
+    start = time.time()
+    for frame in range(frames):
+        for i, car in enumerate(cars):
+            car[2] += agent_speed if i == 0 else 2
+
+        view.update(cars[0][1], cars[0][2], [tuple(car) for car in cars])
+        view.show(display_surface)
+
+    return frames / (time.time() - start)
+
+
+def render(frames=500):
+    """Interactive render FPS, for the whole map shown at once, for a
+    scrolling view which isn't moving and for a scrolling view which is."""
+    display_surface = pygame.display.set_mode((1000, 1500))
+    view = View("intersection", 1000, 1500)
+    print("render, whole map:       %8.1f FPS" % _time_render(view, display_surface, frames, 0))
+
+    display_surface = pygame.display.set_mode((500, 500))
+    view = View("intersection", 1000, 1500, 500, 500)
+    print("render, stationary view: %8.1f FPS" % _time_render(view, display_surface, frames, 0))
+
+    view = View("intersection", 1000, 1500, 500, 500)
+    print("render, scrolling view:  %8.1f FPS" % _time_render(view, display_surface, frames, 1))
+
+    view = View("intersection", 1000, 1500, 500, 500, tiled=True)
+    print("render, tiled scrolling: %8.1f FPS" % _time_render(view, display_surface, frames, 1))
+
+
+def _populate(env, steps=300):
+    """Steps the environment with dense traffic so that NPCs are on the road."""
+    NPCManager.NEW = 0.5
+    NPCManager.MAX = 20
+    env.reset()
+    env.agent.set_speed(0)
+    for _ in range(steps):
+        env.step([0, 0])
+
+
+def _time_observations(env, n):
+    """Returns the number of observations per second."""
+    start = time.time()
+    for _ in range(n):
+        env._get_observation()
+
+    return n / (time.time() - start)
+
+
+def bev(n=200):
+    """Bird's-eye view grids against vision observations, which need the
+    view to be drawn, at the screen resolution and at the default one."""
+    env = Environment("intersection", render=False, vision=True)
+    _populate(env)
+
+    start = time.time()
+    for _ in range(n):
+        env._update_view()
+        env._get_observation()
+    print("vision, 500x500:         %8.1f obs/s" % (n / (time.time() - start)))
+
+    env.vision = False
+    env.bev = True
+    layers = pack_layers(env.view.get_raster())
+    env.bev_grid = BirdsEyeView(layers, 500, 500)
+    print("bev, 500x500:            %8.1f obs/s" % _time_observations(env, n))
+
+    env.bev_grid = BirdsEyeView(layers)
+    print("bev, 64x64:              %8.1f obs/s" % _time_observations(env, n))
+    env.quit()
+
+
+def reset(n=2000, runs=5):
+    """Reset latency with the obstacle, sampling the initial conditions on
+    every reset and taking them from a pool. The best of several runs is
+    reported, since a single run varies by tens of percent."""
+    for pool, label in [(None, "sampled"), (1000, "pool")]:
+        env = Environment("two_lanes", render=False, obstacle=True, reset_pool=pool)
+        env.reset()
+
+        best = float("inf")
+        for _ in range(runs):
+            start = time.time()
+            for _ in range(n):
+                env.reset()
+            best = min(best, time.time() - start)
+        print("reset, %-8s          %8.1f us" % (label + ":", best / n * 1e6))
+        env.quit()
+
+
+def traffic(steps=100):
+    """NPC step latency with car following, for hundreds of NPCs spread over
+    the lanes of the intersection."""
+    env = Environment("intersection", render=False)
+    rng = np.random.RandomState(0)
+    for n in [100, 500]:
+        manager = NPCManager([], (env.width, env.height), lane_map=env.lane_map)
+        manager.IDM = True
+        for start in rng.randint(0, len(env.npc_manager.starts), n):
+            x, y = env.npc_manager.starts[start]["position"]
+            theta = NPCManager.DIRS[env.npc_manager.starts[start]["orientation"]]
+            manager.npcs.append(Agent(x + rng.uniform(-1000, 1000) * np.sin(theta),
+                                      y + rng.uniform(-1000, 1000) * np.cos(theta), theta, 6))
+
+        start = time.time()
+        for _ in range(steps):
+            manager.move(others=[env.agent])
+        print("traffic, %3d NPCs:       %8.1f us" % (n, (time.time() - start) / steps * 1e6))
+    env.quit()
+
+
+def _serve(address, n_envs, ready):
+    """Runs an env server until the process is terminated."""
+    server = EnvServer("two_lanes", n_envs, address)
+    ready.set()
+    server.serve_forever()
+
+
+def server(n_envs=16, steps=500):
+    """Env steps per second in process, and through an env server in another
+    process over a Unix domain socket and over TCP, with one request for all
+    the environments per step."""
+    envs = [Environment("two_lanes", render=False) for _ in range(n_envs)]
+    for env in envs:
+        env.reset()
+
+    start = time.time()
+    for _ in range(steps):
+        for env in envs:
+            if env.step([0, 0])[2]:
+                env.reset()
+    print("server, in process:      %8.1f steps/s" % (steps * n_envs / (time.time() - start)))
+
+    directory = tempfile.mkdtemp()
+    for address, label in [(os.path.join(directory, "env.sock"), "unix"), (("127.0.0.1", 5757), "tcp")]:
+        ready = multiprocessing.Event()
+        process = multiprocessing.Process(target=_serve, args=(address, n_envs, ready))
+        process.start()
+        ready.wait()
+
+        client = EnvClient(address)
+        client.reset()
+        actions = np.zeros((n_envs, 2))
+
+        start = time.time()
+        for _ in range(steps):
+            client.step(actions)
+        print("server, %-4s socket:     %8.1f steps/s" % (label, steps * n_envs / (time.time() - start)))
+
+        client.close()
+        process.terminate()
+        process.join()
+    shutil.rmtree(directory)
+
+
+_FRESH_WORKER = """
+import sys
+from monicars import Environment
+env = Environment("intersection", render=False)
+sys.stdout.write("x")
+sys.stdout.flush()
+sys.stdin.read()
+"""
+
+
+def _forked_worker(i, ready, go):
+    """Creates an environment, signals that it is ready and waits to exit."""
+    Environment("intersection", render=False)
+    os.write(ready, b"x")
+    os.read(go, 1)
+
+
+def _report(label, startup, pids):
+    """Prints the mean startup time and memory of a set of workers."""
+    memory = [get_memory(pid) for pid in pids]
+    if None in memory:
+        rss = pss = float("nan")
+    else:
+        rss = sum(m[0] for m in memory) / 1024.0 / len(pids)
+        pss = sum(m[1] for m in memory) / 1024.0 / len(pids)
+    print("fork, %-8s %6.1f ms startup, %6.1f MB RSS, %6.1f MB PSS per worker" % (label + ":", startup * 1e3, rss, pss))
+
+
+def fork(n_workers=8):
+    """Startup time and memory per worker, for workers started as new Python
+    processes and for workers forked from a parent which preloaded the map."""
+    processes = []
+    start = time.time()
+    for _ in range(n_workers):
+        process = subprocess.Popen([sys.executable, "-c", _FRESH_WORKER], stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE)
+        process.stdout.read(1)
+        processes.append(process)
+    _report("fresh", (time.time() - start) / n_workers, [process.pid for process in processes])
+    for process in processes:
+        process.communicate()
+
+    start = time.time()
+    launcher = WorkerLauncher(["intersection"])
+    print("fork, preload:  %6.1f ms" % ((time.time() - start) * 1e3))
+
+    ready, ready_w = os.pipe()
+    go, go_w = os.pipe()
+    start = time.time()
+    for _ in range(n_workers):
+        launcher.launch(_forked_worker, 1, ready_w, go)
+        os.read(ready, 1)
+    _report("forked", (time.time() - start) / n_workers, launcher.pids)
+    os.write(go_w, b"x" * n_workers)
+    launcher.join()
+    for fd in [ready, ready_w, go, go_w]:
+        os.close(fd)
+
+
+def query(n=100000):
+    """Labelling logged states with the batch query, against setting the
+    state of the environment and querying it one state at a time."""
+    env = Environment("intersection", render=False, obstacle=True)
+    env.reset()
+    rng = np.random.RandomState(0)
+    agents = np.stack((rng.uniform(0, 1000, n), rng.uniform(0, 1000, n),
+                       rng.uniform(-np.pi, np.pi, n), rng.uniform(0, 10, n)), axis=-1)
+    npcs = agents[:, np.newaxis] + rng.normal(0, 50, (n, 1, 4))
+
+    start = time.time()
+    env.query_states(agents, npcs)
+    print("query, batch:            %8.1f states/s" % (n / (time.time() - start)))
+
+    m = n // 100
+    start = time.time()
+    for i in range(m):
+        env.set_state(np.concatenate((agents[i], npcs[i, 0])))
+        env.get_zone()
+        env.on_road()
+        env.collided()
+        env._get_observation()
+    print("query, one at a time:    %8.1f states/s" % (m / (time.time() - start)))
+    env.quit()
+
+
+def lazy(n=500, repeat=4):
+    """Steps per second with vision observations, reading every observation
+    and, with lazy observations, only the last of each action repeat."""
+    for lazy_obs in [False, True]:
+        env = Environment("intersection", render=False, vision=True, lazy_obs=lazy_obs)
+        _populate(env, 50)
+
+        start = time.time()
+        for i in range(n):
+            obs, _, done = env.step([0.1, 0])
+            if i % repeat == repeat - 1:
+                np.asarray(obs)
+            if done:
+                env.reset()
+        print("lazy, %-5s:             %8.1f steps/s" % (lazy_obs, n / (time.time() - start)))
+        env.quit()
+
+
+def metrics(steps=2000, records=100000, block=100):
+    """Steps per second with and without the episode metrics, and the time
+    to summarise a sweep from the columns of its records. The metrics are
+    switched on and off every block of steps of the same environment, so both
+    see the same traffic."""
+    env = Environment("intersection", render=False, obstacle=True, metrics=True)
+    accumulator = env.metrics
+    _populate(env, 50)
+
+    elapsed = [0.0, 0.0]
+    for i in range(steps // block):
+        env.metrics = accumulator if i % 2 else None
+        start = time.time()
+        for _ in range(block):
+            _, _, done = env.step([0.1, 0])
+            if done:
+                env.reset()
+        elapsed[i % 2] += time.time() - start
+    env.quit()
+    for on in [False, True]:
+        print("metrics, %-5s:          %8.1f steps/s" % (on, steps / 2 / elapsed[on]))
+
+    path = tempfile.mkdtemp()
+    writer = ColumnWriter(path)
+    record = EpisodeMetrics(0.1).get()
+    start = time.time()
+    for _ in range(records // 10):
+        writer.append(record)
+    print("metrics, append:         %8.1f records/s" % (records // 10 / (time.time() - start)))
+
+    # Fill the columns up to the number of records directly.
+    for name, dtype in writer.columns:
+        with open(os.path.join(path, name + ".bin"), "ab") as f:
+            f.write(np.zeros(records - records // 10, dtype).tobytes())
+
+    start = time.time()
+    columns = read_columns(path, ["collisions", "distance"])
+    rate = (columns["collisions"] > 0).mean()
+    distance = columns["distance"].mean()
+    print("metrics, summary:        %8.1f ms for %d records" % (1000 * (time.time() - start), records))
+    shutil.rmtree(path)
+
+
+def replay(steps=2000):
+    """Replaying an episode with vision observations up to its last step,
+    fast-forwarding against full steps, and the cost of the state hashes."""
+    env = Environment("intersection", render=False, vision=True, obstacle=True, hash_states=True)
+    actions = np.tile([0.01, 0], (steps, 1))
+    env.reset(seed=0)
+    for action in actions:
+        env.step(action)
+    hashes = list(env.state_hashes)
+
+    start = time.time()
+    episode = Replay(env, 0, actions, hashes)
+    episode.seek(steps)
+    print("replay, fast-forward:    %8.1f steps/s" % (steps / (time.time() - start)))
+
+    start = time.time()
+    episode.seek(0)
+    for _ in range(steps):
+        episode.step()
+    print("replay, full steps:      %8.1f steps/s" % (steps / (time.time() - start)))
+    assert episode.divergence is None
+
+    for hash_states in [False, True]:
+        env.hash_states = hash_states
+        env.reset(seed=0)
+        start = time.time()
+        for action in actions:
+            env.fast_step(action)
+        print("replay, hashes %-5s:    %8.1f steps/s" % (hash_states, steps / (time.time() - start)))
+    env.quit()
+
+
+BENCHMARKS = [render, bev, reset, traffic, server, fork, query, lazy, metrics, replay]
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:]
+    for benchmark in BENCHMARKS:
+        if len(names) == 0 or benchmark.__name__ in names:
+            benchmark()
@@ -0,0 +1,390 @@
+"""Serving many environments from one process over a local socket.
+
+An EnvServer hosts a set of environments behind a Unix domain socket or a
+localhost TCP socket, and EnvClients step any subset of them with one
+request. Messages are framed as a one byte command or status, a uint32
+payload length and the payload, all little endian. The payloads are packed
+numpy arrays:
+
+    INFO:  request empty, response (n_envs, dtype, ndim, shape...) of the
+           observations.
+    RESET: request (k, ids[k]), response obs[k].
+    STEP:  request (k, ids[k], actions[k, 2]), response
+           (obs[k], rewards[k], dones[k]).
+
+Replies to failed requests have an ERROR status and the message as payload.
+"""
+import os
+import socket
+import struct
+import threading
+import SocketServer
+from Queue import Queue, Empty
+import numpy as np
+from monicars import Environment
+
+INFO = b"I"
+RESET = b"R"
+STEP = b"S"
+OK = b"O"
+ERROR = b"E"
+
+_HEADER = struct.Struct("<cI")
+_COUNT = struct.Struct("<I")
+_INFO = struct.Struct("<IcI")
+
+
+def _recv_exactly(sock, n):
+    """Returns exactly n bytes read from a socket, or None if it was closed
+    before the first byte."""
+    buf = bytearray(n)
+    view = memoryview(buf)
+    read = 0
+    while read < n:
+        got = sock.recv_into(view[read:], n - read)
+        if got == 0:
+            if read == 0:
+                return None
+            raise IOError("The connection was closed in the middle of a message.")
+        read += got
+
+    return buf
+
+
+def _send(sock, kind, *parts):
+    """Sends a message made of the byte strings or arrays in parts."""
+    payload = b"".join(part.tobytes() if isinstance(part, np.ndarray) else part for part in parts)
+    sock.sendall(_HEADER.pack(kind, len(payload)) + payload)
+
+
+def _receive(sock):
+    """Returns the kind and the payload of the next message, or None if the
+    connection was closed."""
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+
+    kind, length = _HEADER.unpack(bytes(header))
+    payload = _recv_exactly(sock, length) if length > 0 else bytearray()
+    if payload is None:
+        raise IOError("The connection was closed in the middle of a message.")
+
+    return kind, payload
+
+
+def _unpack_ids(payload, n_envs):
+    """Returns the environment ids at the start of a request payload and the
+    offset of the rest of it."""
+    k = _COUNT.unpack_from(payload)[0]
+    ids = np.frombuffer(payload, dtype="<u4", count=k, offset=_COUNT.size).astype(int)
+    if len(ids) > 0 and (ids.max() >= n_envs):
+        raise ValueError("No environment with id %d." % ids.max())
+
+    return ids, _COUNT.size + 4 * k
+
+
+class _Handler(SocketServer.BaseRequestHandler):
+    """Answers the requests of one connection until it is closed."""
+
+    def handle(self):
+        server = self.server.env_server
+        while True:
+            message = _receive(self.request)
+            if message is None:
+                return
+
+            try:
+                parts = server.handle(*message)
+            except Exception as e:
+                _send(self.request, ERROR, str(e).encode("utf-8"))
+            else:
+                _send(self.request, OK, *parts)
+
+
+class _UnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class EnvServer(object):
+    """Hosts a set of environments. Each connection is served by its own
+    thread. The environments aren't thread safe, so each one has a lock,
+    which a request holds while it resets or steps it. Requests for disjoint
+    sets of environments are answered in parallel. The locks of a request
+    are taken in the order of the ids, so requests never deadlock.
+
+    The environments are reset when the server is created. With auto_reset,
+    an environment which is done after a step is reset straight away, and
+    the observation returned for it is the first of the new episode.
+    """
+
+    def __init__(self, env_name, n_envs, address, auto_reset=True, **kwargs):
+        """Creates the environments and binds the socket. Call start or
+        serve_forever to answer requests.
+
+        Args:
+            env_name: The name of the map of the environments.
+            n_envs: The number of environments.
+            address: A path for a Unix domain socket, or a (host, port) pair
+                     for a TCP socket.
+            auto_reset: Whether to reset environments which are done after a
+                        step. Defaults to True.
+
+        Keyword Args:
+            The keyword arguments of the environments. They aren't rendered
+            unless render is given.
+        """
+        if n_envs < 1:
+            raise ValueError("The server needs at least one environment.")
+
+        kwargs.setdefault("render", False)
+        self.envs = [Environment(env_name, **kwargs) for _ in range(n_envs)]
+        self.auto_reset = auto_reset
+        self.address = address
+
+        first = np.asarray([env.reset() for env in self.envs][0])
+        self.obs_shape = first.shape
+        self.obs_dtype = first.dtype.newbyteorder("<")
+
+        self._locks = [threading.Lock() for _ in self.envs]
+        self._thread = None
+
+        if isinstance(address, tuple):
+            self._server = _TCPServer(address, _Handler)
+            self.address = self._server.server_address
+        else:
+            if os.path.exists(address):
+                os.remove(address)
+            self._server = _UnixServer(address, _Handler)
+        self._server.env_server = self
+
+    def start(self):
+        """Answers requests on a background thread."""
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def serve_forever(self):
+        """Answers requests on this thread until close is called."""
+        self._server.serve_forever()
+
+    def close(self):
+        """Stops answering requests and closes the environments."""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+        if not isinstance(self.address, tuple) and os.path.exists(self.address):
+            os.remove(self.address)
+
+        for env in self.envs:
+            env.quit()
+
+    def handle(self, kind, payload):
+        """Answers a request.
+
+        Args:
+            kind: The command of the request.
+            payload: The payload of the request.
+
+        Returns:
+            The list of parts of the reply payload.
+        """
+        if kind == INFO:
+            info = _INFO.pack(len(self.envs), self.obs_dtype.char.encode("ascii"), len(self.obs_shape))
+            return [info, np.array(self.obs_shape, dtype="<u4")]
+
+        ids, offset = _unpack_ids(payload, len(self.envs))
+
+        if kind == RESET:
+            locks = self._acquire(ids)
+            try:
+                return [self._stack([self.envs[i].reset() for i in ids])]
+            finally:
+                self._release(locks)
+
+        if kind == STEP:
+            actions = np.frombuffer(payload, dtype="<f8", count=2 * len(ids), offset=offset).reshape(-1, 2)
+            obs = []
+            rewards = np.zeros(len(ids))
+            dones = np.zeros(len(ids), dtype=np.uint8)
+
+            locks = self._acquire(ids)
+            try:
+                for j, i in enumerate(ids):
+                    o, rewards[j], dones[j] = self.envs[i].step(actions[j])
+                    if dones[j] and self.auto_reset:
+                        o = self.envs[i].reset()
+                    obs.append(o)
+            finally:
+                self._release(locks)
+
+            return [self._stack(obs), rewards.astype("<f8"), dones]
+
+        raise ValueError("Unknown command %r." % kind)
+
+    def _acquire(self, ids):
+        """Takes the locks of the environments, each once and in the order of
+        their ids, and returns them."""
+        locks = [self._locks[i] for i in sorted(set(ids))]
+        for lock in locks:
+            lock.acquire()
+
+        return locks
+
+    def _release(self, locks):
+        """Releases the locks taken by _acquire."""
+        for lock in reversed(locks):
+            lock.release()
+
+    def _stack(self, obs):
+        """Returns the observations as one array of the observation type."""
+        return np.asarray(obs, dtype=self.obs_dtype).reshape((len(obs),) + self.obs_shape)
+
+
+class EnvClient(object):
+    """Steps environments of an EnvServer. Connections are kept open in a
+    pool and reused, so a client can be shared by several threads, each
+    request taking a connection of its own.
+    """
+
+    def __init__(self, address, env_ids=None, pool_size=4, timeout=None):
+        """Initializes the client and asks the server for the observation type.
+
+        Args:
+            address: The address of the server, as given to EnvServer.
+            env_ids: The ids of the environments this client steps. Defaults
+                     to all of them.
+            pool_size: The maximum number of open connections.
+            timeout: The timeout of the connections (seconds). Optional.
+        """
+        self.address = address
+        self.pool_size = pool_size
+        self.timeout = timeout
+
+        self._pool = Queue()
+        self._open = 0
+        self._lock = threading.Lock()
+
+        payload = self._request(INFO, b"")
+        n_envs, char, ndim = _INFO.unpack_from(payload)
+        self.n_envs = n_envs
+        self.obs_dtype = np.dtype(char).newbyteorder("<")
+        self.obs_shape = tuple(np.frombuffer(payload, dtype="<u4", count=ndim, offset=_INFO.size).tolist())
+
+        self.env_ids = np.arange(n_envs) if env_ids is None else np.asarray(env_ids, dtype=int)
+        self._ids = _COUNT.pack(len(self.env_ids)) + self.env_ids.astype("<u4").tobytes()
+
+    def _connect(self):
+        """Returns a new connection to the server."""
+        family = socket.AF_INET if isinstance(self.address, tuple) else socket.AF_UNIX
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(self.timeout)
+        sock.connect(self.address)
+        return sock
+
+    def _acquire(self):
+        """Returns a connection from the pool, opening a new one if all are
+        in use and the pool isn't full, or else waiting for one."""
+        try:
+            return self._pool.get_nowait()
+        except Empty:
+            pass
+
+        with self._lock:
+            opening = self._open < self.pool_size
+            if opening:
+                self._open += 1
+
+        if not opening:
+            return self._pool.get()
+
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._open -= 1
+            raise
+
+    def _discard(self, sock):
+        """Closes a connection which is no longer usable."""
+        sock.close()
+        with self._lock:
+            self._open -= 1
+
+    def _request(self, kind, *parts):
+        """Sends a request and returns the payload of the reply."""
+        sock = self._acquire()
+        try:
+            _send(sock, kind, *parts)
+            reply = _receive(sock)
+        except Exception:
+            self._discard(sock)
+            raise
+
+        if reply is None:
+            self._discard(sock)
+            raise IOError("The server closed the connection.")
+        self._pool.put(sock)
+
+        status, payload = reply
+        if status == ERROR:
+            raise ValueError("The server failed to answer: " + bytes(payload).decode("utf-8"))
+
+        return payload
+
+    def _obs(self, payload, n):
+        """Returns the n observations at the start of a reply payload."""
+        count = n * int(np.prod(self.obs_shape))
+        obs = np.frombuffer(payload, dtype=self.obs_dtype, count=count)
+        return obs.reshape((n,) + self.obs_shape), count * self.obs_dtype.itemsize
+
+    def reset(self):
+        """Resets the environments of the client.
+
+        Returns:
+            Array of the initial observations, one row per environment.
+        """
+        payload = self._request(RESET, self._ids)
+        return self._obs(payload, len(self.env_ids))[0]
+
+    def step(self, actions):
+        """Steps the environments of the client.
+
+        Args:
+            actions: Array of shape (K, 2) of the action of each environment.
+
+        Returns:
+            A tuple (obs, rewards, dones) of arrays with one row per
+            environment.
+        """
+        actions = np.asarray(actions, dtype="<f8")
+        n = len(self.env_ids)
+        if actions.shape != (n, 2):
+            raise ValueError("Expected actions of shape (%d, 2), got %s." % (n, actions.shape))
+
+        payload = self._request(STEP, self._ids, actions)
+        obs, offset = self._obs(payload, n)
+        rewards = np.frombuffer(payload, dtype="<f8", count=n, offset=offset)
+        dones = np.frombuffer(payload, dtype=np.uint8, count=n, offset=offset + 8 * n).astype(bool)
+
+        return obs, rewards, dones
+
+    def close(self):
+        """Closes the connections of the pool."""
+        while True:
+            try:
+                self._discard(self._pool.get_nowait())
+            except Empty:
+                return
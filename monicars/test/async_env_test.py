@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+import time
+import threading
+import unittest
+import numpy as np
+from monicars import Environment
+from async_env import AsyncEnvironment
+from pacing import Pacer
+
+
+class AsyncEnvironmentTest(unittest.TestCase):
+
+    def test_matches_step(self):
+        envs = AsyncEnvironment([Environment("two_lanes", render=False) for _ in range(3)], n_workers=2)
+        expected_envs = [Environment("two_lanes", render=False) for _ in range(3)]
+        actions = np.random.RandomState(0).uniform(-1, 1, (5, 3, 2))
+
+        self.assertTrue(np.allclose(envs.reset_all(), [env.reset() for env in expected_envs]))
+        for t in range(5):
+            envs.step_async(actions[t])
+            obs, rewards, dones = envs.step_wait()
+            expected, expected_rewards, expected_dones = zip(*[env.step(action)
+                                                               for env, action in zip(expected_envs, actions[t])])
+
+            self.assertTrue(np.allclose(obs, expected))
+            self.assertTrue(np.allclose(rewards, expected_rewards))
+            self.assertEqual(list(dones), list(expected_dones))
+
+        envs.close()
+
+    def test_bounded_pool(self):
+        envs = AsyncEnvironment([Environment("two_lanes", render=False) for _ in range(6)], n_workers=2)
+        self.assertEqual(len(envs._threads), 2)
+
+        lock = threading.Lock()
+        running = [0] * 6
+        calls = [[] for _ in range(6)]
+        most = [0]
+
+        def call(env, i, j):
+            with lock:
+                running[i] += 1
+                most[0] = max(most[0], sum(running))
+                self.assertEqual(running[i], 1)
+            time.sleep(0.001)
+            calls[i].append(j)
+            with lock:
+                running[i] -= 1
+
+        futures = [envs.submit(i, call, i, j) for j in range(10) for i in range(6)]
+        for future in futures:
+            future.result()
+
+        # The calls of each environment were made in order, one at a time,
+        # and no more than two at once overall.
+        self.assertEqual(calls, [list(range(10))] * 6)
+        self.assertLessEqual(most[0], 2)
+        envs.close()
+
+    def test_does_not_block(self):
+        # With tick, each step after the first waits for the frame time, 1 / 2 s here.
+        env = Environment("two_lanes", render=False, tick=True)
+        env.pacer = Pacer(2)
+        envs = AsyncEnvironment(env)
+        envs.reset().result()
+
+        called = threading.Event()
+        start = time.time()
+        futures = [envs.step([0, 0]) for _ in range(2)]
+        futures[-1].add_done_callback(lambda future: called.set())
+        self.assertLess(time.time() - start, 0.1)
+        self.assertFalse(futures[-1].done())
+
+        futures[-1].result()
+        self.assertTrue(called.wait(1))
+        self.assertTrue(futures[0].done())
+        envs.close()
+
+    def test_errors(self):
+        envs = AsyncEnvironment(Environment("two_lanes", render=False))
+
+        with self.assertRaises(ZeroDivisionError):
+            envs.submit(0, lambda env: 1 / 0).result()
+        with self.assertRaises(ValueError):
+            envs.step_wait()
+
+        envs.step_async([[0, 0]])
+        with self.assertRaises(ValueError):
+            envs.step_async([[0, 0]])
+        envs.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+import unittest
+import numpy as np
+from bev import BirdsEyeView, pack_layers
+from util import GREY, WHITE, boxes_overlap
+
+
+def brute_force(raster, size, extent, agent_box, npc_boxes):
+    """Returns the grid of BirdsEyeView.observe, testing the centre of every
+    cell one at a time."""
+    x, y, theta = agent_box[0:3]
+    grid = np.zeros((4, size, size), dtype=np.uint8)
+    cell = float(extent) / size
+
+    for row in range(size):
+        for col in range(size):
+            ahead = extent / 2.0 - (row + 0.5) * cell
+            right = (col + 0.5) * cell - extent / 2.0
+            px = x + ahead * np.sin(theta) - right * np.cos(theta)
+            py = y + ahead * np.cos(theta) + right * np.sin(theta)
+
+            if 0 <= px < raster.shape[1] and 0 <= py < raster.shape[0]:
+                colour = raster[int(py), int(px)]
+                grid[0, row, col] = colour in (GREY, WHITE)
+                grid[1, row, col] = colour == WHITE
+
+            # A point is a box of size zero.
+            point = np.array([[px, py, 0, 0, 0]])
+            if len(npc_boxes) > 0:
+                grid[2, row, col] = boxes_overlap(point, np.asarray(npc_boxes)).any()
+            grid[3, row, col] = boxes_overlap(point, np.array([agent_box])).any()
+
+    return grid
+
+
+class BirdsEyeViewTest(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        rng = np.random.RandomState(0)
+        raster = rng.choice([0, GREY, WHITE], (120, 150))
+
+        for size, extent in [(16, 40.0), (25, 60.0)]:
+            bev = BirdsEyeView(pack_layers(raster), size, extent)
+
+            for _ in range(5):
+                agent_box = [rng.uniform(0, 150), rng.uniform(0, 120), rng.uniform(-np.pi, np.pi), 12, 6]
+                npc_boxes = np.column_stack((agent_box[0] + rng.normal(0, 15, 4), agent_box[1] + rng.normal(0, 15, 4),
+                                             rng.choice([0, np.pi / 2, rng.uniform(-np.pi, np.pi)], 4),
+                                             rng.uniform(5, 20, 4), rng.uniform(3, 10, 4)))
+
+                grid = bev.observe(agent_box[0:3] + [0], agent_box[3:5], npc_boxes)
+
+                self.assertTrue(np.array_equal(grid, brute_force(raster, size, extent, agent_box, npc_boxes)))
+
+    def test_off_map(self):
+        raster = np.full((120, 150), GREY, dtype=np.uint8)
+        raster[::7] = WHITE
+        bev = BirdsEyeView(pack_layers(raster), 16, 40.0)
+
+        # Near the map, far from it, and past the right edge by more than the
+        # padding, where the rows of the padded map would wrap onto the road.
+        for x, y, theta in [(-10, 60, 0.3), (160, 125, 1), (-5000, -5000, 0), (1e9, 60, 0), (150 + 3 * 40, 60, 0),
+                            (75, 120 + 3 * 40, 0)]:
+            grid = bev.observe((x, y, theta, 0), (12, 6), [])
+            self.assertTrue(np.array_equal(grid, brute_force(raster, 16, 40.0, [x, y, theta, 12, 6], [])))
+
+    def test_far_boxes(self):
+        bev = BirdsEyeView(np.zeros((100, 100), dtype=np.uint8), 10, 20.0)
+
+        grid = bev.observe((50, 50, 0, 0), (4, 2), [[90, 90, 0, 4, 2], [-50, 50, 1, 4, 2]])
+
+        self.assertFalse(grid[2].any())
+        self.assertEqual(grid[3].sum(), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
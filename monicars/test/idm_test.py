@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+import unittest
+import numpy as np
+from monicars import Environment
+from npc import NPCManager
+from agent import Agent
+from idm import find_leaders, get_accelerations
+from variables import traffic
+
+
+class IDMTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lane_map = Environment("two_lanes", render=False).lane_map
+
+    def test_find_leaders(self):
+        lanes = np.array([0, 1, 0, 0, -1, -1, 1])
+        s = np.array([50, 10, 300, 100, 0, 5, 20])
+
+        self.assertEqual(list(find_leaders(lanes, s)), [3, 6, -1, 2, -1, -1, -1])
+
+    def test_free_road(self):
+        # One car in each lane, at rest and at the desired speed.
+        acc = get_accelerations(self.lane_map, [(200, 100, 0, 0), (300, 100, 0, traffic.SPEED)], [50, 50])
+
+        self.assertAlmostEqual(acc[0], traffic.IDM_ACC)
+        self.assertAlmostEqual(acc[1], 0)
+        self.assertLess(get_accelerations(self.lane_map, [(300, 800, 0, 2 * traffic.SPEED)], [50])[0], 0)
+
+    def test_brakes_behind_slower_car(self):
+        # The second car catches up with the first, in the same lane.
+        states = [(200, 400, 0, 0), (200, 300, 0, traffic.SPEED), (300, 300, 0, traffic.SPEED)]
+
+        acc = get_accelerations(self.lane_map, states, [50, 50, 50])
+
+        self.assertAlmostEqual(acc[0], traffic.IDM_ACC)
+        self.assertLess(acc[1], 0)
+        self.assertAlmostEqual(acc[2], 0)
+
+    def test_stops_behind_agent(self):
+        manager = NPCManager([], (500, 1500), lane_map=self.lane_map)
+        manager.IDM = True
+        manager.npcs = [Agent(200, 100, 0, traffic.SPEED)]
+        agent = Agent(200, 600, 0, 0)
+
+        for _ in range(300):
+            manager.move(others=[agent])
+
+        npc = manager.npcs[0]
+        gap = agent.get_y() - npc.get_y() - (agent.height + npc.height) / 2.0
+        self.assertAlmostEqual(npc.get_speed(), 0, places=2)
+        self.assertGreater(gap, 0)
+        self.assertLess(gap, traffic.MIN_GAP + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
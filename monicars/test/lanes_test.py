@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+import unittest
+import numpy as np
+from monicars import Environment, Lane
+from markers import Markers
+from util import WHITE
+from zones import ZoneTracker, LANE_CHANGE, INTERSECTION_ENTRY, INTERSECTION_EXIT
+
+
+def full_search(env, point):
+    """Returns the zone of a point as the environment found it before the zone
+    tracker: the first lane, then the first intersection, which contains it,
+    and else the colour of the pixel under it."""
+    for lane in env.lanes:
+        if lane.is_inside(point):
+            return ("lane", lane.id)
+
+    for intersection in env.intersections:
+        if intersection.is_inside(point):
+            return ("intersection", intersection.id)
+
+    env.agent.set_state(point[0], point[1], 0, 0)
+    return ("on_road", 0) if env._check_pixels() in ["grey", "white"] else ("off_road", 0)
+
+
+def edge_points(zones, width, height):
+    """Returns integer points on the edges and the corners of zones, and next
+    to them on either side, which are in the map."""
+    points = []
+    for zone in zones:
+        xs = [int(pt[0]) for pt in zone.points]
+        ys = [int(pt[1]) for pt in zone.points]
+        x0, x1, y0, y1 = min(xs), max(xs), min(ys), max(ys)
+        mid_x, mid_y = (x0 + x1) // 2, (y0 + y1) // 2
+        for dx in [-1, 0, 1]:
+            points += [(x0 + dx, mid_y), (x1 + dx, mid_y), (mid_x, y0 + dx), (mid_x, y1 + dx),
+                       (x0 + dx, y0), (x1 + dx, y1)]
+
+    return [(x, y) for x, y in points if 0 <= x < width and 0 <= y < height]
+
+
+class LaneMapTest(unittest.TestCase):
+
+    def test_vertical(self):
+        env = Environment("two_lanes", render=False)
+        lanes, coords = env.lane_map.frenet([(300, 900, 3.0), (320, 100, 0), (210, 50, 0.1), (50, 50, 0)])
+
+        self.assertEqual(list(lanes), [1, 1, 0, -1])
+        # The lanes go down from the top of the map. Right of down is -x.
+        self.assertTrue(np.allclose(coords[0], (900, 0, 3.0)))
+        self.assertTrue(np.allclose(coords[1], (100, -20, 0)))
+        self.assertTrue(np.allclose(coords[2], (50, -10, 0.1)))
+        self.assertTrue(np.isnan(coords[3]).all())
+
+    def test_horizontal(self):
+        env = Environment("intersection", render=False)
+        lanes, coords = env.lane_map.frenet([(100, 500, np.pi / 2), (700, 500, np.pi / 2)])
+
+        # The start in the left lane goes right, the lane on the right of the
+        # intersection has no start and goes right too.
+        self.assertEqual(list(lanes), [2, 4])
+        self.assertTrue(np.allclose(coords[0], (100, 20, 0)))
+        self.assertTrue(np.allclose(coords[1], (100, 20, 0)))
+
+    def test_matches_zones(self):
+        env = Environment("intersection", render=False)
+        points = np.random.RandomState(0).uniform(0, 1000, (200, 2))
+
+        lanes = env.lane_map.get_lanes(points)
+
+        for point, lane in zip(points, lanes):
+            expected = [zone.id for zone in env.lanes if zone.is_inside(point)]
+            self.assertEqual(lane, expected[0] if expected else -1)
+
+    def test_agent_lane(self):
+        for env_name in ["intersection", "two_lanes"]:
+            env = Environment(env_name, render=False)
+            points = list(np.random.RandomState(1).uniform(0, 1000, (50, 2)))
+            points += edge_points(env.lanes, env.width, env.height)
+
+            for point in points:
+                env.agent.place(point[0], point[1], 0, 0)
+                expected = [zone.id for zone in env.lanes if zone.is_inside(point)]
+                self.assertEqual(env._get_lane(), expected[0] if expected else None)
+
+                # The lane agrees with the zone, also on the edges of the lanes.
+                zone = env.get_zone()
+                self.assertEqual(env._get_lane(), zone[1] if zone[0] == "lane" else None)
+
+
+class MarkersTest(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        env = Environment("track", render=False)
+        markers = env.lane_markers
+        points = np.random.RandomState(0).uniform(0, 1400, (500, 2))
+
+        distances, _, _ = markers.nearest(points)
+
+        expected = [markers._distances(point[np.newaxis], np.arange(len(markers.ids))[np.newaxis]).min()
+                    for point in points]
+        self.assertTrue(np.allclose(distances, expected))
+
+    def test_arc(self):
+        markers = Markers([{"shape": "arc", "centre": [100, 100], "radius": 50, "angles": [0, np.pi / 2]},
+                           {"shape": "straight", "points": [[0, 300], [200, 300]]}])
+
+        distances, angles, ids = markers.nearest([(100 + 30 / np.sqrt(2), 100 + 30 / np.sqrt(2)), (100, 290)])
+
+        self.assertTrue(np.allclose(distances, (20, 10), atol=0.1))
+        self.assertTrue(np.allclose(angles, (-np.pi / 4, -np.pi / 2), atol=0.1))
+        self.assertEqual(list(ids), [0, 1])
+
+    def test_painted_markings(self):
+        # Every white pixel of the roundabout is on one of its markers. Its
+        # ring has no markings, so it has no arc marker.
+        env = Environment("round_a_bout", render=False)
+        ys, xs = np.nonzero(env.view.get_raster() == WHITE)
+
+        distances, _, _ = env.lane_markers.nearest(np.stack([xs + 0.5, ys + 0.5], axis=1))
+
+        self.assertTrue(len(xs) > 0)
+        self.assertTrue((distances < 10).all())
+
+    def test_closest_marker(self):
+        env = Environment("two_lanes", render=False)
+        env.agent.set_state(280, 900, 0.1, 0)
+
+        dist, angle = env._get_closest_marker()
+
+        self.assertAlmostEqual(dist, 30)
+        self.assertAlmostEqual(angle, -0.1)
+
+
+class RoadDistanceTest(unittest.TestCase):
+
+    def test_straight_road(self):
+        env = Environment("two_lanes", render=False, road_distance=True)
+
+        # The road starts at x = 150.
+        distances = env.distance_to_road_edge([(200.5, 500), (150.5, 500), (149.5, 500), (100.5, 500)])
+
+        self.assertTrue(np.allclose(distances, (50.5, 0.5, -0.5, -49.5)))
+        self.assertAlmostEqual(env.reset()[-1], env.distance_to_road_edge()[0])
+
+
+class ZoneTrackerTest(unittest.TestCase):
+
+    def test_matches_full_search(self):
+        for env_name in ["intersection", "two_lanes"]:
+            env = Environment(env_name, render=False)
+            tracker = ZoneTracker(env.lanes, env.intersections, env.view.get_road())
+            points = list(np.cumsum(np.random.RandomState(0).normal(0, 20, (500, 2)), axis=0) % 1000)
+            points += edge_points(env.lanes + env.intersections, env.width, env.height)
+
+            for point in points:
+                self.assertEqual(tracker.get_zone("car", point), full_search(env, point))
+
+            self.assertTrue(tracker.hits > 0)
+
+    def test_events(self):
+        env = Environment("intersection", render=False)
+        env.reset()
+        env.get_zone_events()
+
+        # Drive down through the intersection, then change lanes.
+        for y in range(255, 700, 10):
+            env.agent.set_state(550, y, 0, 0)
+            env.get_zone()
+        env.agent.set_state(450, 700, 0, 0)
+        env.get_zone()
+
+        kinds = [event[3] for event in env.get_zone_events()]
+        self.assertEqual(kinds, [INTERSECTION_ENTRY, INTERSECTION_EXIT, LANE_CHANGE])
+        self.assertEqual(env.get_zone_events(), [])
+
+    def test_first_zone_wins(self):
+        # Lane 2 overlaps both others, and lane 0 isn't next to lane 1.
+        lanes = [Lane((200, 0), (100, 100), 0), Lane((0, 0), (100, 100), 1), Lane((90, 0), (160, 100), 2)]
+        tracker = ZoneTracker(lanes, [], np.zeros((100, 300), dtype=bool))
+
+        self.assertEqual(tracker.get_zone("car", (50, 50)), ("lane", 1))
+        self.assertEqual(tracker.get_zone("car", (220, 50)), ("lane", 0))
+        self.assertEqual(tracker.locate(220, 50), 0)
+
+
+class LaneGraphTest(unittest.TestCase):
+
+    def test_intersection(self):
+        env = Environment("intersection", render=False, goal=("lane", 5))
+        env.agent.set_state(550, 250, 0, 0)
+
+        self.assertEqual(env.get_route(), [("lane", 1), ("intersection", 0), ("lane", 5)])
+        # Traffic flows down and right, so the lanes on the left can't be reached.
+        self.assertIsNone(env.get_route(("lane", 2)))
+
+        zone, waypoint, distance = env.get_route_progress()
+        self.assertEqual(zone, ("intersection", 0))
+        self.assertEqual(waypoint, (500, 530))
+        self.assertAlmostEqual(distance, np.hypot(50, 280) + np.hypot(100, 50))
+
+        env.agent.set_state(700, 580, np.pi / 2, 0)
+        self.assertEqual(env.get_route_progress(), (None, None, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
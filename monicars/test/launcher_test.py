@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+import os
+import unittest
+from monicars import Environment
+from agent import Agent, load_sprite
+from launcher import WorkerLauncher, get_memory
+import map_assets
+import view
+
+
+def _step(i, fd):
+    env = Environment("two_lanes", render=False)
+    obs, _, _ = env.step([0, 0])
+    # The worker uses the images and arrays the parent loaded.
+    shared = env.view.env_img is view._images["two_lanes"][0] and \
+        env.view.get_raster() is map_assets._assets[("two_lanes", "raster")]
+    os.write(fd, b"%d" % (i + 2 * shared))
+
+
+def _fail(i):
+    raise ValueError("Worker %d failed." % i)
+
+
+class WorkerLauncherTest(unittest.TestCase):
+
+    def test_workers_share_assets(self):
+        launcher = WorkerLauncher(["two_lanes"])
+        read, write = os.pipe()
+
+        launcher.launch(_step, 2, write)
+        statuses = launcher.join()
+        os.close(write)
+        results = os.read(read, 16)
+        os.close(read)
+
+        self.assertEqual(statuses, [0, 0])
+        self.assertEqual(sorted(results), [b"2", b"3"])
+
+    def test_failing_worker(self):
+        launcher = WorkerLauncher([])
+
+        # Hide the traceback the worker prints.
+        with open(os.devnull, "w") as devnull:
+            stderr = os.dup(2)
+            os.dup2(devnull.fileno(), 2)
+            try:
+                launcher.launch(_fail, 1)
+                statuses = launcher.join()
+            finally:
+                os.dup2(stderr, 2)
+                os.close(stderr)
+
+        self.assertEqual(statuses, [1])
+
+    def test_shared_sprites(self):
+        self.assertIs(Agent(0, 0, 0, 0).img, load_sprite("red_car"))
+
+    def test_memory(self):
+        memory = get_memory()
+        if memory is not None:
+            rss, pss = memory
+            self.assertGreater(rss, 0)
+            self.assertLessEqual(pss, rss)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+import unittest
+import numpy as np
+from monicars import Environment
+
+
+class LazyObservationTest(unittest.TestCase):
+
+    def test_matches_eager(self):
+        actions = np.random.RandomState(0).uniform(-1, 1, (10, 2))
+        for kwargs in [{}, {"vision": True}, {"lidar": True}]:
+            env = Environment("two_lanes", render=False, **kwargs)
+            lazy = Environment("two_lanes", render=False, lazy_obs=True, **kwargs)
+            env.reset()
+            lazy.reset()
+
+            for action in actions:
+                expected, reward, done = env.step(action)
+                obs, lazy_reward, lazy_done = lazy.step(action)
+                self.assertFalse(obs.built)
+                self.assertTrue(np.array_equal(np.asarray(obs), np.asarray(expected)))
+                self.assertTrue(obs.built)
+                self.assertEqual((lazy_reward, lazy_done), (reward, done))
+
+    def test_skips_rendering(self):
+        env = Environment("two_lanes", render=False, vision=True, lazy_obs=True)
+        env.reset()
+        updates = []
+        update = env.view.update
+        env.view.update = lambda *args: updates.append(args) or update(*args)
+
+        for _ in range(5):
+            obs, _, _ = env.step([0, 0])
+        self.assertEqual(len(updates), 0)
+
+        self.assertEqual(obs[0].shape, (env.view.screen_height, 3))
+        self.assertEqual(len(updates), 1)
+
+    def test_reward_reads_observation(self):
+        env = Environment("two_lanes", render=False, lazy_obs=True, reward_function=lambda obs: obs[3])
+        env.reset()
+
+        obs, reward, _ = env.step([1, 0])
+
+        self.assertTrue(obs.built)
+        self.assertEqual(reward, env.agent.get_speed())
+
+    def test_stale(self):
+        env = Environment("two_lanes", render=False, lazy_obs=True)
+        env.reset()
+        obs, _, _ = env.step([0, 0])
+        env.step([0, 0])
+
+        with self.assertRaises(ValueError):
+            obs.get()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+import unittest
+import numpy as np
+from lidar import Lidar
+from util import GREY, WHITE
+
+
+def brute_force(raster, lidar, agent_state):
+    """Returns the ranges of Lidar.scan without NPCs, testing the samples of
+    every ray one at a time."""
+    x, y, theta = agent_state[0:3]
+    ranges = []
+    for angle in theta + lidar.angles:
+        distance = lidar.max_range
+        for sample in lidar.samples:
+            px = int(np.floor(x + sample * np.sin(angle)))
+            py = int(np.floor(y + sample * np.cos(angle)))
+            if not (0 <= px < raster.shape[1] and 0 <= py < raster.shape[0]) or raster[py, px] not in (GREY, WHITE):
+                distance = sample
+                break
+        ranges.append(distance)
+
+    return np.array(ranges)
+
+
+class LidarTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.raster = rng.choice([0, GREY, WHITE], (120, 150), p=[0.02, 0.88, 0.1])
+        self.lidar = Lidar((self.raster == GREY) | (self.raster == WHITE), n_rays=16, fov=2 * np.pi, max_range=40, step=2)
+
+    def test_matches_brute_force(self):
+        rng = np.random.RandomState(1)
+        for _ in range(10):
+            state = (rng.uniform(0, 150), rng.uniform(0, 120), rng.uniform(-np.pi, np.pi), 0)
+            self.assertTrue(np.allclose(self.lidar.scan(state, []), brute_force(self.raster, self.lidar, state)))
+
+    def test_off_map(self):
+        # Near the map, far from it, and past the right edge by more than the
+        # padding, where the rows of the padded map would wrap onto the road.
+        for state in [(-10, 60, np.pi / 2, 0), (160, 125, 1, 0), (-5000, -5000, 0, 0), (1e9, 60, 0, 0),
+                      (150 + 3 * 40, 60, np.pi / 2, 0), (75, 120 + 3 * 40, np.pi, 0)]:
+            self.assertTrue(np.allclose(self.lidar.scan(state, []), brute_force(self.raster, self.lidar, state)))
+
+    def test_scan_states(self):
+        rng = np.random.RandomState(2)
+        states = np.stack((rng.uniform(-20, 170, 300), rng.uniform(-20, 140, 300),
+                           rng.uniform(-np.pi, np.pi, 300), np.zeros(300)), axis=-1)
+        boxes = np.concatenate((states[:, np.newaxis, 0:2] + rng.normal(0, 15, (300, 3, 2)),
+                                rng.uniform(-np.pi, np.pi, (300, 3, 1)), np.tile((12, 6), (300, 3, 1))), axis=-1)
+        present = rng.uniform(0, 1, (300, 3)) < 0.7
+
+        ranges = self.lidar.scan_states(states, boxes, present)
+
+        self.assertEqual(ranges.shape, (300, 16))
+        for i in range(300):
+            self.assertTrue(np.allclose(ranges[i], self.lidar.scan(states[i], boxes[i][present[i]])))
+        self.assertTrue(np.allclose(self.lidar.scan_states(states[0:2]), [self.lidar.scan(state, []) for state in states[0:2]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+import os
+import unittest
+import numpy as np
+import map_assets
+from variables import global_var
+
+
+class MapAssetsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = os.path.join(global_var.PATH, "maps", "cache")
+        self.builds = []
+
+    def tearDown(self):
+        for name in os.listdir(self.cache):
+            if name.startswith("two_lanes.test_asset."):
+                os.remove(os.path.join(self.cache, name))
+        for key in list(map_assets._assets):
+            if key[1] == "test_asset":
+                del map_assets._assets[key]
+
+    def _build(self):
+        self.builds.append(1)
+        return np.arange(10) * len(self.builds)
+
+    def _get(self, version=1):
+        map_assets._assets.pop(("two_lanes", "test_asset"), None)  # Read from the disk cache.
+        return map_assets.get_asset("two_lanes", "test_asset", self._build, mmap_mode="r", version=version)
+
+    def test_cached_on_disk(self):
+        first = self._get()
+        self.assertTrue(np.array_equal(self._get(), first))
+        self.assertEqual(len(self.builds), 1)
+
+        # A new version is built again.
+        self.assertTrue(np.array_equal(self._get(version=2), 2 * np.arange(10)))
+        self.assertEqual(len(self.builds), 2)
+
+        # No temporary files are left behind.
+        names = [name for name in os.listdir(self.cache) if name.startswith("two_lanes.test_asset.")]
+        self.assertEqual(sorted(names), ["two_lanes.test_asset.v1.npy", "two_lanes.test_asset.v2.npy"])
+
+    def test_replaced_while_mapped(self):
+        mapped = self._get()
+        path = os.path.join(self.cache, "two_lanes.test_asset.v1.npy")
+
+        # The map changes, so the asset is built again and replaces the file.
+        os.utime(path, (0, 0))
+        self.assertTrue(np.array_equal(self._get(), 2 * np.arange(10)))
+
+        # The previous file is still mapped, unchanged.
+        self.assertTrue(np.array_equal(mapped, np.arange(10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from monicars import Environment
+from metrics import ColumnWriter, EpisodeMetrics, read_columns
+
+
+class EpisodeMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_matches_trajectory(self):
+        env = Environment("two_lanes", render=False, obstacle=True, metrics=True)
+        env.reset()
+        rng = np.random.RandomState(0)
+
+        positions = [env.agent.get_pos()]
+        speeds, zones, collisions, gaps = [], [], [], []
+        for _ in range(50):
+            env.step(rng.uniform(-1, 1, 2))
+            positions.append(env.agent.get_pos())
+            speeds.append(abs(env.agent.get_speed()))
+            zones.append(env.get_zone()[0])
+            collisions.append(env.collided())
+            obstacle_car = env.npc_manager.obstacle_car
+            gaps.append(np.hypot(obstacle_car.get_x() - env.agent.get_x(), obstacle_car.get_y() - env.agent.get_y()) -
+                        (obstacle_car.height + env.agent.height) / 2.0)
+
+        metrics = env.get_metrics()
+
+        self.assertEqual(metrics["steps"], 50)
+        self.assertEqual(metrics["collisions"], sum(collisions))
+        self.assertEqual(metrics["off_road_steps"], zones.count("off_road"))
+        self.assertAlmostEqual(metrics["lane_time"], zones.count("lane") * env.dt)
+        self.assertAlmostEqual(metrics["distance"], np.hypot(*np.diff(positions, axis=0).T).sum())
+        self.assertAlmostEqual(metrics["mean_speed"], np.mean(speeds))
+        self.assertAlmostEqual(metrics["min_obstacle_gap"], min(gaps))
+
+    def test_writes_episodes(self):
+        path = os.path.join(self.path, "metrics")
+        env = Environment("two_lanes", render=False, metrics=path)
+
+        steps = [5, 3, 8]
+        for n in steps:
+            env.reset()
+            for _ in range(n):
+                env.step([1, 0])
+        env.quit()
+
+        columns = read_columns(path)
+        self.assertEqual(list(columns["episode"]), [0, 1, 2])
+        self.assertEqual(list(columns["steps"]), steps)
+        self.assertTrue(np.isnan(columns["min_obstacle_gap"]).all())
+        self.assertEqual(columns["distance"].dtype, np.float64)
+
+        # A new environment appends to the same columns.
+        env = Environment("two_lanes", render=False, metrics=path)
+        env.reset()
+        env.step([1, 0])
+        env.reset()
+        columns = read_columns(path, ["episode", "steps"])
+        self.assertEqual(list(columns["episode"]), [0, 1, 2, 3])
+        self.assertEqual(list(columns["steps"]), steps + [1])
+
+    def test_partial_record(self):
+        writer = ColumnWriter(self.path)
+        record = EpisodeMetrics(0.1).get()
+        writer.append(record)
+        writer.append(record)
+
+        # The second record was cut short after its first column.
+        with open(os.path.join(self.path, "steps.bin"), "rb+") as f:
+            f.truncate(4)
+
+        self.assertEqual(len(read_columns(self.path)["episode"]), 1)
+        self.assertEqual(writer.count(), 1)
+
+    def test_append_after_partial_record(self):
+        writer = ColumnWriter(self.path)
+        for i in range(3):
+            record = EpisodeMetrics(0.1).get()
+            record.update(episode=i, steps=10 + i)
+            writer.append(record)
+
+        # The third record was cut short after its first column.
+        for name, dtype in writer.columns[1:]:
+            with open(os.path.join(self.path, name + ".bin"), "rb+") as f:
+                f.truncate(2 * dtype.itemsize)
+
+        writer = ColumnWriter(self.path)
+        self.assertEqual(writer.count(), 2)
+        record.update(episode=7, steps=99)
+        writer.append(record)
+
+        columns = read_columns(self.path)
+        self.assertEqual(list(columns["episode"]), [0, 1, 7])
+        self.assertEqual(list(columns["steps"]), [10, 11, 99])
+        self.assertEqual(set(len(column) for column in columns.values()), set([3]))
+
+    def test_schema_mismatch(self):
+        ColumnWriter(self.path)
+
+        with self.assertRaises(ValueError):
+            ColumnWriter(self.path, [("steps", "<f8")])
+
+
+if __name__ == '__main__':
+    unittest.main()
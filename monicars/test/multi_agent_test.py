@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+import unittest
+import numpy as np
+from multi_agent import MultiAgentEnvironment
+from npc import NPCManager
+from agent import Agent
+from rollout import rollout
+from zones import LANE_CHANGE
+
+
+class MultiAgentTest(unittest.TestCase):
+
+    def test_matches_rollout(self):
+        starts = [(200, 900, np.pi), (300, 900, np.pi), (200, 1200, np.pi)]
+        env = MultiAgentEnvironment("two_lanes", render=False, agent_starts=starts)
+        env.reset()
+        actions = np.random.RandomState(0).uniform(-1, 1, (3, 10, 2))
+
+        expected = [rollout(state, seq[np.newaxis])[0][0] for state, seq in zip(env.get_states(), actions)]
+
+        for t in range(10):
+            _, _, dones = env.step(actions[:, t])
+            self.assertFalse(dones.any())
+            for i in range(3):
+                self.assertTrue(np.allclose(env.get_states()[i], expected[i][t]))
+
+    def test_collision_between_agents(self):
+        # Two cars driving towards each other, and one far from both.
+        starts = [(200, 700, np.pi), (200, 500, 0), (300, 1200, np.pi)]
+        env = MultiAgentEnvironment("two_lanes", render=False, agent_starts=starts)
+        env.reset()
+
+        dones = np.zeros(3, dtype=bool)
+        while not dones[0]:
+            _, _, dones = env.step(np.zeros((3, 2)))
+
+        self.assertTrue(dones[1])
+        self.assertFalse(dones[2])
+
+        # Cars which are done stop.
+        states = env.get_states()
+        env.step(np.zeros((3, 2)))
+        self.assertTrue(np.allclose(env.get_states()[0:2], states[0:2]))
+        self.assertFalse(np.allclose(env.get_states()[2], states[2]))
+
+    def test_unsupported_options(self):
+        for option in ["vision", "lazy_obs", "metrics", "hash_states", "reset_pool"]:
+            with self.assertRaises(ValueError):
+                MultiAgentEnvironment("two_lanes", render=False, **{option: 10})
+
+    def test_zone_events(self):
+        starts = [(200, 900, np.pi), (300, 1200, np.pi)]
+        env = MultiAgentEnvironment("two_lanes", render=False, agent_starts=starts)
+        env.reset()
+        env.step(np.zeros((2, 2)))
+
+        # The second car moves to the other lane.
+        env.agents[1].place(200, 1200, np.pi, 0)
+        env.step(np.zeros((2, 2)))
+
+        events = env.get_zone_events()
+        self.assertEqual([(car, kind) for car, _, _, kind in events], [(env.agents[1], LANE_CHANGE)])
+
+        # A reset doesn't record the move back to the start as a transition.
+        env.reset()
+        self.assertEqual(env.get_zone_events(), [])
+
+
+class NPCManagerTest(unittest.TestCase):
+
+    def test_all_npcs_move(self):
+        manager = NPCManager([], (500, 1500))
+        manager.npcs = [Agent(100 * i, 100, 0, 10) for i in range(4)]
+
+        manager.move()
+
+        for i, npc in enumerate(manager.npcs):
+            self.assertTrue(np.allclose(npc.get_state(), (100 * i, 110, 0, 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+import unittest
+import pacing
+from pacing import Pacer
+
+
+class FakeClock(object):
+    """A clock which only moves when it is advanced or slept on."""
+
+    def __init__(self, oversleep=0.0):
+        self.now = 0.0
+        self.oversleep = oversleep
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep_until(self, deadline):
+        self.sleeps.append(deadline)
+        self.now = max(self.now, deadline + self.oversleep)
+
+
+class PacerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.timer = pacing.default_timer
+        self.sleep_until = pacing._sleep_until
+        pacing.default_timer = self.clock
+        pacing._sleep_until = self.clock.sleep_until
+
+    def tearDown(self):
+        pacing.default_timer = self.timer
+        pacing._sleep_until = self.sleep_until
+
+    def test_deadlines(self):
+        pacer = Pacer(10)
+        pacer.wait()
+
+        for _ in range(3):
+            self.clock.now += 0.03  # The work of the frame.
+            pacer.wait()
+
+        self.assertEqual(len(self.clock.sleeps), 3)
+        for i, deadline in enumerate(self.clock.sleeps):
+            self.assertAlmostEqual(deadline, 0.1 * (i + 1))
+        self.assertEqual(pacer.missed, 0)
+
+    def test_oversleep_is_made_up(self):
+        self.clock.oversleep = 0.02
+        pacer = Pacer(10)
+        pacer.wait()
+        pacer.wait()
+        self.assertAlmostEqual(self.clock.now, 0.12)
+
+        # The next deadline doesn't move with the late wake-up.
+        self.clock.oversleep = 0.0
+        pacer.wait()
+        self.assertAlmostEqual(self.clock.now, 0.2)
+
+    def test_catch_up(self):
+        pacer = Pacer(10, max_lag=0.1)
+        pacer.wait()
+
+        # One slow frame, within max_lag, is caught up with the next frames
+        # running back to back.
+        self.clock.now += 0.18
+        pacer.wait()
+        self.clock.now += 0.03
+        pacer.wait()
+
+        self.assertEqual(pacer.missed, 2)
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertAlmostEqual(pacer.deadline, 0.3)
+
+        pacer.wait()
+        self.assertEqual(len(self.clock.sleeps), 1)
+        self.assertAlmostEqual(self.clock.now, 0.3)
+
+    def test_max_lag(self):
+        pacer = Pacer(10, max_lag=0.1)
+        pacer.wait()
+
+        # Too far behind, the schedule restarts from now.
+        self.clock.now += 0.5
+        pacer.wait()
+        self.assertEqual(pacer.missed, 1)
+        self.assertAlmostEqual(pacer.deadline, 0.6)
+
+        pacer.wait()
+        self.assertEqual(pacer.missed, 1)
+        self.assertAlmostEqual(self.clock.now, 0.6)
+
+    def test_stats(self):
+        pacer = Pacer(10)
+        self.assertEqual(pacer.get_stats(), {"frames": 0, "missed": 0, "fps": 0.0})
+
+        pacer.wait()
+        for work in [0.05, 0.25, 0.05, 0.05]:
+            self.clock.now += work
+            pacer.wait()
+
+        stats = pacer.get_stats()
+        self.assertEqual(stats["frames"], 4)
+        self.assertEqual(stats["missed"], 1)
+        self.assertAlmostEqual(stats["fps"], 4 / self.clock.now)
+
+        pacer.reset()
+        self.assertEqual(pacer.get_stats(), {"frames": 0, "missed": 0, "fps": 0.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+import unittest
+import numpy as np
+from monicars import Environment
+
+
+class StateQueryTest(unittest.TestCase):
+
+    def test_matches_environment(self):
+        env = Environment("intersection", render=False, obstacle=True, lidar=True, road_distance=True)
+        env.reset()
+        rng = np.random.RandomState(0)
+
+        # Agents all over the map, some of them near the obstacle, at any
+        # angle to it.
+        n = 200
+        agents = np.stack((rng.uniform(0, 1000, n), rng.uniform(0, 1000, n),
+                           rng.uniform(-np.pi, np.pi, n), rng.uniform(0, 10, n)), axis=-1)
+        npcs = agents[:, np.newaxis] + rng.normal(0, 30, (n, 1, 4)) * (1, 1, 0, 1)
+        npcs[:, 0, 2] = rng.uniform(-np.pi, np.pi, n)
+        npcs[::4] = 0  # No obstacle.
+        size = (env.npc_manager.npcs[0].height, env.npc_manager.npcs[0].width)
+
+        zones, on_road, collisions, observations = env.query_states(agents, npcs, size)
+
+        self.assertTrue(collisions.any() and not collisions.all())
+        self.assertTrue(on_road.any() and not on_road.all())
+        for i in range(n):
+            env.agent.place(*agents[i])
+            env.npc_manager.npcs = [env.npc_manager.obstacle_car] if npcs[i].any() else []
+            env.npc_manager.obstacle_car.place(*npcs[i, 0])
+            env.zone_tracker.reset()
+
+            zone = env.get_zone()
+            if zones[i] >= 0:
+                self.assertEqual(zone, env.zone_tracker.zones[zones[i]])
+            else:
+                self.assertEqual(zone[0], "on_road" if on_road[i] else "off_road")
+            self.assertEqual(on_road[i], env.on_road())
+            self.assertEqual(collisions[i], env.collided())
+            self.assertTrue(np.allclose(observations[i], env._get_observation()))
+
+    def test_overlaps(self):
+        env = Environment("two_lanes", render=False, obstacle=True)
+        env.reset()
+
+        # The cars cross at right angles, with no corner of either inside the
+        # other, and then further apart.
+        agents = [[200, 500, 0, 0], [200, 500, 0, 0]]
+        npcs = [[[200, 500, np.pi / 2, 0]], [[200, 600, np.pi / 2, 0]]]
+        collisions = env.query_states(agents, npcs)[2]
+
+        env.agent.place(*agents[0])
+        env.npc_manager.obstacle_car.place(*npcs[0][0])
+        self.assertFalse(env.collided())
+        self.assertEqual(list(collisions), [False, False])
+        self.assertEqual(list(env.state_query.get_overlaps(agents, npcs)), [True, False])
+
+    def test_off_map(self):
+        env = Environment("two_lanes", render=False, lidar=True)
+        env.reset()
+
+        zones, on_road, _, observations = env.query_states([[-5000, -5000, 0, 0], [1e6, 100, 0, 0]])
+
+        self.assertFalse(on_road.any())
+        self.assertTrue(np.isfinite(observations).all())
+
+    def test_leaves_environment(self):
+        env = Environment("two_lanes", render=False)
+        obs = env.reset()
+
+        env.query_states(np.zeros((3, 4)))
+
+        self.assertEqual(env._get_observation(), obs)
+
+    def test_too_many_npcs(self):
+        env = Environment("two_lanes", render=False)
+
+        with self.assertRaises(ValueError):
+            env.query_states(np.zeros((3, 4)), np.ones((3, 2, 4)))
+
+
+if __name__ == '__main__':
+    unittest.main()
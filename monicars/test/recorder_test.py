@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import pygame
+import numpy as np
+from monicars import Environment
+from recorder import FrameRecorder
+
+
+def make_surface(i):
+    """Returns a small surface filled with a colour unique to i."""
+    surface = pygame.Surface((8, 6))
+    surface.fill((i, 2 * i, 3 * i))
+    return surface
+
+
+class FrameRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def stall(self, recorder):
+        """Makes the writer of the recorder wait, once it has taken a frame,
+        until the returned event is set."""
+        started = threading.Event()
+        release = threading.Event()
+        write = recorder._write_png
+
+        def stalled_write(idx, frame):
+            started.set()
+            release.wait()
+            write(idx, frame)
+
+        recorder._write_png = stalled_write
+        return started, release
+
+    def test_png(self):
+        path = os.path.join(self.path, "frames")
+        recorder = FrameRecorder(path, stride=2)
+        for i in range(5):
+            recorder.record(make_surface(i))
+        recorder.close()
+
+        self.assertEqual(sorted(os.listdir(path)), ["frame_000000.png", "frame_000002.png", "frame_000004.png"])
+        self.assertEqual((recorder.frame_count, recorder.queued, recorder.written), (5, 3, 3))
+        img = pygame.image.load(os.path.join(path, "frame_000004.png"))
+        self.assertEqual(img.get_size(), (8, 6))
+        self.assertEqual(tuple(img.get_at((3, 2)))[:3], (4, 8, 12))
+
+    def test_memmap(self):
+        path = os.path.join(self.path, "frames.npy")
+        recorder = FrameRecorder(path, fmt="memmap", max_frames=3)
+        for i in range(4):
+            recorder.record(make_surface(i))
+        recorder.close()
+
+        video = np.load(path, mmap_mode="r")
+        self.assertEqual(video.shape, (3, 6, 8, 3))
+        for i in range(3):
+            self.assertTrue((video[i] == (i, 2 * i, 3 * i)).all())
+        self.assertEqual((recorder.written, recorder.dropped), (3, 1))
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            FrameRecorder(self.path, fmt="gif")
+
+    def test_full_queue_drops(self):
+        recorder = FrameRecorder(self.path, queue_size=2)
+        started, release = self.stall(recorder)
+
+        recorder.record(make_surface(0))
+        started.wait()
+        for i in range(1, 5):
+            recorder.record(make_surface(i))
+        self.assertEqual((recorder.queued, recorder.dropped), (3, 2))
+
+        release.set()
+        recorder.close()
+        self.assertEqual(recorder.written, 3)
+        self.assertEqual(len(os.listdir(self.path)), 3)
+
+    def test_block(self):
+        recorder = FrameRecorder(self.path, queue_size=1, block=True)
+        started, release = self.stall(recorder)
+
+        recorder.record(make_surface(0))
+        started.wait()
+        recorder.record(make_surface(1))
+
+        # The queue is full, so the next frame waits for the writer.
+        thread = threading.Thread(target=recorder.record, args=(make_surface(2),))
+        thread.start()
+        thread.join(0.1)
+        self.assertTrue(thread.is_alive())
+
+        release.set()
+        thread.join()
+        recorder.close()
+        self.assertEqual((recorder.written, recorder.dropped), (3, 0))
+
+    def test_render_thread(self):
+        recorder = FrameRecorder(self.path)
+        env = Environment("two_lanes", render=True, render_rate=100, recorder=recorder)
+        env.reset()
+        for _ in range(10):
+            env.step([1, 0])
+            time.sleep(0.02)
+        env.quit()
+
+        self.assertGreater(recorder.written, 0)
+        self.assertEqual(len(os.listdir(self.path)), recorder.written)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+import time
+import unittest
+import pygame
+import numpy as np
+from agent import Agent
+from render_thread import RenderThread
+from view import View
+
+
+def wait_for_frames(thread, frames, timeout=2.0):
+    """Waits until the thread has drawn a number of frames."""
+    end = time.time() + timeout
+    while thread.frames < frames and time.time() < end:
+        time.sleep(0.005)
+
+
+class RenderThreadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.display = pygame.display.set_mode((500, 500))
+        self.img = Agent().img
+        self.thread = RenderThread(View("intersection", 1000, 1500, 500, 500), self.display, 200)
+
+    def tearDown(self):
+        self.thread.stop()
+
+    def test_publish_swaps_snapshot(self):
+        characters = [(self.img, 450, 300, 0)]
+        self.thread.publish(450, 300, characters)
+        self.thread.publish(460, 310, characters)
+
+        # Only the latest snapshot is kept, copied from the list.
+        characters.append((self.img, 0, 0, 0))
+        self.assertEqual(self.thread._snapshot, (460, 310, ((self.img, 450, 300, 0),)))
+        self.assertTrue(self.thread._new)
+
+    def test_draws_published_state(self):
+        characters = [(self.img, 450, 700, 0.3), (self.img, 500, 650, 0)]
+        self.thread.start()
+        self.thread.publish(450, 700, characters)
+        wait_for_frames(self.thread, 1)
+        self.thread.stop()
+
+        expected = View("intersection", 1000, 1500, 500, 500).update(450, 700, characters)
+        self.assertEqual(self.thread.frames, 1)
+        self.assertTrue(np.array_equal(pygame.surfarray.array3d(self.display),
+                                       pygame.surfarray.array3d(expected)))
+
+    def test_skips_stale_snapshots(self):
+        self.thread.start()
+        self.thread.publish(450, 700, [(self.img, 450, 700, 0)])
+        wait_for_frames(self.thread, 1)
+
+        # Without a new snapshot, nothing is drawn.
+        time.sleep(0.05)
+        self.assertEqual(self.thread.frames, 1)
+
+        self.thread.publish(450, 720, [(self.img, 450, 720, 0)])
+        wait_for_frames(self.thread, 2)
+        self.assertEqual(self.thread.frames, 2)
+
+    def test_start_stop(self):
+        self.thread.start()
+        thread = self.thread._thread
+        self.thread.start()
+        self.assertIs(self.thread._thread, thread)
+
+        self.thread.stop()
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(self.thread._thread)
+        self.thread.stop()
+
+        # A stopped thread can be started again.
+        self.thread.start()
+        self.thread.publish(450, 700, [])
+        wait_for_frames(self.thread, 1)
+        self.assertEqual(self.thread.frames, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
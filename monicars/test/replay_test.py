@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+import unittest
+import numpy as np
+from monicars import Environment
+from replay import Replay
+
+
+def make_env(**kwargs):
+    """Returns an environment with random traffic, and the same obstacle sprite
+    each time, since it is chosen when the obstacle is created."""
+    env = Environment("intersection", render=False, obstacle=True, seed=0, **kwargs)
+    env.npc_manager.NEW = 0.5
+    env.npc_manager.MAX = 3
+
+    return env
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.env = make_env(hash_states=True)
+        self.actions = np.random.RandomState(0).uniform(-0.3, 0.3, (200, 2)) + (0.3, 0)
+
+        # The original episode.
+        self.env.reset(seed=7)
+        self.states = [self.env.agent.get_state()]
+        for action in self.actions:
+            self.env.step(action)
+            self.states.append(self.env.agent.get_state())
+        self.hashes = list(self.env.state_hashes)
+
+    def test_no_divergence(self):
+        self.assertEqual(len(self.hashes), len(self.actions) + 1)
+        self.assertGreater(len(set(self.hashes)), len(self.actions))
+
+        replay = Replay(self.env, 7, self.actions, self.hashes)
+
+        self.assertIsNone(replay.find_divergence())
+        self.assertEqual(self.env.state_hashes, self.hashes)
+
+    def test_seek(self):
+        env = make_env(vision=True)
+        replay = Replay(env, 7, self.actions, self.hashes)
+        views = []
+        update = env.view.update
+        env.view.update = lambda *args: views.append(args) or update(*args)
+
+        replay.seek(150)
+        self.assertEqual(len(views), 2)  # After the reset and the seek.
+        self.assertEqual(env.agent.get_state(), self.states[150])
+
+        obs, _, _ = replay.step()
+        self.assertEqual(np.shape(obs), (env.view.screen_width, env.view.screen_height, 3))
+        self.assertEqual(env.agent.get_state(), self.states[151])
+        self.assertEqual(len(views), 3)
+
+        # Seeking back starts again from the reset.
+        replay.seek(20)
+        self.assertEqual(env.agent.get_state(), self.states[20])
+        self.assertIsNone(replay.divergence)
+
+    def test_divergence(self):
+        actions = self.actions.copy()
+        actions[100] += (0, 0.01)
+        replay = Replay(self.env, 7, actions, self.hashes)
+
+        self.assertEqual(replay.find_divergence(), 101)
+
+    def test_other_seed(self):
+        replay = Replay(self.env, 8, self.actions, self.hashes)
+
+        self.assertIsNotNone(replay.find_divergence())
+
+    def test_independent_generators(self):
+        env = make_env(hash_states=True)
+        other = make_env()
+        env.reset(seed=7)
+        other.reset(seed=3)
+
+        # Neither stepping another environment nor numpy's global generator
+        # changes the episode.
+        for action in self.actions[0:50]:
+            env.step(action)
+            other.step(action)
+            np.random.random()
+
+        self.assertEqual(env.state_hashes, self.hashes[0:51])
+
+    def test_global_generator(self):
+        # Without a seed, numpy's global generator is used, so seeding it
+        # repeats the episode.
+        env = Environment("intersection", render=False, obstacle=True, hash_states=True)
+        env.npc_manager.NEW = 0.5
+        env.npc_manager.MAX = 3
+        runs = []
+        for _ in range(2):
+            np.random.seed(5)
+            env.reset()
+            for action in self.actions[0:50]:
+                env.step(action)
+            runs.append(list(env.state_hashes))
+
+        self.assertEqual(runs[0], runs[1])
+
+    def test_reset_pool(self):
+        env = Environment("two_lanes", render=False, reset_pool=10)
+
+        with self.assertRaises(ValueError):
+            Replay(env, 0, self.actions)
+
+
+if __name__ == '__main__':
+    unittest.main()
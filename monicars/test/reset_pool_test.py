@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+import unittest
+import numpy as np
+from monicars import Environment
+from reset_pool import ResetPool
+from variables import agent
+
+
+class ResetPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.noise = (agent.NOISE, agent.STD_X)
+        agent.NOISE = True
+        agent.STD_X = 100
+
+    def tearDown(self):
+        agent.NOISE, agent.STD_X = self.noise
+
+    def test_rejects_off_road(self):
+        road = np.zeros((500, 500), dtype=bool)
+        road[:, 200:300] = True
+
+        pool = ResetPool((250, 100, 0, 10), (50, 25), road=road, size=500)
+
+        self.assertTrue(0 < len(pool.agent_states) < 500)
+        self.assertTrue((pool.agent_states[:, 0] >= 200).all())
+        self.assertTrue((pool.agent_states[:, 0] < 300).all())
+
+    def test_reset(self):
+        env = Environment("two_lanes", render=False, obstacle=True, reset_pool=100)
+        obstacle = env.npc_manager.obstacle_car
+
+        for _ in range(200):
+            env.reset()
+            self.assertIs(env.npc_manager.npcs[0], obstacle)
+            self.assertTrue(env.on_road())
+            self.assertFalse(env.collided())
+
+
+if __name__ == '__main__':
+    unittest.main()
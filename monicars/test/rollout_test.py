@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+import unittest
+import numpy as np
+from monicars import Environment
+from rollout import rollout
+from util import boxes_overlap
+
+
+class RolloutTest(unittest.TestCase):
+
+    def test_matches_step(self):
+        env = Environment("two_lanes", render=False)
+        start = env.reset()[0:4]
+        actions = np.random.RandomState(0).uniform(-1, 1, (3, 40, 2))
+
+        trajectories, _, _ = rollout(start, actions, map_size=(env.width, env.height))
+
+        for seq, trajectory in zip(actions, trajectories):
+            env.reset()
+            for action, expected in zip(seq, trajectory):
+                env.step(list(action))
+                self.assertTrue(np.allclose(env.agent.get_state(), expected))
+
+    def test_substeps_match_step(self):
+        env = Environment("two_lanes", render=False, dt=2.0, substeps=4)
+        start = env.reset()[0:4]
+        actions = np.random.RandomState(1).uniform(-1, 1, (1, 20, 2))
+
+        trajectories, _, _ = rollout(start, actions, map_size=(env.width, env.height), dt=2.0, substeps=4)
+
+        for action, expected in zip(actions[0], trajectories[0]):
+            env.step(list(action))
+            self.assertTrue(np.allclose(env.agent.get_state(), expected))
+
+    def test_collision(self):
+        # An NPC stopped 100 pixels ahead of an agent driving at 10 pixels/step.
+        start = (100, 100, 0, 10)
+        npc = [(100, 200, 0, 0)]
+        actions = np.zeros((1, 10, 2))
+
+        _, collisions, _ = rollout(start, actions, npc, agent_size=(50, 25))
+
+        # The cars touch when the agent is 50 pixels behind the NPC.
+        self.assertFalse(collisions[0, 3])
+        self.assertTrue(collisions[0, 4])
+
+    def test_off_road(self):
+        road = np.zeros((500, 100), dtype=bool)
+        road[:, 40:60] = True
+        start = (50, 10, 0, 10)
+        actions = np.array([[[0, 0]] * 20, [[0, 1]] * 20])
+
+        _, _, off_road = rollout(start, actions, road=road)
+
+        # Driving straight stays on the road, turning leaves it.
+        self.assertFalse(off_road[0].any())
+        self.assertFalse(off_road[1, 0])
+        self.assertTrue(off_road[1, -1])
+
+
+class BoxesOverlapTest(unittest.TestCase):
+
+    def test_rotated(self):
+        box = (0, 0, 0, 50, 20)
+
+        self.assertTrue(boxes_overlap(box, (30, 0, np.pi / 2, 50, 20)))
+        self.assertFalse(boxes_overlap(box, (40, 0, np.pi / 2, 50, 20)))
+        # Two diagonal boxes side by side, whose axis aligned bounds overlap.
+        self.assertFalse(boxes_overlap((0, 0, np.pi / 4, 50, 20), (15, -15, np.pi / 4, 50, 20)))
+        self.assertTrue(boxes_overlap((0, 0, np.pi / 4, 50, 20), (13, -13, np.pi / 4, 50, 20)))
+
+
+if __name__ == '__main__':
+    unittest.main()
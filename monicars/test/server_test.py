@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import numpy as np
+from monicars import Environment
+from server import EnvServer, EnvClient
+
+
+class EnvServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.server = EnvServer("two_lanes", 3, os.path.join(self.dir, "env.sock"), auto_reset=False)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.close()
+        shutil.rmtree(self.dir)
+
+    def test_matches_in_process(self):
+        client = EnvClient(self.server.address)
+        env = Environment("two_lanes", render=False)
+        actions = np.random.RandomState(0).uniform(-1, 1, (5, 3, 2))
+
+        expected = env.reset()
+        self.assertEqual(client.obs_shape, np.shape(expected))
+        self.assertTrue(np.allclose(client.reset(), [expected] * 3))
+
+        for t in range(5):
+            obs, rewards, dones = client.step(actions[t])
+            for i in range(3):
+                env.reset()
+                for action in actions[0:t + 1, i]:
+                    expected, reward, done = env.step(action)
+                self.assertTrue(np.allclose(obs[i], expected))
+                self.assertAlmostEqual(rewards[i], reward)
+                self.assertEqual(dones[i], done)
+
+        client.close()
+
+    def test_clients_share_server(self):
+        clients = [EnvClient(self.server.address, env_ids=[i], pool_size=2) for i in range(3)]
+        errors = []
+
+        def run(client):
+            try:
+                for _ in range(20):
+                    client.step(np.zeros((1, 2)))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(clients[i % 3],)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        # Each car stepped 40 times at its initial speed.
+        y = [client.step(np.zeros((1, 2)))[0][0, 1] for client in clients]
+        self.assertTrue(np.allclose(y, y[0]))
+        self.assertLessEqual(clients[0]._open, 2)
+
+    def test_disjoint_requests(self):
+        client = EnvClient(self.server.address, env_ids=[2, 0])
+        other = EnvClient(self.server.address, env_ids=[1], timeout=5)
+        result = []
+
+        # A request which waits for environment 0 holds no other lock.
+        self.server._locks[0].acquire()
+        thread = threading.Thread(target=lambda: result.append(client.step(np.zeros((2, 2)))))
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+
+        other.step(np.zeros((1, 2)))
+        self.assertTrue(thread.is_alive())
+
+        self.server._locks[0].release()
+        thread.join()
+        self.assertEqual(len(result), 1)
+        self.assertFalse(any(lock.locked() for lock in self.server._locks))
+
+    def test_repeated_ids(self):
+        client = EnvClient(self.server.address, env_ids=[1, 1])
+
+        self.assertEqual(client.step(np.zeros((2, 2)))[0].shape, (2,) + client.obs_shape)
+
+    def test_no_envs(self):
+        with self.assertRaises(ValueError):
+            EnvServer("two_lanes", 0, os.path.join(self.dir, "empty.sock"))
+
+    def test_errors(self):
+        client = EnvClient(self.server.address, env_ids=[5])
+
+        with self.assertRaises(ValueError):
+            client.reset()
+        with self.assertRaises(ValueError):
+            client.step(np.zeros((2, 2)))
+
+        # The connection is kept after an error, and the server still answers.
+        self.assertEqual(client._open, 1)
+        self.assertEqual(EnvClient(self.server.address).reset().shape, (3,) + client.obs_shape)
+
+
+if __name__ == '__main__':
+    unittest.main()
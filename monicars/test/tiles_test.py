@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+import unittest
+import pygame
+import numpy as np
+from monicars import Environment
+from agent import Agent
+from tiles import TiledMap
+from view import View
+import map_assets
+
+
+class TiledMapTest(unittest.TestCase):
+
+    def test_matches_image(self):
+        view = View("intersection", 1000, 1500, 500, 500)
+        tiled = View("intersection", 1000, 1500, 500, 500, tiled=True)
+        tiled.tiles = TiledMap("intersection", tile_size=100, cache_size=40)
+        car = Agent()
+
+        # Scroll down the map, with the view partly outside it at the end.
+        for y in range(0, 1500, 130):
+            expected = pygame.surfarray.array3d(view.update(450, y, [(car.img, 450, y, 0)]))
+            frame = pygame.surfarray.array3d(tiled.update(450, y, [(car.img, 450, y, 0)]))
+            self.assertTrue(np.array_equal(frame, expected))
+
+        # A 500x500 view covers at most 36 tiles, so the cache never fills up.
+        self.assertLessEqual(len(tiled.tiles._tiles), 40)
+        self.assertGreater(tiled.tiles.hits, tiled.tiles.misses)
+
+        for x, y in [(0, 0), (450, 700), (999, 1499), (1000, 20)]:
+            self.assertTrue(np.allclose(tiled.get_colour(x, y), view.get_colour(x, y)))
+
+    def test_cache_is_bounded(self):
+        tiles = TiledMap("intersection", tile_size=50, cache_size=10)
+        surface = pygame.Surface((1000, 1500))
+
+        tiles.blit(surface, (0, 0), (0, 0, 1000, 1500))
+
+        self.assertEqual(tiles.misses, 20 * 30)
+        self.assertEqual(len(tiles._tiles), 10)
+        # The most recently used tiles are kept.
+        self.assertEqual(list(tiles._tiles.keys())[-1], (19, 29))
+
+    def test_environment(self):
+        env = Environment("intersection", render=False, tiled_map=True)
+        expected = Environment("intersection", render=False)
+
+        self.assertTrue(np.array_equal(env.view.get_road(), expected.view.get_road()))
+        self.assertEqual(env.reset(), expected.reset())
+        self.assertEqual(env.step([0.5, 0.1]), expected.step([0.5, 0.1]))
+
+    def test_map_arrays_are_mapped(self):
+        # Drop the arrays loaded in memory by other environments of the process.
+        for key in ["raster", "road", "lanes", "road_distance", "bev_layers"]:
+            map_assets._assets.pop(("intersection", key), None)
+        env = Environment("intersection", render=False, tiled_map=True, road_distance=True, bev=True, lidar=True)
+        expected = Environment("intersection", render=False, road_distance=True, bev=True, lidar=True)
+
+        self.assertIsInstance(env.lane_map.grid, np.memmap)
+        self.assertIsInstance(env.road_distance_field, np.memmap)
+        self.assertIsInstance(env.bev_grid.layers, np.memmap)
+        self.assertIsInstance(env.lidar_sensor.road, np.memmap)
+        self.assertTrue(np.array_equal(env.lane_map.grid, expected.lane_map.grid))
+        self.assertEqual(env.get_frenet()[0], expected.get_frenet()[0])
+
+        for state in [(450, 700, 0.3, 0), (20, 30, 2, 0), (990, 1490, -1, 0)]:
+            env.agent.place(*state)
+            expected.agent.place(*state)
+            self.assertTrue(np.array_equal(env._get_observation(), expected._get_observation()))
+            self.assertTrue(np.array_equal(env.get_lidar(), expected.get_lidar()))
+
+
+if __name__ == '__main__':
+    unittest.main()
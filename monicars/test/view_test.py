@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+import unittest
+import pygame
+import numpy as np
+from agent import Agent
+from view import View, RED
+
+
+class ViewTest(unittest.TestCase):
+
+    def setUp(self):
+        self.img = Agent().img
+        self.view = View("intersection", 1000, 1500, 500, 500)
+        # Forgetting the last view before every update redraws it in full.
+        self.full = View("intersection", 1000, 1500, 500, 500)
+
+    def both(self, method, *args):
+        """Calls a drawing method on both views."""
+        getattr(self.view, method)(*args)
+        getattr(self.full, method)(*args)
+
+    def assert_same_update(self, characters):
+        """Updates both views and compares their pixels."""
+        frame = pygame.surfarray.array3d(self.view.update(450, 700, characters))
+        self.full.env_view = None
+        expected = pygame.surfarray.array3d(self.full.update(450, 700, characters))
+
+        self.assertTrue(np.array_equal(frame, expected))
+
+    def test_incremental_matches_full(self):
+        trajectory = [(400, 600), (410, 610)]
+        self.assert_same_update([(self.img, 450, 700, 0)])
+        self.both("draw_trajectory", trajectory)
+        self.assert_same_update([(self.img, 450, 700, 0)])
+
+        incremental = 0
+        for i in range(20):
+            # The cars move, and so does the end of the trajectory, partly
+            # out of the view.
+            self.view.extend_trajectory([(420 + 10 * i, 620 + 12 * i)])
+            self.full.trajectories["trajectory"][0].append((420 + 10 * i, 620 + 12 * i))
+            characters = [(self.img, 450 + 3 * i, 700 - 5 * i, 0.1 * i), (self.img, 300, 500 + 8 * i, np.pi)]
+
+            if i == 5:
+                self.both("draw_shape", [(300, 600), (500, 650), (350, 800)], RED, 0)
+            if i == 10:
+                self.both("clear_shapes")
+            if i == 15:
+                self.both("draw_trajectory", [(600, 500), (620, 520)], RED, "other")
+
+            self.assert_same_update(characters)
+            incremental += self.view.dirty_rects is not None
+
+        # Only the updates after drawing and clearing the shapes are full.
+        self.assertEqual(incremental, 18)
+
+    def test_show(self):
+        display = pygame.display.set_mode((500, 500))
+        self.view.draw_trajectory([(450, 700), (460, 710)])
+
+        for i in range(5):
+            self.view.update(450, 700, [(self.img, 450 + 10 * i, 700, 0)])
+            self.view.extend_trajectory([(470 + 10 * i, 720)])
+            self.view.show(display)
+
+            self.assertTrue(np.array_equal(pygame.surfarray.array3d(display),
+                                           pygame.surfarray.array3d(self.view.surface)))
+
+
+if __name__ == '__main__':
+    unittest.main()
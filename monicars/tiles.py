@@ -0,0 +1,106 @@
+"""Tiled access to the image of a map, for maps too large to hold in memory."""
+import os
+from collections import OrderedDict
+import pygame
+import numpy as np
+from util import classify_colours
+from map_assets import get_asset
+from variables import global_var
+
+
+class TiledMap(object):
+    """The image of a map, as a raw RGB raster memory mapped from the cache of
+    the maps, which is read in square tiles. Only the pages of the raster
+    under the tiles which are read are loaded, and the tiles are converted to
+    surfaces on demand and kept in a cache of bounded size, dropping the
+    least recently used ones.
+
+    The raster is built from the PNG of the map the first time it is used,
+    which needs the whole image in memory once. After that, the map is only
+    read from the raster.
+    """
+
+    def __init__(self, env_name, tile_size=256, cache_size=64):
+        """Loads the raster, building it if needed.
+
+        Args:
+            env_name: The name of the map.
+            tile_size: The width and height of the tiles (pixels).
+            cache_size: The maximum number of tiles kept as surfaces.
+        """
+        self.env_name = env_name
+        self.tile_size = tile_size
+        self.cache_size = cache_size
+
+        self.rgb = get_asset(env_name, "rgb", self._build, mmap_mode="r")
+        self.height, self.width = self.rgb.shape[0:2]
+
+        self._tiles = OrderedDict()  # Maps (column, row) to the tile surfaces, oldest first.
+        self.hits = 0  # Number of tiles found in the cache.
+        self.misses = 0
+
+    def _build(self):
+        """Returns the RGB raster of the map image composed over black, of
+        shape (height, width, 3) indexed by [y, x]."""
+        img = pygame.image.load(os.path.join(global_var.PATH, "maps", self.env_name + ".png"))
+        background = pygame.Surface((img.get_width(), img.get_height()))
+        background.blit(img, (0, 0))
+
+        return pygame.surfarray.array3d(background).transpose(1, 0, 2).copy()
+
+    def get_tile(self, column, row):
+        """Returns the surface of a tile, from the cache if possible."""
+        key = (column, row)
+        tile = self._tiles.pop(key, None)
+
+        if tile is None:
+            self.misses += 1
+            y = row * self.tile_size
+            x = column * self.tile_size
+            block = np.ascontiguousarray(self.rgb[y:y + self.tile_size, x:x + self.tile_size])
+            tile = pygame.image.fromstring(block.tobytes(), (block.shape[1], block.shape[0]), "RGB")
+
+            if len(self._tiles) >= self.cache_size:
+                self._tiles.popitem(last=False)
+        else:
+            self.hits += 1
+
+        self._tiles[key] = tile
+
+        return tile
+
+    def blit(self, surface, dest, area):
+        """Draws an area of the map onto a surface, like Surface.blit. The
+        parts of the area outside the map aren't drawn.
+
+        Args:
+            surface: The surface to draw on.
+            dest: The position on the surface of the corner of the area.
+            area: The rectangle of the map to draw, in map coordinates.
+        """
+        area = pygame.Rect(area)
+        clipped = area.clip(pygame.Rect(0, 0, self.width, self.height))
+        if clipped.width == 0 or clipped.height == 0:
+            return
+
+        dest = (dest[0], dest[1])  # A position or a rectangle.
+        size = self.tile_size
+        for row in range(clipped.top // size, (clipped.bottom - 1) // size + 1):
+            for column in range(clipped.left // size, (clipped.right - 1) // size + 1):
+                part = clipped.clip(pygame.Rect(column * size, row * size, size, size))
+                surface.blit(self.get_tile(column, row),
+                             (dest[0] + part.x - area.x, dest[1] + part.y - area.y),
+                             part.move(-column * size, -row * size))
+
+    def get_colour(self, x, y):
+        """Returns the normalized RGB values of the pixel at x, y."""
+        return tuple(self.rgb[int(y), int(x)] / 255.0)
+
+    def classify(self):
+        """Returns the colour classes of the map, as View.get_raster, computed
+        one band of tiles at a time."""
+        classes = np.zeros((self.height, self.width), dtype=np.uint8)
+        for y in range(0, self.height, self.tile_size):
+            classes[y:y + self.tile_size] = classify_colours(self.rgb[y:y + self.tile_size] / 255.0)
+
+        return classes
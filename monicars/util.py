@@ -8,6 +8,14 @@ from variables import global_var
 
 SMALL = 0.001
 
+# Colour classes of map pixels, as returned by classify_colours.
+UNKNOWN = 0
+GREY = 1
+BLACK = 2
+WHITE = 3
+GREEN = 4
+COLOURS = ["unknown", "grey", "black", "white", "green"]
+
 
 def input_to_action(usr_in):
     """Changes the user input to a usable form.
@@ -36,12 +44,138 @@ def is_close(x, y, tol=0.05):
     return abs(x - y) <= tol
 
 
-def add_noise(num, std):
-    """Adds Gaussian noise to an integer and returns an integer."""
+def add_noise(num, std, rng=np.random):
+    """Adds Gaussian noise to an integer and returns an integer. The noise is
+    drawn from rng, a numpy RandomState, or from numpy's global generator."""
     if type(num) == int:
-        return int(round(np.random.normal(num, std, 1)[0]))
+        return int(round(rng.normal(num, std, 1)[0]))
     else:
-        return np.random.normal(num, std, 1)[0]
+        return rng.normal(num, std, 1)[0]
+
+
+def classify_colours(rgb):
+    """Classifies an array of normalized RGB colours, with the same rules
+    as Environment._check_pixels.
+
+    Args:
+        rgb: Array of shape (..., 3) with values between 0 and 1.
+
+    Returns:
+        A uint8 array of shape (...) of colour classes, which index COLOURS.
+    """
+    r = rgb[..., 0]
+    g = rgb[..., 1]
+    b = rgb[..., 2]
+
+    classes = np.full(r.shape, UNKNOWN, dtype=np.uint8)
+
+    # If g is sufficiently higher than r and b, the colour is green.
+    classes[(g - r > 0.2) & (g - b > 0.2)] = GREEN
+
+    # If the r, g and b values are close, the colour is grey, black or white.
+    # The tolerance matches is_close.
+    neutral = (np.abs(r - g) <= 0.05) & (np.abs(g - b) <= 0.05)
+    classes[neutral & (r >= 0.9)] = WHITE
+    classes[neutral & (r <= 0.1)] = BLACK
+    classes[neutral & (r < 0.9) & (r > 0.1)] = GREY
+
+    return classes
+
+
+def points_in_boxes(x, y, boxes):
+    """Checks which points are inside which oriented boxes. A box with heading
+    theta is aligned with the direction of travel (sin(theta), cos(theta)).
+
+    Args:
+        x: Array of shape (P,) of the x coordinates of the points.
+        y: Array of shape (P,) of the y coordinates of the points.
+        boxes: Array of shape (K, 5) where each row is (x, y, theta, length, width).
+
+    Returns:
+        Boolean array of shape (K, P).
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 5)
+    dx = x[np.newaxis, :] - boxes[:, 0:1]
+    dy = y[np.newaxis, :] - boxes[:, 1:2]
+    sin = np.sin(boxes[:, 2:3])
+    cos = np.cos(boxes[:, 2:3])
+
+    along = dx * sin + dy * cos
+    across = dx * cos - dy * sin
+
+    return (np.abs(along) <= boxes[:, 3:4] / 2.0) & (np.abs(across) <= boxes[:, 4:5] / 2.0)
+
+
+def boxes_overlap(a, b):
+    """Checks whether pairs of oriented boxes overlap, using the separating
+    axis theorem. A box with heading theta is aligned with the direction of
+    travel (sin(theta), cos(theta)).
+
+    Args:
+        a: Array of shape (..., 5) where each row is (x, y, theta, length, width).
+        b: Array of boxes, broadcastable with a.
+
+    Returns:
+        Boolean array of the broadcast shape of a[..., 0] and b[..., 0].
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+
+    dx = b[..., 0] - a[..., 0]
+    dy = b[..., 1] - a[..., 1]
+
+    # Axes of both boxes, along and across their heading.
+    a_sin = np.sin(a[..., 2])
+    a_cos = np.cos(a[..., 2])
+    b_sin = np.sin(b[..., 2])
+    b_cos = np.cos(b[..., 2])
+    axes = ((a_sin, a_cos), (a_cos, -a_sin), (b_sin, b_cos), (b_cos, -b_sin))
+
+    separated = False
+    for nx, ny in axes:
+        # Half the length of the projection of each box onto the axis.
+        a_half = (a[..., 3] * np.abs(a_sin * nx + a_cos * ny) + a[..., 4] * np.abs(a_cos * nx - a_sin * ny)) / 2.0
+        b_half = (b[..., 3] * np.abs(b_sin * nx + b_cos * ny) + b[..., 4] * np.abs(b_cos * nx - b_sin * ny)) / 2.0
+        separated = separated | (np.abs(dx * nx + dy * ny) > a_half + b_half)
+
+    return ~separated
+
+
+def corners_in_boxes(a, b):
+    """Checks whether any corner of oriented boxes is strictly inside other
+    oriented boxes, which is the collision test of Rectangle.overlaps. Unlike
+    boxes_overlap, it misses boxes at an angle which only cross along their
+    edges. A box with heading theta is aligned with the direction of travel
+    (sin(theta), cos(theta)).
+
+    Args:
+        a: Array of shape (..., 5) where each row is (x, y, theta, length, width).
+        b: Array of boxes, broadcastable with a, which the corners of a are
+           tested against.
+
+    Returns:
+        Boolean array of the broadcast shape of a[..., 0] and b[..., 0].
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+
+    a_sin = np.sin(a[..., 2])
+    a_cos = np.cos(a[..., 2])
+    b_sin = np.sin(b[..., 2])
+    b_cos = np.cos(b[..., 2])
+
+    inside = False
+    for along_sign, across_sign in ((1, 1), (1, -1), (-1, -1), (-1, 1)):
+        # The corner, relative to the centre of b.
+        along = along_sign * a[..., 3] / 2.0
+        across = across_sign * a[..., 4] / 2.0
+        dx = a[..., 0] + along * a_sin + across * a_cos - b[..., 0]
+        dy = a[..., 1] + along * a_cos - across * a_sin - b[..., 1]
+
+        inside = inside | ((np.abs(dx * b_sin + dy * b_cos) < b[..., 3] / 2.0) &
+                           (np.abs(dx * b_cos - dy * b_sin) < b[..., 4] / 2.0))
+
+    return inside
 
 
 def normalize_angle(angle):
@@ -64,11 +198,12 @@ def on_segment(seg, pt, on_line=False):
         if abs(cross) > SMALL:
             return False
 
-    seg_length = euclidean(seg[0], seg[1])
+    seg_length = math.hypot(seg[1][0] - seg[0][0], seg[1][1] - seg[0][1])
 
     # If the intersection of the two lines is within the segment, the legth of the
     # segment will be larger than the distance between the intersection and the end points.
-    return seg_length > euclidean(seg[0], pt) and seg_length > euclidean(seg[1], pt)
+    return (seg_length > math.hypot(pt[0] - seg[0][0], pt[1] - seg[0][1]) and
+            seg_length > math.hypot(pt[0] - seg[1][0], pt[1] - seg[1][1]))
 
 
 def cross_product(u, v):
@@ -182,7 +317,7 @@ class Rectangle(object):
     def get_angle(self):
         o = self.points[1][0] - self.points[2][0]
         a = self.points[2][1] - self.points[1][1]
-        return np.arctan2(o, a)
+        return math.atan2(o, a)
 
     def transform(self, x, y, theta):
         """Transforms the rectangle by a given position and angle."""
@@ -190,11 +325,16 @@ class Rectangle(object):
         self.shift(x, y)
 
     def move_to(self, x, y, theta):
-        """Moves the rectangle to a given position."""
-        curr_theta = self.get_angle()
-        curr_pos = self.get_centre()
-
-        self.transform(x - curr_pos[0], y - curr_pos[1], theta - curr_theta)
+        """Moves the rectangle to a given position. The points are rotated
+        about the current centre and shifted to the new one in one pass."""
+        curr_x, curr_y = self.get_centre()
+        delta = theta - self.get_angle()
+        cos = math.cos(delta)
+        sin = math.sin(delta)
+
+        self.points = [[x + (pt[0] - curr_x) * cos - (pt[1] - curr_y) * sin,
+                        y + (pt[0] - curr_x) * sin + (pt[1] - curr_y) * cos] for pt in self.points]
+        self.update_lines()
 
     def shift(self, x, y):
         """Shifts the rectangle from its current position."""
@@ -225,30 +365,19 @@ class Rectangle(object):
         self.update_lines()
 
     def is_inside(self, pt):
-        """Checks if a point is inside the rectangle using the ray casting
-        algorithm. If a ray from a point outside the polygon to our point
-        intersects the polygon an even number of times, then it's outside,
-        otherwise it's  inside. The point we choose is (0, 0). A point on the
-        perimeter of the rectangle is outside.
+        """Checks if a point is inside the rectangle. The point is inside if
+        it is on the same side of all four edges, going around the rectangle,
+        which is the sign of the cross product of each edge with the segment
+        from its start to the point. A point on the perimeter of the
+        rectangle is outside.
 
         Args:
             pt: Point in the form (x, y).
         """
-        ray = ((0, 0), pt)
-        intersections = 0
-
-        # Check whether lines intersect the ray.
-        for line in self.lines:
-            if intersect(ray, line):
-                intersections += 1
-
-        # Check whether the ray happens to cross a corner of the rectangle. This
-        # will not be registered as an intersection so has to be checked separately.
-        for corner in self.points:
-            if on_segment(ray, corner):
-                intersections += 1
+        x, y = pt[0], pt[1]
+        sides = [(b[0] - a[0]) * (y - a[1]) - (x - a[0]) * (b[1] - a[1]) for a, b in self.lines]
 
-        return intersections % 2 == 1
+        return min(sides) > 0 or max(sides) < 0
 
     def overlaps(self, rect):
         """Determines if a rectangle overlaps with itself. If any point in the
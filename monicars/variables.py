@@ -75,6 +75,8 @@ class _GlobalVariables(object):
         MAX_ANGLE: The maximum possible steering angle.
         MAX_ACC: The maximum possible acceleration.
         MAX_SPEED: The maximum possible speed.
+        DT: The length of a step.
+        SUBSTEPS: The number of integration steps per step.
         PATH: The path to the monicars directory.
         ENV: The environment name. Needs to be set after initialization.
     """
@@ -84,6 +86,8 @@ class _GlobalVariables(object):
             self.MAX_ANGLE = variables["max_angle"]
             self.MAX_ACC = variables["max_acc"]
             self.MAX_SPEED = variables["max_speed"]
+            self.DT = variables["dt"]
+            self.SUBSTEPS = variables["substeps"]
 
         self.PATH = os.path.dirname(os.path.realpath(__file__))
         self.ENV = "none"
@@ -93,6 +97,8 @@ class _GlobalVariables(object):
         self.MAX_ANGLE = variables["max_angle"]
         self.MAX_ACC = variables["max_acc"]
         self.MAX_SPEED = variables["max_speed"]
+        self.DT = variables["dt"]
+        self.SUBSTEPS = variables["substeps"]
 
 
 class _TrafficVariables(object):
@@ -102,6 +108,12 @@ class _TrafficVariables(object):
         FREQ: The probability of a new car appearing per second.
         MAX_CARS: The maximum number of cars, not including the obstacle.
         SPEED: The speed of the NPC cars.
+        IDM: Whether the NPC cars follow the car ahead with the Intelligent Driver Model (bool).
+        TIME_HEADWAY: The desired time gap to the car ahead (timesteps).
+        MIN_GAP: The desired gap to the car ahead when stopped (pixels).
+        IDM_ACC: The maximum acceleration (pixels/timestep^2).
+        COMFORT_DECEL: The comfortable deceleration (pixels/timestep^2).
+        MAX_DECEL: The maximum deceleration (pixels/timestep^2).
         TYPES: The types of car available.
     """
     def __init__(self, variables=None):
@@ -109,6 +121,12 @@ class _TrafficVariables(object):
             self.FREQ = variables["freq"] / global_var.FPS
             self.MAX_CARS = variables["max_cars"]
             self.SPEED = variables["speed"]
+            self.IDM = variables["idm"]
+            self.TIME_HEADWAY = variables["time_headway"]
+            self.MIN_GAP = variables["min_gap"]
+            self.IDM_ACC = variables["idm_acc"]
+            self.COMFORT_DECEL = variables["comfort_decel"]
+            self.MAX_DECEL = variables["max_decel"]
 
         self.TYPES = ["blue_car", "green_car", "pink_car",
                       "teal_car", "white_car", "yellow_car"]
@@ -117,6 +135,12 @@ class _TrafficVariables(object):
         self.FREQ = variables["freq"] / global_var.FPS
         self.MAX_CARS = variables["max_cars"]
         self.SPEED = variables["speed"]
+        self.IDM = variables["idm"]
+        self.TIME_HEADWAY = variables["time_headway"]
+        self.MIN_GAP = variables["min_gap"]
+        self.IDM_ACC = variables["idm_acc"]
+        self.COMFORT_DECEL = variables["comfort_decel"]
+        self.MAX_DECEL = variables["max_decel"]
 
 
 class _ObstacleVariables(object):
@@ -165,12 +189,54 @@ class _ObstacleVariables(object):
         self.TOTAL_STUCK_TIME = variables["total_stuck_time"]
 
 
+class _BEVVariables(object):
+    """Variables belonging to the bird's-eye view observation.
+
+    Attributes:
+        SIZE: The number of cells along each side of the grid.
+        EXTENT: The length of each side of the grid (pixels).
+    """
+    def __init__(self, variables=None):
+        if variables is not None:
+            self.SIZE = variables["size"]
+            self.EXTENT = variables["extent"]
+
+    def set(self, variables):
+        self.SIZE = variables["size"]
+        self.EXTENT = variables["extent"]
+
+
+class _LidarVariables(object):
+    """Variables belonging to the lidar sensor.
+
+    Attributes:
+        RAYS: The number of rays.
+        FOV: The angle covered by the rays (radians).
+        MAX_RANGE: The length of the rays (pixels).
+        STEP: The distance between samples when marching along the map (pixels).
+    """
+    def __init__(self, variables=None):
+        if variables is not None:
+            self.RAYS = variables["rays"]
+            self.FOV = variables["fov"]
+            self.MAX_RANGE = variables["max_range"]
+            self.STEP = variables["step"]
+
+    def set(self, variables):
+        self.RAYS = variables["rays"]
+        self.FOV = variables["fov"]
+        self.MAX_RANGE = variables["max_range"]
+        self.STEP = variables["step"]
+
+
 
 global_var = _GlobalVariables()
 agent = _AgentVariables()
 screen = _ScreenVariables()
 traffic = _TrafficVariables()
 obstacle = _ObstacleVariables()
+bev = _BEVVariables()
+lidar = _LidarVariables()
 
 
 def load_variables(file_path):
@@ -188,6 +254,8 @@ def load_variables(file_path):
     screen.set(var["visualization"])
     traffic.set(var["traffic"])
     obstacle.set(var["obstacle"])
+    bev.set(var["bev"])
+    lidar.set(var["lidar"])
 
 
 def set_env(name):
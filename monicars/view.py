@@ -4,17 +4,23 @@ import os
 import sys
 import pygame
 import numpy as np
+from util import classify_colours, GREY, WHITE
+from map_assets import get_asset
+from tiles import TiledMap
 from variables import global_var
 
 RED = (255, 0, 0)
 BLUE = (0, 0, 255)
 
+_images = {}  # Maps the names of the maps to their images and opaque backgrounds.
+
 
 class View(object):
 
     """View handles the visualization part of the environment."""
 
-    def __init__(self, env_name, env_width, env_height, screen_width=None, screen_height=None, flip=False):
+    def __init__(self, env_name, env_width, env_height, screen_width=None, screen_height=None, flip=False,
+                 tiled=False):
         """Initializes View.
 
         Args:
@@ -24,8 +30,10 @@ class View(object):
             screen_width: The width of the screen to view. If None, whole env is displayed.
             screen_height: The height of the screen to view. If None, whole env is displayed.
             flip: Whether to flip the screen. For driving view.
+            tiled: Whether to read the map in tiles rather than load the whole image. See TiledMap.
         """
         self.flip = flip
+        self.env_name = env_name
 
         # Width of the whole environment.
         self.width = env_width
@@ -42,9 +50,39 @@ class View(object):
         self.surface_flipped = None
         self.env_view = None
 
-        self.trajectory = None  # The trajectory to draw onto the image.
-
-        self.env_img = self._load_img(env_name)
+        # Areas of the surface which changed in the last update, or None if
+        # the whole surface was redrawn.
+        self.dirty_rects = None
+        self._car_rects = []  # Where the characters were drawn in the last update.
+        self._overlay_changed = False  # Whether the overlay changed other than by new trajectory points.
+
+        # Trajectories and debug shapes are drawn on a transparent overlay the
+        # size of the environment, so the map image itself is never modified.
+        self.overlay = None
+        self.trajectories = {}  # Maps names to [points, colour, number of points drawn].
+        self.shapes = []  # Debug shapes, as (points, colour, width).
+        self.recorder = None  # Records each frame, if attached.
+        self.raster = None  # Colour classes of the map pixels, computed on demand.
+        self.road = None  # Road mask of the map, computed on demand.
+
+        # The map image, with the map composed over black once, so that it is
+        # opaque. Drawing an opaque background gives the same result regardless
+        # of what was on the surface before, so parts of the view can be
+        # redrawn on their own. Both are loaded once per process and shared by
+        # all the views of the map, so they are never drawn on. Tiled maps are
+        # drawn from tiles of the opaque background instead.
+        self.tiles = TiledMap(env_name) if tiled else None
+        self.env_img = None
+        self.background = None
+
+        if self.tiles is None:
+            if env_name not in _images:
+                env_img = self._load_img(env_name)
+                background = pygame.Surface((env_img.get_width(), env_img.get_height()))
+                background.blit(env_img, (0, 0))
+                _images[env_name] = (env_img, background)
+
+            self.env_img, self.background = _images[env_name]
 
         self.surface = pygame.Surface((self.screen_width, self.screen_height))
         self.surface_flipped = pygame.Surface((self.screen_width, self.screen_height))
@@ -61,52 +99,243 @@ class View(object):
             Surface object.
         """
         # Update the current view of the environment.
+        prev_view = self.env_view
         self.env_view = self._get_current_view(x, y)
 
-        # Draw a trajectory if it exists.
-        if self.trajectory is not None:
-            self._draw_trajectory()
+        # If the view hasn't moved, only the areas under the characters and
+        # under new trajectory points need to be redrawn. The flipped surface
+        # can't be patched, so it is always redrawn.
+        if self.env_view == prev_view and not self.flip and not self._overlay_changed:
+            self.dirty_rects = self._car_rects
 
-        # Draw the environment onto the image.
-        self.surface.blit(self.env_img, (0, 0), self.env_view)
+            if self.overlay is not None:
+                self.dirty_rects = self.dirty_rects + self._draw_trajectories()
+
+            for rect in self.dirty_rects:
+                self._draw_background(rect)
+        else:
+            self.dirty_rects = None
+            self._draw_background(self.surface.get_rect())
 
         # Draw each character on the image.
+        self._car_rects = []
         for img, x, y, theta in characters:
-            self._draw_character(img, x, y, theta, self.env_view[0], self.env_view[1])
+            rect = self._draw_character(img, x, y, theta, self.env_view[0], self.env_view[1])
+            self._car_rects.append(rect)
+
+        if self.dirty_rects is not None:
+            self.dirty_rects = self.dirty_rects + self._car_rects
 
         # Flip the image if necessary.
         if self.flip:
             self.surface_flipped = pygame.transform.flip(self.surface, False, True)
             self.surface.blit(self.surface_flipped, (0, 0))
 
+        if self.recorder is not None:
+            self.recorder.record(self.surface)
+
         return self.surface
 
-    def draw_trajectory(self, trajectory):
-        """Saves and draws trajectory which is a list of states. The states
-        need to be of form (x, y). Call update to see the trajectory. TODO: Add
-        theta and make arrows."""
-        self.trajectory = trajectory
-        self._draw_trajectory()
+    def show(self, display_surface):
+        """Copies the last update onto the display and updates the display.
+        Only the areas which changed are copied and updated, unless the whole
+        view was redrawn.
+
+        Args:
+            display_surface: The display surface, which must be showing the
+                             previous update of this view.
+        """
+        if self.dirty_rects is None:
+            display_surface.blit(self.surface, (0, 0))
+            pygame.display.update()
+            return
+
+        for rect in self.dirty_rects:
+            display_surface.blit(self.surface, rect, rect)
+
+        pygame.display.update(self.dirty_rects)
+
+    def attach_recorder(self, recorder):
+        """Attaches a FrameRecorder which will receive every frame produced by
+        update."""
+        self.recorder = recorder
+
+    def detach_recorder(self):
+        """Detaches and returns the current recorder."""
+        recorder = self.recorder
+        self.recorder = None
+        return recorder
 
-    def clear_trajectory(self):
-        """Clears the trajectory from the view."""
-        self.trajectory = None
+    def draw_trajectory(self, trajectory, colour=BLUE, name="trajectory"):
+        """Saves a trajectory to draw, which is a list of states. The states
+        need to be of form (x, y). Points appended to the list later are drawn
+        on the following updates, and only the new points are drawn each time.
+        Call update to see the trajectory. TODO: Add theta and make arrows.
+
+        Args:
+            trajectory: The list of states.
+            colour: The RGB colour of the trajectory. Defaults to blue.
+            name: Name of the trajectory, so that several can be drawn at once.
+                  Drawing a trajectory with an existing name replaces it.
+        """
+        if name in self.trajectories:
+            del self.trajectories[name]
+            self._redraw_overlay()
+
+        self._get_overlay()
+        self.trajectories[name] = [trajectory, colour, 0]
+
+    def extend_trajectory(self, points, name="trajectory"):
+        """Adds points to the end of an existing trajectory.
+
+        Args:
+            points: The list of new states, of form (x, y).
+            name: Name of the trajectory.
+        """
+        self.trajectories[name][0].extend(points)
+
+    def clear_trajectory(self, name=None):
+        """Clears a trajectory from the view.
+
+        Args:
+            name: Name of the trajectory to clear. If None, all the
+                  trajectories are cleared.
+        """
+        if name is None:
+            self.trajectories = {}
+        elif name in self.trajectories:
+            del self.trajectories[name]
 
-    def _draw_trajectory(self):
-        """Draws the actual trajectory onto the image."""
-        if self.trajectory is None:
+        self._redraw_overlay()
+
+    def draw_shape(self, points, colour=RED, width=1):
+        """Draws a debugging polygon on the overlay.
+
+        Args:
+            points: List of the (x, y) vertices of the shape, in map coordinates.
+                    Two points draw a line.
+            colour: The RGB colour of the shape. Defaults to red.
+            width: The width of the outline. If 0, the shape is filled.
+        """
+        self.shapes.append((points, colour, width))
+        self._draw_shape(points, colour, width)
+        self._overlay_changed = True
+
+    def clear_shapes(self):
+        """Clears all the debugging shapes from the view."""
+        self.shapes = []
+        self._redraw_overlay()
+
+    def _get_overlay(self):
+        """Returns the overlay surface, creating it if it doesn't exist. It
+        covers the whole map, so it isn't bounded like the tiles of a tiled
+        map."""
+        if self.overlay is None:
+            self.overlay = pygame.Surface((self.width, self.height), pygame.SRCALPHA)
+
+        return self.overlay
+
+    def _draw_trajectories(self):
+        """Draws the points which were added to the trajectories since the last
+        call onto the overlay.
+
+        Returns:
+            The list of rectangles covering the new points in the current view.
+        """
+        rects = []
+        for entry in self.trajectories.values():
+            points, colour, drawn = entry
+            for state in points[drawn:]:
+                rect = pygame.draw.circle(self.overlay, colour, (int(state[0]), int(state[1])), 2)
+                if self.env_view is not None:
+                    rects.append(rect.move(-self.env_view[0], -self.env_view[1]))
+
+            entry[2] = len(points)
+
+        return rects
+
+    def _draw_background(self, rect):
+        """Draws the map and the overlay within a rectangle of the surface.
+
+        Args:
+            rect: The rectangle to draw, relative to the current view.
+        """
+        area = pygame.Rect(rect).move(self.env_view[0], self.env_view[1])
+        if self.tiles is not None:
+            self.tiles.blit(self.surface, rect, area)
+        else:
+            self.surface.blit(self.background, rect, area)
+
+        if self.overlay is not None:
+            # Draw the new trajectory points before a full redraw.
+            if self.dirty_rects is None:
+                self._draw_trajectories()
+                self._overlay_changed = False
+
+            self.surface.blit(self.overlay, rect, area)
+
+    def _draw_shape(self, points, colour, width):
+        """Draws a single debugging shape onto the overlay."""
+        points = [(int(pt[0]), int(pt[1])) for pt in points]
+        if len(points) == 2:
+            pygame.draw.line(self._get_overlay(), colour, points[0], points[1], max(width, 1))
+        else:
+            pygame.draw.polygon(self._get_overlay(), colour, points, width)
+
+    def _redraw_overlay(self):
+        """Clears the overlay and draws everything which is left on it."""
+        if self.overlay is None:
             return
 
-        for state in self.trajectory:
-            pygame.draw.circle(self.env_img, BLUE, (int(state[0]), int(state[1])), 2)
+        self.overlay.fill((0, 0, 0, 0))
+        self._overlay_changed = True
+
+        for entry in self.trajectories.values():
+            entry[2] = 0
+
+        self._draw_trajectories()
+
+        for points, colour, width in self.shapes:
+            self._draw_shape(points, colour, width)
 
     def get_colour(self, x, y):
         """Returns the normalized RGB values of the pixel at x, y."""
         if x >= self.width or y >= self.height:
             return (0, 0, 0)
 
+        if self.tiles is not None:
+            return self.tiles.get_colour(x, y)
+
         return self.env_img.get_at((int(x), int(y))).normalize()[0:3]
 
+    def get_raster(self):
+        """Returns the colour class of every pixel of the map, as a uint8 array
+        of shape (height, width) indexed by [y, x]. See util.classify_colours.
+        It is computed once per map and cached, see map_assets. For tiled maps,
+        it is memory mapped from the cache."""
+        if self.raster is None:
+            if self.tiles is not None:
+                self.raster = get_asset(self.env_name, "raster", self.tiles.classify, mmap_mode="r")
+            else:
+                def build():
+                    rgb = pygame.surfarray.array3d(self.env_img).transpose(1, 0, 2)
+                    return classify_colours(rgb / 255.0)
+
+                self.raster = get_asset(self.env_name, "raster", build)
+
+        return self.raster
+
+    def get_road(self):
+        """Returns a boolean array of shape (height, width), indexed by [y, x],
+        which is True where the map is grey or white, like on_road. It is
+        computed once per map and cached, see map_assets."""
+        if self.road is None:
+            raster = self.get_raster()
+            self.road = get_asset(self.env_name, "road", lambda: (raster == GREY) | (raster == WHITE),
+                                  "r" if self.tiles is not None else None)
+
+        return self.road
+
     def _load_img(self, name):
         """Loads the image from the map directory."""
         try:
@@ -130,6 +359,9 @@ class View(object):
             theta: The character's heading.
             view_x: The x component of the corner of the current view.
             view_y: The y component of the corner of the current view.
+
+        Returns:
+            The rectangle of the surface covered by the character.
         """
         # Rotate the image and get its dimensions.
         rotated = pygame.transform.rotate(img, np.degrees(theta))
@@ -143,7 +375,7 @@ class View(object):
         x = x_global - view_x
         y = y_global - view_y
 
-        self.surface.blit(rotated, (int(round(x)), int(round(y))))
+        return self.surface.blit(rotated, (int(round(x)), int(round(y))))
 
     def _get_current_view(self, agent_x, agent_y):
         """Gets the coordinates of what the current view should be so that the
@@ -0,0 +1,168 @@
+"""Zone tracking, which follows the zones the cars are in from step to step."""
+import numpy as np
+
+# Kinds of zone transition events.
+LANE_CHANGE = "lane_change"
+LANE_ENTRY = "lane_entry"
+INTERSECTION_ENTRY = "intersection_entry"
+INTERSECTION_EXIT = "intersection_exit"
+LANE_EXIT = "lane_exit"
+ROAD_EXIT = "road_exit"
+ROAD_ENTRY = "road_entry"
+
+
+class ZoneTracker(object):
+    """Remembers the zone each car was last in. Cars move only a few pixels
+    per step, so the last zone and the zones next to it are tested first, and
+    all the zones are searched only when the car is in none of them.
+
+    Zones are as returned by Environment.get_zone, ("type", ID). When the zone
+    of a car changes, an event (car, old zone, new zone, kind) is recorded,
+    where kind is one of the transition kinds of this module.
+    """
+
+    def __init__(self, lanes, intersections, road, adjacency=1.0):
+        """Initializes the tracker.
+
+        Args:
+            lanes: The lane zones, as Rectangles with an id, in search order.
+            intersections: The intersection zones, as Rectangles with an id.
+            road: The road mask of the map, indexed by [y, x], for points which
+                  are in no zone. See View.get_road.
+            adjacency: Zones closer than this are adjacent (pixels).
+        """
+        self.zones = [("lane", lane.id) for lane in lanes] + \
+                     [("intersection", intersection.id) for intersection in intersections]
+        self.road = road
+
+        # Bounds of each zone, (min x, min y, max x, max y). Lanes come first,
+        # so that the zone with the lowest index wins, as in get_zone.
+        self.bounds = np.array([self._get_bounds(rect) for rect in list(lanes) + list(intersections)],
+                               dtype=float).reshape(-1, 4)
+
+        # Zones which touch or overlap each zone, including itself, in search order.
+        near = ((self.bounds[:, np.newaxis, 0] <= self.bounds[np.newaxis, :, 2] + adjacency) &
+                (self.bounds[np.newaxis, :, 0] <= self.bounds[:, np.newaxis, 2] + adjacency) &
+                (self.bounds[:, np.newaxis, 1] <= self.bounds[np.newaxis, :, 3] + adjacency) &
+                (self.bounds[np.newaxis, :, 1] <= self.bounds[:, np.newaxis, 3] + adjacency))
+        self.adjacent = [[int(i) for i in np.nonzero(row)[0]] for row in near]
+        self._bounds = [tuple(b) for b in self.bounds.tolist()]  # Faster to test one at a time.
+
+        self.last = {}  # Maps each car to the index of its last zone, or its last zone if not in one.
+        self.events = []
+        self.hits = 0  # Number of lookups found among the last and adjacent zones.
+        self.misses = 0
+
+    def _get_bounds(self, rect):
+        """Returns the bounds of a rectangle."""
+        xs = [pt[0] for pt in rect.points]
+        ys = [pt[1] for pt in rect.points]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def _is_inside(self, i, x, y):
+        """Returns whether a point is strictly inside zone i, like Rectangle.is_inside."""
+        b = self._bounds[i]
+        return b[0] < x < b[2] and b[1] < y < b[3]
+
+    def locate(self, x, y, last=None):
+        """Returns the index of the zone a point is in, or None, testing the
+        zones next to the last zone first. Where zones overlap, the zone with
+        the lowest index wins, as in a full search.
+
+        Args:
+            x: The x coordinate of the point.
+            y: The y coordinate of the point.
+            last: The index of the last zone of the point. Optional.
+        """
+        if last is not None:
+            for i in self.adjacent[last]:
+                if self._is_inside(i, x, y):
+                    # Every zone the point is in overlaps zone i, so the one
+                    # with the lowest index is the first of its neighbours
+                    # which contains the point, which may be i itself.
+                    self.hits += 1
+                    for j in self.adjacent[i]:
+                        if self._is_inside(j, x, y):
+                            return j
+
+        self.misses += 1
+        inside = ((self.bounds[:, 0] < x) & (x < self.bounds[:, 2]) &
+                  (self.bounds[:, 1] < y) & (y < self.bounds[:, 3]))
+
+        return int(inside.argmax()) if inside.any() else None
+
+    def find(self, car, pos):
+        """Returns the index of the zone a car is in, or None, starting from
+        its last zone, without updating it or recording an event.
+
+        Args:
+            car: Any object identifying the car.
+            pos: The position of the car, (x, y).
+        """
+        last = self.last.get(car)
+
+        return self.locate(pos[0], pos[1], last if isinstance(last, int) else None)
+
+    def get_zone(self, car, pos):
+        """Returns the zone a car is in and records an event if it changed.
+
+        Args:
+            car: Any object identifying the car.
+            pos: The position of the car, (x, y).
+        """
+        last = self.last.get(car)
+        i = self.find(car, pos)
+
+        if i is not None:
+            zone = self.zones[i]
+            current = i
+        else:
+            zone = ("on_road", 0) if self._on_road(pos) else ("off_road", 0)
+            current = zone
+
+        if car in self.last and current != last:
+            old = self.zones[last] if isinstance(last, int) else last
+            self.events.append((car, old, zone, self._get_kind(old, zone)))
+
+        self.last[car] = current
+
+        return zone
+
+    def forget(self, car):
+        """Stops tracking a car, for example when it leaves the map."""
+        self.last.pop(car, None)
+
+    def reset(self):
+        """Forgets all the cars and the events."""
+        self.last = {}
+        self.events = []
+
+    def pop_events(self):
+        """Returns the events recorded since the last call, oldest first."""
+        events = self.events
+        self.events = []
+        return events
+
+    def _on_road(self, pos):
+        """Returns whether a point in no zone is on the road."""
+        ix = int(np.floor(pos[0]))
+        iy = int(np.floor(pos[1]))
+        if 0 <= ix < self.road.shape[1] and 0 <= iy < self.road.shape[0]:
+            return bool(self.road[iy, ix])
+
+        return False
+
+    def _get_kind(self, old, new):
+        """Returns the kind of the transition between two zones."""
+        if new[0] == "intersection":
+            return INTERSECTION_ENTRY
+        if old[0] == "intersection":
+            return INTERSECTION_EXIT
+        if new[0] == "lane":
+            return LANE_CHANGE if old[0] == "lane" else LANE_ENTRY
+        if new[0] == "off_road":
+            return ROAD_EXIT
+        if old[0] == "lane":
+            return LANE_EXIT
+
+        return ROAD_ENTRY